@@ -0,0 +1,308 @@
+"""
+Offline batch mode for backfilling archives of recorded videos (e.g. SD-card dumps).
+Files are fanned out over a process pool, decoded with optional frame striding, and clip
+boundaries follow media timestamps instead of wall-clock time. Output uses the same
+clip mp4/json/jpg layout as the live capture loop, in one folder per source file.
+With a detection cache, each file's detections are stored under a key of model hash, video hash
+and detector settings; re-running the same file replays them without loading a model.
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import cv2
+from dotenv import load_dotenv
+
+from main import (
+    build_classifier,
+    build_clip_index,
+    build_detector,
+    build_recorder,
+    load_config,
+    setup_logging,
+)
+from motion import MotionGate
+from notifier import Notifier
+from supabase_client import SupabaseClient
+from timeline import DetectionTimeline
+from utils.model_metadata import file_sha256
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".m4v", ".mts"}
+
+# Per-process state, populated once by `_init_worker` so the model loads once per worker.
+_WORKER: Dict = {}
+
+
+def collect_videos(inputs: List[str]) -> List[Path]:
+    """Expand directories (recursively) and glob patterns into a sorted, de-duplicated file list."""
+    found = set()
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            found.update(p for p in path.rglob("*") if p.suffix.lower() in VIDEO_EXTENSIONS)
+        elif path.is_file():
+            found.add(path)
+        else:
+            found.update(Path(p) for p in glob.glob(item, recursive=True) if Path(p).is_file())
+    return sorted(found)
+
+
+def media_start_time(video_path: Path, duration_sec: float) -> datetime:
+    """Camera traps write the file when recording ends, so mtime minus duration approximates the start."""
+    mtime = datetime.fromtimestamp(video_path.stat().st_mtime, tz=timezone.utc)
+    return mtime - timedelta(seconds=duration_sec)
+
+
+def detection_cache_key(config: Dict, video_path: Path, stride: int, cache_dir: Path) -> str:
+    """Hash of everything that decides which frames are detected and what is found on them."""
+    settings = {
+        "model_sha256": file_sha256(Path(config.get("model_path"))),
+        "video_sha256": file_sha256(video_path, cache_dir),
+        "detector": config.get("detector") or {},
+        "min_confidence": float(config.get("min_confidence", 0.35)),
+        "target_classes": config.get("target_classes") or [],
+        # The gate decides which frames run, and runs more often while a clip is recording.
+        "motion_gate": config.get("motion_gate") or {},
+        "no_animal_timeout_sec": config.get("no_animal_timeout_sec", 5),
+        "stride": stride,
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+def _init_worker(config_path: str, output_dir: Optional[str], upload: bool, cache_dir: Optional[str] = None) -> None:
+    load_dotenv()
+    config = load_config(Path(config_path))
+    setup_logging(config.get("logging", {}).get("level", "INFO"))
+    if output_dir:
+        config["output_dir"] = output_dir
+    # Clips are finalized inline: a worker process has nothing else to do while it waits.
+    config["recorder_io"] = {**(config.get("recorder_io") or {}), "async": False}
+
+    sync_client = SupabaseClient({})
+    if upload:
+        from upload_outbox import UploadOutbox
+
+        outbox_cfg = (config.get("supabase", {}) or {}).get("outbox", {}) or {}
+        output_root = Path(config.get("output_dir", "./captures"))
+        # Only enqueue here; the live edge app's uploader drains the outbox.
+        sync_client = UploadOutbox(Path(outbox_cfg.get("path") or output_root / "upload_outbox.sqlite3"))
+
+    _WORKER.update(
+        config=config,
+        detector=None,
+        cache_dir=Path(cache_dir) if cache_dir else None,
+        classifier=build_classifier(config),
+        clip_index=build_clip_index(config),
+        notifier=Notifier({}),
+        sync_client=sync_client,
+    )
+
+
+def _detector():
+    """The worker's detector, loaded on first use so runs served from the cache never load a model."""
+    if _WORKER["detector"] is None:
+        config = _WORKER["config"]
+        _WORKER["detector"] = build_detector(
+            config,
+            config.get("model_path"),
+            float(config.get("min_confidence", 0.35)),
+            config.get("target_classes") or [],
+        )
+    return _WORKER["detector"]
+
+
+def process_video(video_path: str, stride: int) -> Dict:
+    """Run one file through motion gate, detector and recorder; returns a throughput summary."""
+    config = _WORKER["config"]
+    cache_dir = _WORKER["cache_dir"]
+    path = Path(video_path)
+    started = time.perf_counter()
+
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        return {"file": str(path), "error": "unable to open"}
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 20.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    base_time = media_start_time(path, total_frames / fps if total_frames else 0.0)
+
+    # One folder per source file: start times come from mtimes, which an archive copy resets, so
+    # clips of different files could otherwise land on the same name.
+    recorder = build_recorder(
+        config,
+        Path(config.get("output_dir", "./captures")) / path.stem,
+        config.get("device_id", "device-unknown"),
+        fps / stride,
+        _WORKER["notifier"],
+        _WORKER["sync_client"],
+        _WORKER["classifier"],
+        _WORKER["clip_index"],
+    )
+    gate = MotionGate({**(config.get("motion_gate") or {}), "log_interval_sec": 0})
+
+    cache_path = cached = recorded = None
+    if cache_dir is not None:
+        try:
+            cache_path = cache_dir / f"{detection_cache_key(config, path, stride, cache_dir)}.npz"
+        except (OSError, TypeError) as exc:
+            logging.warning("%s: detection cache disabled: %s", path.name, exc)
+    if cache_path is not None and cache_path.exists():
+        cached = DetectionTimeline.load(cache_path).frame_detections()
+    elif cache_path is not None:
+        recorded = DetectionTimeline({"video": str(path), "stride": stride})
+    held_counts: Dict[str, int] = {}
+
+    frame_idx = 0
+    frames_processed = 0
+    try:
+        while True:
+            # grab() skips the colour conversion/copy for frames we stride over.
+            if not cap.grab():
+                break
+            frame_idx += 1
+            if (frame_idx - 1) % stride:
+                continue
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+
+            pos_msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+            offset_sec = pos_msec / 1000.0 if pos_msec > 0 else (frame_idx - 1) / fps
+            timestamp = base_time + timedelta(seconds=offset_sec)
+
+            if cached is not None:
+                # Replay: frames the gate skipped last time hold the previous counts again, but
+                # only while recording, as `MotionGate.held_counts` does.
+                detections = cached.get(frame_idx - 1)
+                if detections is not None:
+                    held_counts = dict(Counter(det["species"] for det in detections))
+                elif not recorder.recording:
+                    held_counts = {}
+                species_counts = held_counts
+            else:
+                detections, species_counts = gate.filter(frame, recorder.recording, _detector().detect)
+                if recorded is not None:
+                    recorded.add_frame(offset_sec, index=frame_idx - 1)
+                    if detections is not None:
+                        recorded.add_detections(detections)
+            recorder.process_frame(frame, species_counts, timestamp=timestamp, detections=detections)
+            frames_processed += 1
+        if recorded is not None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            recorded.save(cache_path)
+    finally:
+        recorder.close()
+        cap.release()
+
+    elapsed = time.perf_counter() - started
+    media_sec = frame_idx / fps
+    return {
+        "file": str(path),
+        "frames_decoded": frame_idx,
+        "frames_processed": frames_processed,
+        "inferences": gate.inferences_run,
+        "cache": "hit" if cached is not None else "miss" if cache_path is not None else None,
+        "clips": recorder.clips_finished,
+        "media_sec": round(media_sec, 1),
+        "elapsed_sec": round(elapsed, 2),
+        "fps": round(frames_processed / elapsed, 1) if elapsed else 0.0,
+        "realtime_factor": round(media_sec / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Process archived camera-trap videos offline")
+    parser.add_argument("inputs", nargs="+", help="Video files, directories, or glob patterns")
+    parser.add_argument("--config", type=Path, default=Path("edge/config.yaml"), help="Path to config.yaml")
+    parser.add_argument("--output-dir", help="Override output_dir from config.yaml")
+    parser.add_argument("--stride", type=int, default=1, help="Process every Nth frame (default: 1)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=max(1, (os.cpu_count() or 2) // 2),
+        help="Parallel worker processes (each loads its own model)",
+    )
+    parser.add_argument(
+        "--upload",
+        action="store_true",
+        help="Queue finished clips in the upload outbox for the edge app's uploader to sync",
+    )
+    parser.add_argument(
+        "--detection-cache",
+        type=Path,
+        help="Reuse detections of files processed before with the same model and settings "
+        "(default: timeline.cache_dir in config.yaml)",
+    )
+    parser.add_argument("--summary", type=Path, help="Write the per-file summary as JSON")
+    args = parser.parse_args()
+
+    setup_logging("INFO")
+    videos = collect_videos(args.inputs)
+    if not videos:
+        raise SystemExit("No video files found")
+    stride = max(1, args.stride)
+    cache_dir = args.detection_cache or (load_config(args.config).get("timeline", {}) or {}).get("cache_dir")
+    logging.info("Processing %d file(s) with %d worker(s), stride %d", len(videos), args.workers, stride)
+
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(str(args.config), args.output_dir, args.upload, str(cache_dir) if cache_dir else None),
+    ) as pool:
+        futures = {pool.submit(process_video, str(video), stride): video for video in videos}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as exc:  # noqa: BLE001 - report and keep going with other files
+                result = {"file": str(futures[future]), "error": str(exc)}
+            results.append(result)
+            if "error" in result:
+                logging.warning("%s: %s", result["file"], result["error"])
+            else:
+                logging.info(
+                    "%s: %d frames, %d clips, %.1f fps (%.1fx realtime)%s",
+                    Path(result["file"]).name,
+                    result["frames_processed"],
+                    result["clips"],
+                    result["fps"],
+                    result["realtime_factor"],
+                    f" [cache {result['cache']}]" if result.get("cache") else "",
+                )
+
+    elapsed = time.perf_counter() - started
+    ok = [r for r in results if "error" not in r]
+    total_frames = sum(r["frames_processed"] for r in ok)
+    total_media = sum(r["media_sec"] for r in ok)
+    logging.info(
+        "Done: %d/%d files, %d clips, %d frames in %.1fs (%.1f fps, %.1fx realtime)",
+        len(ok),
+        len(results),
+        sum(r["clips"] for r in ok),
+        total_frames,
+        elapsed,
+        total_frames / elapsed if elapsed else 0.0,
+        total_media / elapsed if elapsed else 0.0,
+    )
+
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            files = sorted(results, key=lambda r: r["file"])
+            json.dump({"elapsed_sec": round(elapsed, 2), "files": files}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
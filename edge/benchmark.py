@@ -0,0 +1,519 @@
+"""
+Camera-free benchmark suite for the edge pipeline and model variants.
+Replays a synthetic (or given) video through the detector, classifier, recorder and the full
+capture loop, and writes a JSON report that can be diffed across commits. With `--baseline`,
+fps drops or p90 latency increases beyond `--max-regression` fail the run.
+
+Usage (from the edge directory):
+    python benchmark.py --config config.yaml --output bench.json
+    python benchmark.py --config config.yaml \\
+        --detector onnx:../web/public/models/model.onnx --detector ultralytics:yolov8n.pt \\
+        --batch-sizes 1 4 --input-sizes 320 640 \\
+        --classifier ../web/public/models/speciesnet.onnx \\
+        --classifier ../web/public/models/speciesnet_quant.onnx \\
+        --encoder opencv --encoder ffmpeg:preset=ultrafast,crf=28 \\
+        --baseline bench_main.json --output bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+import yaml
+
+from encoders import OpenCVEncoder, build_encoder
+from main import build_detector, build_recorder, load_config, setup_logging
+from metrics import resident_bytes
+from motion import MotionGate
+from notifier import Notifier
+from pipeline import CapturePipeline
+from shm_pipeline import MultiProcessPipeline
+from supabase_client import SupabaseClient
+
+SECTIONS = ("detector", "classifier", "recorder", "encoder", "pipeline")
+
+
+def make_synthetic_video(path: Path, seconds: float = 10.0, fps: float = 20.0, size=(1280, 720), seed: int = 0) -> Path:
+    """Textured background with a few moving blobs; deterministic so runs are comparable."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    background = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    blobs = [
+        {
+            "pos": rng.uniform([0, 0], [width, height]),
+            "vel": rng.uniform(-6, 6, 2),
+            "radius": int(rng.integers(30, 90)),
+            "color": tuple(int(c) for c in rng.integers(0, 255, 3)),
+        }
+        for _ in range(3)
+    ]
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for idx in range(int(seconds * fps)):
+        frame = background.copy()
+        # Animals come and go so clips start and stop during the replay.
+        if (idx // int(fps * 3)) % 2 == 0:
+            for blob in blobs:
+                blob["pos"] = (blob["pos"] + blob["vel"]) % [width, height]
+                cv2.circle(frame, tuple(int(v) for v in blob["pos"]), blob["radius"], blob["color"], -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def load_frames(video_path: Path, limit: int) -> List[np.ndarray]:
+    cap = cv2.VideoCapture(str(video_path))
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise RuntimeError(f"Could not decode any frame from {video_path}")
+    return frames
+
+
+def summarize(name: str, kind: str, latencies_sec: Sequence[float], items: int, elapsed: float, rss: Dict, **params) -> Dict:
+    latencies_ms = np.asarray(latencies_sec, dtype=np.float64) * 1000.0
+    return {
+        "name": name,
+        "kind": kind,
+        "params": params,
+        "items": items,
+        "fps": round(items / elapsed, 2) if elapsed else 0.0,
+        # Empty when per-item latency is not observable (e.g. the threaded pipeline).
+        "latency_ms": {
+            "mean": round(float(latencies_ms.mean()), 3),
+            "p50": round(float(np.percentile(latencies_ms, 50)), 3),
+            "p90": round(float(np.percentile(latencies_ms, 90)), 3),
+            "p99": round(float(np.percentile(latencies_ms, 99)), 3),
+        }
+        if len(latencies_ms)
+        else {},
+        "rss_mb": rss,
+    }
+
+
+def timed_calls(fn: Callable[[Sequence], object], batches: List[Sequence], warmup: int) -> Dict:
+    """Run `fn` over every batch after `warmup` untimed calls; tracks latency and peak RSS."""
+    for batch in batches[: max(0, warmup)]:
+        fn(batch)
+    baseline_rss = resident_bytes()
+    peak_rss = baseline_rss
+    latencies = []
+    started = time.perf_counter()
+    for batch in batches:
+        call_started = time.perf_counter()
+        fn(batch)
+        latencies.append(time.perf_counter() - call_started)
+        peak_rss = max(peak_rss, resident_bytes())
+    elapsed = time.perf_counter() - started
+    return {
+        "latencies": latencies,
+        "elapsed": elapsed,
+        "rss": {"after_warmup": round(baseline_rss / 2**20, 1), "peak": round(peak_rss / 2**20, 1)},
+    }
+
+
+def _chunks(items: Sequence, size: int) -> List[Sequence]:
+    return [items[i : i + size] for i in range(0, len(items), size) if len(items[i : i + size]) == size]
+
+
+def bench_detectors(config: Dict, specs: List[str], frames: List, batch_sizes: List[int], input_sizes: List[Optional[int]], warmup: int) -> List[Dict]:
+    results = []
+    min_conf = float(config.get("min_confidence", 0.35))
+    target_classes = config.get("target_classes") or []
+    for spec in specs:
+        backend, _, model_path = spec.partition(":")
+        for input_size in input_sizes:
+            detector_cfg = {**(config.get("detector") or {}), "backend": backend}
+            if input_size:
+                detector_cfg["input_size"] = input_size
+            rss_before = resident_bytes()
+            if backend == "ultralytics":
+                from detection import YoloDetector
+
+                detector = YoloDetector(model_path, min_conf, target_classes, input_size=input_size)
+            else:
+                detector = build_detector({**config, "detector": detector_cfg}, model_path, min_conf, target_classes)
+            load_mb = round((resident_bytes() - rss_before) / 2**20, 1)
+
+            for batch_size in batch_sizes:
+                batches = _chunks(frames, batch_size)
+                if not batches:
+                    continue
+                run = timed_calls(detector.detect_batch, batches, warmup)
+                name = f"detector/{backend}/{Path(model_path).name}/in{input_size or 'default'}/b{batch_size}"
+                result = summarize(
+                    name,
+                    "detector",
+                    [lat / batch_size for lat in run["latencies"]],
+                    len(batches) * batch_size,
+                    run["elapsed"],
+                    {**run["rss"], "model_load": load_mb},
+                    backend=backend,
+                    model=model_path,
+                    input_size=input_size,
+                    batch_size=batch_size,
+                )
+                result["latency_ms"]["batch_p50"] = round(float(np.percentile(run["latencies"], 50)) * 1000.0, 3)
+                results.append(result)
+                _log_result(result)
+            del detector
+    return results
+
+
+def bench_classifiers(config: Dict, model_paths: List[str], frames: List, batch_sizes: List[int], warmup: int) -> List[Dict]:
+    from classifier import SpeciesClassifier
+
+    results = []
+    base_cfg = config.get("classifier") or {}
+    for model_path in model_paths:
+        classifier = SpeciesClassifier({**base_cfg, "model_path": model_path})
+        size = classifier.input_size
+        crops = [cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA) for frame in frames]
+        for batch_size in batch_sizes:
+            batches = _chunks(crops, batch_size)
+            if not batches:
+                continue
+            run = timed_calls(lambda batch: classifier.classify(list(batch)), batches, warmup)
+            result = summarize(
+                f"classifier/{Path(model_path).name}/b{batch_size}",
+                "classifier",
+                [lat / batch_size for lat in run["latencies"]],
+                len(batches) * batch_size,
+                run["elapsed"],
+                run["rss"],
+                model=model_path,
+                model_mb=round(os.path.getsize(model_path) / 2**20, 2),
+                batch_size=batch_size,
+            )
+            results.append(result)
+            _log_result(result)
+    return results
+
+
+def bench_recorder(config: Dict, frames: List, fps: float, work_dir: Path) -> List[Dict]:
+    """Recorder + ClipWriter alone: how long process_frame blocks the capture thread."""
+    results = []
+    detections = [{"species": "animal", "confidence": 0.9, "box": [10, 10, 200, 200]}]
+    for threaded in (False, True):
+        recorder_cfg = {**config, "recorder_io": {**(config.get("recorder_io") or {}), "async": threaded}}
+        recorder = build_recorder(
+            recorder_cfg, work_dir / f"recorder_{threaded}", "bench", fps, Notifier({}), SupabaseClient({})
+        )
+        latencies = []
+        started = time.perf_counter()
+        for idx, frame in enumerate(frames):
+            # Alternate busy and quiet stretches so clips open and close.
+            busy = (idx // int(fps * 3)) % 2 == 0
+            call_started = time.perf_counter()
+            recorder.process_frame(frame, {"animal": 1} if busy else {}, detections=detections if busy else [])
+            latencies.append(time.perf_counter() - call_started)
+        recorder.close()
+        elapsed = time.perf_counter() - started
+        result = summarize(
+            f"recorder/{'async' if threaded else 'inline'}",
+            "recorder",
+            latencies,
+            len(frames),
+            elapsed,
+            {"peak": round(resident_bytes() / 2**20, 1)},
+            threaded=threaded,
+            clips=recorder.clips_finished,
+        )
+        results.append(result)
+        _log_result(result)
+    return results
+
+
+def bench_encoders(config: Dict, specs: List[str], frames: List, fps: float, work_dir: Path) -> List[Dict]:
+    """
+    Encode the same frames with each encoder spec (`backend[:key=value,...]`, on top of the
+    config's `encoder` section): wall time, encode CPU time and the resulting file size.
+    """
+    results = []
+    height, width = frames[0].shape[:2]
+    duration_sec = len(frames) / fps
+    for idx, spec in enumerate(specs):
+        backend, _, options = spec.partition(":")
+        encoder_cfg = {**(config.get("encoder") or {}), "backend": backend}
+        for option in filter(None, options.split(",")):
+            key, _, value = option.partition("=")
+            encoder_cfg[key] = yaml.safe_load(value)
+        encoder = build_encoder(encoder_cfg)
+        if backend != "opencv" and isinstance(encoder, OpenCVEncoder):
+            logging.warning("Skipping encoder %s: backend not available", spec)
+            continue
+
+        encoder.open(work_dir / f"encoder_{idx}.mp4", fps, (width, height))
+        latencies = []
+        started = time.perf_counter()
+        for frame in frames:
+            call_started = time.perf_counter()
+            encoder.write(frame)
+            latencies.append(time.perf_counter() - call_started)
+        clip = encoder.close()
+        elapsed = time.perf_counter() - started
+        result = summarize(
+            f"encoder/{spec}",
+            "encoder",
+            latencies,
+            len(frames),
+            elapsed,
+            {"peak": round(resident_bytes() / 2**20, 1)},
+            backend=clip["backend"],
+            codec=clip["codec"],
+            encode_cpu_sec=clip["encode_cpu_sec"],
+            cpu_ms_per_frame=round(clip["encode_cpu_sec"] * 1000.0 / len(frames), 3),
+            file_bytes=clip["file_bytes"],
+            kbps=round(clip["file_bytes"] * 8 / duration_sec / 1000.0, 1),
+        )
+        results.append(result)
+        _log_result(result)
+        logging.info(
+            "%-60s %8.2f ms CPU/frame  %8.1f KB  %8.1f kbps",
+            "",
+            result["params"]["cpu_ms_per_frame"],
+            clip["file_bytes"] / 1024.0,
+            result["params"]["kbps"],
+        )
+    return results
+
+
+def bench_pipeline(config: Dict, video_path: Path, work_dir: Path) -> List[Dict]:
+    """Full loop over the video file: decode, motion gate, detector, recorder; one, three threads or processes."""
+    detector_factory = functools.partial(
+        build_detector,
+        config,
+        config.get("model_path"),
+        float(config.get("min_confidence", 0.35)),
+        config.get("target_classes") or [],
+    )
+    detector = detector_factory()
+    gate_config = {**(config.get("motion_gate") or {}), "log_interval_sec": 0}
+    results = []
+    for mode in ("sequential", "pipelined", "multiprocess"):
+        cap = cv2.VideoCapture(str(video_path))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 20.0
+        recorder = build_recorder(config, work_dir / mode, "bench", fps, Notifier({}), SupabaseClient({}))
+        gate = MotionGate(gate_config)
+        latencies: List[float] = []
+        started = time.perf_counter()
+        inferences = None
+        if mode == "sequential":
+            while True:
+                call_started = time.perf_counter()
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                detections, counts = gate.filter(frame, recorder.recording, detector.detect)
+                recorder.process_frame(frame, counts, detections=detections)
+                latencies.append(time.perf_counter() - call_started)
+            frames_done = len(latencies)
+        elif mode == "pipelined":
+            pipeline = CapturePipeline(
+                cap,
+                lambda frame: gate.filter(frame, recorder.recording, detector.detect),
+                recorder,
+                realtime=False,
+                stats_interval_sec=0,
+            )
+            pipeline.run()
+            frames_done = pipeline.frames_recorded
+        else:
+            mp_pipeline = MultiProcessPipeline(
+                str(video_path), detector_factory, gate_config, realtime=False, stats_interval_sec=0
+            ).start()
+            # Process start-up and the model load in the child are not timed, as for the other modes.
+            started = time.perf_counter()
+            mp_pipeline.run(recorder)
+            frames_done = mp_pipeline.frames_recorded
+            inferences = mp_pipeline.frames_inferred
+        recorder.close()
+        cap.release()
+        elapsed = time.perf_counter() - started
+        result = summarize(
+            f"pipeline/{mode}",
+            "pipeline",
+            latencies,
+            frames_done,
+            elapsed,
+            {"peak": round(resident_bytes() / 2**20, 1)},
+            mode=mode,
+            inferences=gate.inferences_run if inferences is None else inferences,
+            clips=recorder.clips_finished,
+        )
+        results.append(result)
+        _log_result(result)
+    return results
+
+
+def compare(report: Dict, baseline: Dict, max_regression: float) -> List[Dict]:
+    """Results that got slower than the baseline by more than `max_regression` (a fraction)."""
+    previous = {result["name"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get(result["name"])
+        if not old:
+            continue
+        checks = [("fps", old["fps"], result["fps"], -1)]
+        if old["latency_ms"].get("p90") and result["latency_ms"].get("p90"):
+            checks.append(("latency_p90_ms", old["latency_ms"]["p90"], result["latency_ms"]["p90"], 1))
+        for metric, before, after, direction in checks:
+            if not before:
+                continue
+            change = (after - before) / before
+            if change * direction > max_regression:
+                regressions.append(
+                    {"name": result["name"], "metric": metric, "baseline": before, "current": after, "change": round(change, 3)}
+                )
+    return regressions
+
+
+def environment() -> Dict:
+    info = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+    }
+    try:
+        import onnxruntime
+
+        info["onnxruntime"] = onnxruntime.__version__
+    except ImportError:
+        pass
+    try:
+        info["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        info["git_commit"] = None
+    return info
+
+
+def _log_result(result: Dict) -> None:
+    latency = result["latency_ms"]
+    if not latency:
+        logging.info("%-60s %8.1f fps", result["name"], result["fps"])
+        return
+    logging.info(
+        "%-60s %8.1f fps  p50 %7.2f ms  p90 %7.2f ms  p99 %7.2f ms",
+        result["name"],
+        result["fps"],
+        latency["p50"],
+        latency["p90"],
+        latency["p99"],
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the edge pipeline without a camera")
+    parser.add_argument("--config", type=Path, default=Path("edge/config.yaml"), help="Path to config.yaml")
+    parser.add_argument("--video", type=Path, help="Sample video (default: generate a synthetic one)")
+    parser.add_argument("--frames", type=int, default=120, help="Frames replayed per model benchmark")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed calls before measuring")
+    parser.add_argument(
+        "--detector",
+        action="append",
+        default=[],
+        help="backend:model_path to compare (repeatable; default: the config's detector)",
+    )
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1], help="Detector/classifier batch sizes")
+    parser.add_argument("--input-sizes", type=int, nargs="+", default=[0], help="Detector input sizes (0 = model default)")
+    parser.add_argument("--classifier", action="append", default=[], help="SpeciesNet ONNX model to compare (repeatable)")
+    parser.add_argument(
+        "--encoder",
+        action="append",
+        default=[],
+        help="backend[:key=value,...] clip encoder to compare (repeatable; default: opencv and ffmpeg)",
+    )
+    parser.add_argument("--skip", nargs="+", choices=SECTIONS, default=[], help="Sections to leave out")
+    parser.add_argument("--output", type=Path, help="Write the JSON report here")
+    parser.add_argument("--baseline", type=Path, help="Previous JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="Allowed slowdown vs baseline (fraction)")
+    args = parser.parse_args()
+
+    setup_logging("INFO")
+    config = load_config(args.config)
+    # Benchmarks measure local work only: no uploads, notifications, index or retention.
+    config["clip_index"] = {"enabled": False}
+    detector_specs = args.detector or [
+        f"{(config.get('detector') or {}).get('backend', 'ultralytics')}:{config.get('model_path')}"
+    ]
+    input_sizes = [size or None for size in args.input_sizes]
+
+    with tempfile.TemporaryDirectory(prefix="edge-bench-") as tmp:
+        work_dir = Path(tmp)
+        video_path = args.video or make_synthetic_video(work_dir / "synthetic.mp4")
+        frames = load_frames(video_path, args.frames)
+        fps = cv2.VideoCapture(str(video_path)).get(cv2.CAP_PROP_FPS) or 20.0
+
+        results: List[Dict] = []
+        if "detector" not in args.skip:
+            results += bench_detectors(config, detector_specs, frames, args.batch_sizes, input_sizes, args.warmup)
+        if "classifier" not in args.skip and args.classifier:
+            results += bench_classifiers(config, args.classifier, frames, args.batch_sizes, args.warmup)
+        if "recorder" not in args.skip:
+            results += bench_recorder(config, frames, fps, work_dir)
+        if "encoder" not in args.skip:
+            results += bench_encoders(config, args.encoder or ["opencv", "ffmpeg"], frames, fps, work_dir)
+        if "pipeline" not in args.skip:
+            results += bench_pipeline(config, video_path, work_dir)
+
+    report = {
+        "environment": environment(),
+        "video": str(args.video) if args.video else "synthetic:1280x720@20fps,10s,seed0",
+        "frames": len(frames),
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        report["regressions"] = regressions
+        for regression in regressions:
+            logging.warning(
+                "Regression in %s: %s %.3f -> %.3f (%+.1f%%)",
+                regression["name"],
+                regression["metric"],
+                regression["baseline"],
+                regression["current"],
+                regression["change"] * 100.0,
+            )
+        exit_code = 1 if regressions else 0
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logging.info("Wrote %s", args.output)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
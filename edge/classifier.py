@@ -0,0 +1,163 @@
+"""
+Optional second-stage species classifier (SpeciesNet ONNX) for the edge app.
+Mirrors the browser pipeline: detector boxes are cropped and classified, but only the
+top-K most confident crops of a clip are kept so the same animal is not classified over and over.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+from utils.model_metadata import load_labels
+
+# SpeciesNet labels that mean "nothing specific"; a real species in the top 5 wins over these.
+_NON_SPECIES_LABELS = {"", "blank"}
+
+
+class CropCollector:
+    """Keeps the `top_k` highest-confidence detection crops seen during one clip."""
+
+    def __init__(self, top_k: int, input_size: int, classify_classes: Optional[set] = None) -> None:
+        self.top_k = max(1, int(top_k))
+        self.input_size = int(input_size)
+        self.classify_classes = classify_classes or set()
+        self._heap: List[Tuple[float, int, Dict, np.ndarray]] = []
+        self._counter = itertools.count()
+
+    def offer(self, frame, detections: List[Dict]) -> None:
+        """Crop detections that beat the current worst kept crop (cheap when they don't)."""
+        for det in detections:
+            if self.classify_classes and det["species"] not in self.classify_classes:
+                continue
+            confidence = det["confidence"]
+            if len(self._heap) >= self.top_k and confidence <= self._heap[0][0]:
+                continue
+            crop = self._crop(frame, det["box"])
+            if crop is None:
+                continue
+            entry = (confidence, next(self._counter), det, crop)
+            if len(self._heap) < self.top_k:
+                heapq.heappush(self._heap, entry)
+            else:
+                heapq.heapreplace(self._heap, entry)
+
+    def crops(self) -> List[Tuple[Dict, np.ndarray]]:
+        """Kept crops, most confident first."""
+        return [(det, crop) for _, _, det, crop in sorted(self._heap, key=lambda e: -e[0])]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def _crop(self, frame, box) -> Optional[np.ndarray]:
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = [int(round(v)) for v in box]
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(width, x2), min(height, y2)
+        # Same minimum as the browser pipeline; tiny crops classify as noise.
+        if x2 - x1 <= 10 or y2 - y1 <= 10:
+            return None
+        # Resize right away: bounded memory per crop and no work left for classification time.
+        size = (self.input_size, self.input_size)
+        return cv2.resize(frame[y1:y2, x1:x2], size, interpolation=cv2.INTER_AREA)
+
+
+class SpeciesClassifier:
+    """Batched SpeciesNet inference over crops (NHWC, RGB, 0-1 floats like the web worker)."""
+
+    def __init__(self, config: Dict) -> None:
+        self.model_path = str(config["model_path"])
+        self.top_k_crops = int(config.get("top_k_crops", 8))
+        self.batch_size = max(1, int(config.get("batch_size", 8)))
+        self.min_score = float(config.get("min_score", 0.1))
+        self.classify_classes = set(config.get("classify_classes") or [])
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if config.get("num_threads"):
+            options.intra_op_num_threads = int(config["num_threads"])
+        self.session = ort.InferenceSession(
+            self.model_path,
+            sess_options=options,
+            providers=config.get("providers") or ["CPUExecutionProvider"],
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        shape = model_input.shape
+        self.input_size = shape[1] if isinstance(shape[1], int) else int(config.get("input_size", 480))
+        self.fixed_batch = shape[0] if isinstance(shape[0], int) else None
+
+        # SpeciesNet exports carry no embedded labels, so labels_path is normally required.
+        labels = load_labels(config.get("labels_path") or None, self.model_path)
+        if not labels:
+            raise RuntimeError(f"No labels for {self.model_path}; set classifier.labels_path")
+        self.labels: List[str] = labels
+
+    def new_collector(self) -> CropCollector:
+        return CropCollector(self.top_k_crops, self.input_size, self.classify_classes)
+
+    def classify(self, crops: List[np.ndarray], top_n: int = 5) -> List[List[Tuple[str, float]]]:
+        """Top-N (label, probability) for each BGR crop already sized to `input_size`."""
+        results: List[List[Tuple[str, float]]] = []
+        step = 1 if self.fixed_batch == 1 else self.batch_size
+        for start in range(0, len(crops), step):
+            chunk = crops[start : start + step]
+            batch = np.stack([crop[:, :, ::-1] for crop in chunk]).astype(np.float32) / 255.0
+            logits = self.session.run(None, {self.input_name: batch})[0]
+            probs = _softmax(logits.reshape(len(chunk), -1))
+            top = np.argsort(-probs, axis=1)[:, :top_n]
+            for row, indices in zip(probs, top):
+                results.append(
+                    [(self.labels[i] if i < len(self.labels) else f"class_{i}", float(row[i])) for i in indices]
+                )
+        return results
+
+    def summarize(self, collector: CropCollector) -> Optional[Dict]:
+        """Classify a clip's kept crops and fold them into metadata-ready results."""
+        kept = collector.crops()
+        if not kept:
+            return None
+
+        predictions = self.classify([crop for _, crop in kept])
+        crops = []
+        scores: Dict[str, float] = {}
+        for (det, _), top in zip(kept, predictions):
+            species, score = self._pick_label(top, fallback=(det["species"], det["confidence"]))
+            scores[species] = max(scores.get(species, 0.0), score)
+            crops.append(
+                {
+                    "detector_species": det["species"],
+                    "detector_confidence": round(det["confidence"], 4),
+                    "species": species,
+                    "score": round(score, 4),
+                }
+            )
+
+        top_species = max(scores, key=scores.get) if scores else None
+        return {
+            "model": Path(self.model_path).name,
+            "top_species": top_species,
+            "species_scores": {name: round(score, 4) for name, score in scores.items()},
+            "crops": crops,
+        }
+
+    def _pick_label(self, top: List[Tuple[str, float]], fallback: Tuple[str, float]) -> Tuple[str, float]:
+        """Same rule as the web app: first species label above min_score, else the detector's label."""
+        for label, score in top:
+            if label.strip() not in _NON_SPECIES_LABELS and score > self.min_score:
+                return label, score
+        logging.debug("No confident species in %s; keeping detector label %s", top, fallback[0])
+        return fallback
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
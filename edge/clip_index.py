@@ -0,0 +1,336 @@
+"""
+Local SQLite index of recorded clips for fast queries on the edge device.
+The `clips` table mirrors infra/supabase_schema.sql so local rows can be reconciled with the cloud;
+the JSON sidecars stay the source of truth and the index can be rebuilt from them at any time.
+Clips whose video the retention manager deleted keep their row, flagged with `video_evicted_at`.
+
+Usage (from the edge directory):
+    python clip_index.py --config config.yaml rebuild
+    python clip_index.py --config config.yaml species --since 2026-09-01 --device cam-trap-01
+    python clip_index.py --config config.yaml hours --species deer --local-time
+    python clip_index.py --config config.yaml durations
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from supabase_client import SupabaseClient
+from utils.paths import ensure_dir
+
+# Same columns as public.clips in infra/supabase_schema.sql (jsonb stored as JSON text).
+_SCHEMA = """
+create table if not exists clips (
+  id text primary key,
+  device_id text not null,
+  started_at text not null, -- ISO-8601 UTC, comparable as text
+  ended_at text not null,
+  duration_sec real not null,
+  primary_species text,
+  max_animals integer,
+  species_counts text not null,
+  frames_with_animals integer default 0,
+  thumbnail_url text,
+  local_video_path text unique,
+  classified_species text,
+  species_scores text,
+  created_at text not null,
+  video_evicted_at text -- set when retention deleted the mp4; the row and sidecars remain
+);
+create index if not exists clips_started_at_idx on clips (started_at desc);
+create index if not exists clips_primary_species_idx on clips (primary_species);
+create index if not exists clips_device_id_idx on clips (device_id, started_at);
+"""
+
+_COLUMNS = (
+    "id",
+    "device_id",
+    "started_at",
+    "ended_at",
+    "duration_sec",
+    "primary_species",
+    "max_animals",
+    "species_counts",
+    "frames_with_animals",
+    "thumbnail_url",
+    "local_video_path",
+    "classified_species",
+    "species_scores",
+    "created_at",
+    "video_evicted_at",
+)
+# Columns added after the first release, created on existing index files at open.
+_ADDED_COLUMNS = {"video_evicted_at": "text"}
+
+# Upper edges (seconds) of the duration histogram buckets; the last bucket is open-ended.
+DURATION_BUCKETS = (5, 10, 30, 60, 120, 300)
+
+
+class ClipIndex:
+    """Thread-safe writer/reader for the local clip index."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        ensure_dir(self.path.parent)
+        self._lock = threading.Lock()
+        # Batch workers in other processes may write at the same time; WAL lets readers continue.
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30.0, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("pragma synchronous=normal")
+        self._conn.executescript(_SCHEMA)
+        existing = {row[1] for row in self._conn.execute("pragma table_info(clips)")}
+        for column, kind in _ADDED_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"alter table clips add column {column} {kind}")
+
+    def add(self, clip_metadata: Dict) -> None:
+        """Insert or refresh one clip (keyed by its local video path)."""
+        self.add_many([clip_metadata])
+
+    def add_many(self, metadatas: Iterable[Dict]) -> int:
+        rows = [_to_row(metadata) for metadata in metadatas]
+        if not rows:
+            return 0
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        updates = ", ".join(f"{col} = excluded.{col}" for col in _COLUMNS if col not in ("id", "created_at"))
+        with self._lock:
+            self._conn.execute("begin")
+            try:
+                self._conn.executemany(
+                    f"insert into clips ({', '.join(_COLUMNS)}) values ({placeholders}) "
+                    f"on conflict (local_video_path) do update set {updates}",
+                    [tuple(row[col] for col in _COLUMNS) for row in rows],
+                )
+                self._conn.execute("commit")
+            except Exception:
+                self._conn.execute("rollback")
+                raise
+        return len(rows)
+
+    def mark_evicted(self, local_video_path: str, evicted_at: str) -> None:
+        """Flag a clip whose video file was deleted; it still counts in queries unless `has_video` is set."""
+        with self._lock:
+            self._conn.execute(
+                "update clips set video_evicted_at = ? where local_video_path = ?",
+                (_utc_iso(evicted_at), str(local_video_path)),
+            )
+
+    def remove(self, local_video_path: str) -> None:
+        with self._lock:
+            self._conn.execute("delete from clips where local_video_path = ?", (str(local_video_path),))
+
+    def rebuild(self, root: Path, batch_size: int = 500) -> Tuple[int, int]:
+        """Bulk-import every clip_*.json under `root`; returns (imported, skipped)."""
+        imported = skipped = 0
+        batch: List[Dict] = []
+        for metadata_path in sorted(Path(root).rglob("clip_*.json")):
+            try:
+                with open(metadata_path, "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+                metadata.setdefault("local_video_path", str(metadata_path.with_suffix(".mp4")))
+                _to_row(metadata)
+            except (OSError, ValueError, KeyError, TypeError) as exc:
+                logging.warning("Skipping %s: %s", metadata_path, exc)
+                skipped += 1
+                continue
+            batch.append(metadata)
+            if len(batch) >= batch_size:
+                imported += self.add_many(batch)
+                batch = []
+        imported += self.add_many(batch)
+        return imported, skipped
+
+    def species_totals(self, **filters) -> List[Dict]:
+        """Clips, animals (sum of per-clip peaks) and total duration per primary species."""
+        where, params = _where(**filters)
+        return self._query(
+            "select coalesce(primary_species, 'unknown') as species, count(*) as clips, "
+            "coalesce(sum(max_animals), 0) as animals, round(sum(duration_sec), 1) as total_sec "
+            f"from clips {where} group by species order by clips desc",
+            params,
+        )
+
+    def by_hour(self, local_time: bool = False, **filters) -> List[Dict]:
+        """Clip counts per hour of day (UTC, or the device's local time)."""
+        where, params = _where(**filters)
+        modifier = ", 'localtime'" if local_time else ""
+        return self._query(
+            f"select cast(strftime('%H', started_at{modifier}) as integer) as hour, count(*) as clips, "
+            "round(avg(duration_sec), 1) as avg_sec "
+            f"from clips {where} group by hour order by hour",
+            params,
+        )
+
+    def durations(self, **filters) -> List[Dict]:
+        """Clip counts per duration bucket."""
+        where, params = _where(**filters)
+        cases = " ".join(
+            f"when duration_sec < {edge} then '<{edge}s'" for edge in DURATION_BUCKETS
+        )
+        order = " ".join(f"when duration_sec < {edge} then {idx}" for idx, edge in enumerate(DURATION_BUCKETS))
+        return self._query(
+            f"select case {cases} else '>={DURATION_BUCKETS[-1]}s' end as bucket, count(*) as clips "
+            f"from clips {where} group by bucket "
+            f"order by min(case {order} else {len(DURATION_BUCKETS)} end)",
+            params,
+        )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("select count(*) from clips").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _query(self, sql: str, params: List) -> List[Dict]:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            names = [col[0] for col in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def _to_row(clip_metadata: Dict) -> Dict:
+    """Map recorder metadata to index columns using the same mapping as the Supabase upload."""
+    row = SupabaseClient.build_row(clip_metadata, None)
+    scores = row.get("species_scores")
+    evicted_at = (clip_metadata.get("retention") or {}).get("evicted_at")
+    return {
+        "id": str(uuid.uuid4()),
+        "device_id": row["device_id"] or "device-unknown",
+        "started_at": _utc_iso(row["started_at"]),
+        "ended_at": _utc_iso(row["ended_at"]),
+        "duration_sec": float(row["duration_sec"] or 0.0),
+        "primary_species": row["primary_species"],
+        "max_animals": row["max_animals"],
+        "species_counts": json.dumps(row["species_counts"]),
+        "frames_with_animals": row["frames_with_animals"],
+        "thumbnail_url": row["thumbnail_url"],
+        "local_video_path": row["local_video_path"],
+        "classified_species": row.get("classified_species"),
+        "species_scores": json.dumps(scores) if scores is not None else None,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "video_evicted_at": _utc_iso(evicted_at) if evicted_at else None,
+    }
+
+
+def _utc_iso(value: str) -> str:
+    """Normalise timestamps so text comparison matches time order."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+def _where(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    device_id: Optional[str] = None,
+    species: Optional[str] = None,
+    has_video: Optional[bool] = None,
+) -> Tuple[str, List]:
+    clauses, params = [], []
+    if since:
+        clauses.append("started_at >= ?")
+        params.append(_utc_iso(since))
+    if until:
+        clauses.append("started_at < ?")
+        params.append(_utc_iso(until))
+    if device_id:
+        clauses.append("device_id = ?")
+        params.append(device_id)
+    if species:
+        clauses.append("primary_species = ?")
+        params.append(species)
+    if has_video is not None:
+        clauses.append("video_evicted_at is null" if has_video else "video_evicted_at is not null")
+    return ("where " + " and ".join(clauses)) if clauses else "", params
+
+
+def default_index_path(config: Dict) -> Path:
+    index_cfg = config.get("clip_index", {}) or {}
+    return Path(index_cfg.get("path") or Path(config.get("output_dir", "./captures")) / "clip_index.sqlite3")
+
+
+def _print_table(rows: List[Dict]) -> None:
+    if not rows:
+        print("(no clips)")
+        return
+    names = list(rows[0])
+    widths = [max(len(str(name)), *(len(str(row[name])) for row in rows)) for name in names]
+    for values in [names] + [[row[name] for name in names] for row in rows]:
+        print("  ".join(str(value).ljust(width) for value, width in zip(values, widths)).rstrip())
+
+
+def main() -> None:
+    from main import load_config
+
+    parser = argparse.ArgumentParser(description="Query or rebuild the local clip index")
+    parser.add_argument("--config", type=Path, default=Path("edge/config.yaml"), help="Path to config.yaml")
+    parser.add_argument("--db", type=Path, help="Index path (default: clip_index.path or output_dir)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = sub.add_parser("rebuild", help="Import all JSON sidecars under output_dir")
+    rebuild.add_argument("--root", type=Path, help="Directory to scan (default: output_dir)")
+
+    for name, help_text in (
+        ("species", "Clips, animals and time per species"),
+        ("hours", "Clips per hour of day"),
+        ("durations", "Clips per duration bucket"),
+    ):
+        query = sub.add_parser(name, help=help_text)
+        query.add_argument("--since", help="ISO date/time, inclusive (UTC unless an offset is given)")
+        query.add_argument("--until", help="ISO date/time, exclusive")
+        query.add_argument("--device", help="Only this device_id")
+        query.add_argument("--species", help="Only clips with this primary species")
+        query.add_argument("--with-video", action="store_true", help="Only clips whose video was not evicted")
+        query.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+        if name == "hours":
+            query.add_argument("--local-time", action="store_true", help="Group by local instead of UTC hour")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    config = load_config(args.config) if args.config.exists() else {}
+    index = ClipIndex(args.db or default_index_path(config))
+
+    try:
+        if args.command == "rebuild":
+            root = args.root or Path(config.get("output_dir", "./captures"))
+            imported, skipped = index.rebuild(root)
+            logging.info("Indexed %d clip(s) from %s (%d skipped); %d in index", imported, root, skipped, index.count())
+            return
+
+        filters = {
+            "since": args.since,
+            "until": args.until,
+            "device_id": args.device,
+            "species": args.species,
+            "has_video": True if args.with_video else None,
+        }
+        if args.command == "species":
+            rows = index.species_totals(**filters)
+        elif args.command == "hours":
+            rows = index.by_hour(local_time=args.local_time, **filters)
+        else:
+            rows = index.durations(**filters)
+
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            _print_table(rows)
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Background video encoding and clip finalization for the recorder.
+Keeps disk and network work off the capture thread so `Recorder.process_frame` never blocks on I/O.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import metrics
+from encoders import OpenCVEncoder, build_encoder
+
+_STOP = object()
+
+
+class StageTimings:
+    """Thread-safe running count/total/max per named stage, in milliseconds (also fed to `metrics`)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        metrics.observe(stage, seconds)
+        ms = seconds * 1000.0
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {
+                    "count": entry["count"],
+                    "avg_ms": round(entry["total_ms"] / entry["count"], 2) if entry["count"] else 0.0,
+                    "max_ms": round(entry["max_ms"], 2),
+                }
+                for stage, entry in self._stages.items()
+            }
+
+
+class ClipWriter:
+    """
+    Owns the active clip encoder (see `encoders`) and the clip finalization jobs.
+    - Encoder thread: drains a bounded frame queue into the encoder.
+    - Finalizer thread: runs a callback once a clip's file is closed (metadata, thumbnail, sync).
+    Backpressure when the frame queue is full:
+    - "block": the caller waits for the encoder (no frames lost, capture may stall).
+    - "drop": the frame is discarded and counted (capture never stalls).
+    With `threaded=False` every operation runs inline, which suits offline processing.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = 120,
+        backpressure: str = "block",
+        threaded: bool = True,
+        encoder=None,
+    ) -> None:
+        if backpressure not in ("block", "drop"):
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+        self.backpressure = backpressure
+        self.threaded = threaded
+        self.timings = StageTimings()
+
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.encoder = encoder or OpenCVEncoder()
+        self._frames: "queue.Queue" = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._finalize_jobs: "queue.Queue" = queue.Queue()
+        self._threads = []
+
+        if threaded:
+            self._threads = [
+                threading.Thread(target=self._encode_loop, name="clip-encoder", daemon=True),
+                threading.Thread(target=self._finalize_loop, name="clip-finalizer", daemon=True),
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    @classmethod
+    def from_config(cls, config: Dict, encoder_config: Optional[Dict] = None) -> "ClipWriter":
+        return cls(
+            queue_size=int(config.get("frame_queue_size", 120)),
+            backpressure=config.get("backpressure", "block"),
+            threaded=bool(config.get("async", True)),
+            encoder=build_encoder(encoder_config or {}),
+        )
+
+    def open(self, path: Path, fps: float, frame_size: Tuple[int, int]) -> None:
+        """Start a new clip file; frames written afterwards go into it."""
+        self._submit(("open", (path, fps, frame_size)), control=True)
+
+    def write(self, frame) -> bool:
+        """Queue a frame for encoding. Returns False if it was dropped by the backpressure policy."""
+        return self._submit(("frame", frame), control=False)
+
+    def write_many(self, frames: Iterable) -> None:
+        """
+        Queue a batch of frames (e.g. the pre-roll) as one item, never dropped. `frames` is iterated
+        on the encoder thread, so a lazy iterator moves its decode cost off the caller.
+        """
+        self._submit(("frames", frames), control=True)
+
+    def close(self, on_closed: Optional[Callable[..., None]] = None) -> None:
+        """Finish the current file, then run `on_closed(encode_stats=...)` on the finalizer thread."""
+        self._submit(("close", on_closed), control=True)
+
+    def shutdown(self, timeout: float = 30.0) -> None:
+        """Flush pending frames and finalization jobs, then stop the worker threads."""
+        if not self.threaded:
+            return
+        self._frames.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+            if thread.is_alive():
+                logging.warning("%s did not finish within %.0fs", thread.name, timeout)
+
+    def stats(self) -> Dict:
+        return {
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "frame_queue_depth": self._frames.qsize(),
+            "finalize_queue_depth": self._finalize_jobs.qsize(),
+            "stages": self.timings.snapshot(),
+        }
+
+    def _submit(self, item, control: bool) -> bool:
+        if not self.threaded:
+            self._handle(item)
+            return True
+        if control or self.backpressure == "block":
+            started = time.perf_counter()
+            self._frames.put(item)
+            self.timings.record("enqueue_wait", time.perf_counter() - started)
+            return True
+        try:
+            self._frames.put_nowait(item)
+            return True
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+
+    def _handle(self, item) -> None:
+        kind, payload = item
+        if kind == "frame":
+            self._encode(payload)
+        elif kind == "frames":
+            for frame in payload:
+                self._encode(frame)
+        elif kind == "open":
+            path, fps, frame_size = payload
+            self.encoder.open(path, fps, frame_size)
+        elif kind == "close":
+            encode_stats = None
+            if self.encoder.is_open:
+                started = time.perf_counter()
+                encode_stats = self.encoder.close()
+                self.timings.record("release", time.perf_counter() - started)
+            if payload is not None:
+                payload = partial(payload, encode_stats=encode_stats)
+                if self.threaded:
+                    self._finalize_jobs.put(payload)
+                else:
+                    self._run_finalize(payload)
+
+    def _encode(self, frame) -> None:
+        if not self.encoder.is_open:
+            return
+        started = time.perf_counter()
+        self.encoder.write(frame)
+        self.timings.record("encode", time.perf_counter() - started)
+        self.frames_written += 1
+
+    def _encode_loop(self) -> None:
+        while True:
+            item = self._frames.get()
+            if item is _STOP:
+                break
+            try:
+                self._handle(item)
+            except Exception as exc:  # noqa: BLE001 - one bad frame must not kill the encoder
+                logging.warning("Clip encoder error: %s", exc)
+        self._finalize_jobs.put(_STOP)
+
+    def _finalize_loop(self) -> None:
+        while True:
+            job = self._finalize_jobs.get()
+            if job is _STOP:
+                break
+            self._run_finalize(job)
+
+    def _run_finalize(self, job: Callable[[], None]) -> None:
+        started = time.perf_counter()
+        try:
+            job()
+        except Exception as exc:  # noqa: BLE001 - keep finalizing later clips
+            logging.warning("Clip finalization failed: %s", exc)
+        self.timings.record("finalize", time.perf_counter() - started)
@@ -3,11 +3,15 @@ YOLOv8-based animal detector wrapper.
 Keeps the model concerns isolated from the recorder loop.
 """
 
+import time
 from collections import defaultdict
-from typing import Dict, List, Tuple
+from typing import Dict, List, Sequence, Tuple
 
+import numpy as np
 from ultralytics import YOLO
 
+import metrics
+
 
 class YoloDetector:
     """Thin wrapper around a YOLOv8 model to return structured detections."""
@@ -17,8 +21,11 @@ class YoloDetector:
         model_path: str,
         conf_threshold: float = 0.35,
         target_classes: List[str] | None = None,
+        input_size: int | None = None,
     ) -> None:
         self.model = YOLO(model_path)
+        # None keeps the size the model was trained/exported with.
+        self.input_size = input_size
         # Use model-provided labels; YOLO stores names on the model.
         self.class_names = getattr(self.model, "names", None) or getattr(
             getattr(self.model, "model", None), "names", {}
@@ -26,33 +33,73 @@ class YoloDetector:
         self.conf_threshold = conf_threshold
         self.target_classes = set(target_classes or [])
 
+    def warmup(self, runs: int = 1) -> None:
+        """
+        Predict on blank frames so predictor setup, weight transfer and kernel selection happen now
+        rather than on the first real frame. Not counted in the stage metrics.
+        """
+        size = self.input_size or 640
+        frame = np.zeros((size, size, 3), dtype=np.uint8)
+        kwargs = {"imgsz": self.input_size} if self.input_size else {}
+        for _ in range(max(0, int(runs))):
+            self.model(frame, verbose=False, conf=self.conf_threshold, **kwargs)
+
     def detect(self, frame) -> Tuple[List[Dict], Dict[str, int]]:
         """
         Run inference on a frame and return both raw detections and per-species counts.
         The per-species counts are used by the recorder to decide start/stop.
         """
-        results = self.model(frame, verbose=False, conf=self.conf_threshold)
-        if not results:
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames: Sequence) -> List[Tuple[List[Dict], Dict[str, int]]]:
+        """
+        Run one forward pass over several frames.
+        Returns one `(detections, species_counts)` pair per input frame, identical to `detect()`.
+        """
+        if not frames:
+            return []
+
+        kwargs = {"imgsz": self.input_size} if self.input_size else {}
+        results = self.model(list(frames), verbose=False, conf=self.conf_threshold, **kwargs)
+        started = time.perf_counter()
+        parsed = [self._parse_result(result) for result in results or []]
+        parse_sec = time.perf_counter() - started
+        if results:
+            # ultralytics reports per-image milliseconds for its own stages.
+            speed = getattr(results[0], "speed", None) or {}
+            scale = len(frames) / 1000.0
+            metrics.observe("preprocess", speed.get("preprocess", 0.0) * scale)
+            metrics.observe("inference", speed.get("inference", 0.0) * scale)
+            metrics.observe("postprocess", speed.get("postprocess", 0.0) * scale + parse_sec)
+        metrics.inc("edge_inferences_total", len(frames))
+        # Keep the output aligned with the input even if the model returned fewer results.
+        parsed.extend(([], {}) for _ in range(len(frames) - len(parsed)))
+        return parsed
+
+    def _parse_result(self, result) -> Tuple[List[Dict], Dict[str, int]]:
+        """Convert one ultralytics result into detections using whole-array tensor reads."""
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
             return [], {}
 
-        result = results[0]
+        cls_ids = boxes.cls.cpu().numpy().astype(int).tolist()
+        confidences = boxes.conf.cpu().numpy().tolist()
+        coords = boxes.xyxy.cpu().numpy().tolist()
+
         detections: List[Dict] = []
         species_counts: Dict[str, int] = defaultdict(int)
 
-        for box in result.boxes:
-            cls_id = int(box.cls[0])
+        for cls_id, confidence, box in zip(cls_ids, confidences, coords):
             species = self.class_names.get(cls_id, str(cls_id))
             if self.target_classes and species not in self.target_classes:
                 continue
 
-            confidence = float(box.conf[0])
-            x1, y1, x2, y2 = [float(v) for v in box.xyxy[0]]
             species_counts[species] += 1
             detections.append(
                 {
                     "species": species,
                     "confidence": confidence,
-                    "box": [x1, y1, x2, y2],
+                    "box": box,
                 }
             )
 
@@ -0,0 +1,260 @@
+"""
+Video encoder backends for clip files.
+- `OpenCVEncoder`: `cv2.VideoWriter` (mp4v by default), no extra dependencies.
+- `FfmpegEncoder`: raw BGR frames piped into an ffmpeg process per clip. H.264 by default, in
+  fragmented MP4, so clips play in the browser dashboard as-is and a clip cut short by a crash or
+  power loss is still playable up to its last keyframe.
+Both report the clip's encode CPU time and file size when closed.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class OpenCVEncoder:
+    """`cv2.VideoWriter`; encoding runs on the calling thread, so CPU time is that thread's."""
+
+    backend = "opencv"
+
+    def __init__(self, fourcc: str = "mp4v") -> None:
+        self.fourcc = fourcc
+        self._writer: Optional[cv2.VideoWriter] = None
+        self._path: Optional[Path] = None
+        self._frames = 0
+        self._cpu_sec = 0.0
+
+    def open(self, path: Path, fps: float, frame_size: Tuple[int, int]) -> None:
+        self._path = Path(path)
+        self._frames = 0
+        self._cpu_sec = 0.0
+        self._writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*self.fourcc), fps, frame_size)
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    def write(self, frame) -> None:
+        started = time.thread_time()
+        self._writer.write(frame)
+        self._cpu_sec += time.thread_time() - started
+        self._frames += 1
+
+    def close(self) -> Dict:
+        started = time.thread_time()
+        self._writer.release()
+        self._cpu_sec += time.thread_time() - started
+        self._writer = None
+        return _clip_stats(self.backend, self.fourcc, self._path, self._frames, self._cpu_sec)
+
+
+class FfmpegEncoder:
+    """
+    One ffmpeg process per clip, fed raw frames on stdin.
+    - `codec`, `preset`, `crf` map to the ffmpeg options of the same name; set `preset`/`crf` to
+      None for encoders without them (e.g. `h264_v4l2m2m` on a Raspberry Pi, with `bitrate`).
+    - `fragmented` writes fragmented MP4 with a keyframe every `keyframe_interval_sec`; otherwise
+      the index is moved to the front on close (`+faststart`), which needs a clean shutdown.
+    - A process per clip rather than one long-lived encoder: clip boundaries come from detections,
+      not a schedule ffmpeg's segment muxer could follow, and each clip must be a complete file.
+      Start-up (tens of ms) runs on the clip writer thread, once per clip of several seconds.
+    - CPU time is that process's own rusage from `wait4`, so concurrent encoders of other cameras
+      or retention transcodes are not counted.
+    """
+
+    backend = "ffmpeg"
+
+    def __init__(
+        self,
+        ffmpeg_path: str,
+        codec: str = "libx264",
+        preset: Optional[str] = "veryfast",
+        crf: Optional[int] = 26,
+        bitrate: Optional[str] = None,
+        fragmented: bool = True,
+        keyframe_interval_sec: float = 2.0,
+        threads: int = 0,
+        extra_args: Optional[List[str]] = None,
+    ) -> None:
+        self.ffmpeg_path = ffmpeg_path
+        self.codec = codec
+        self.preset = preset
+        self.crf = crf
+        self.bitrate = bitrate
+        self.fragmented = fragmented
+        self.keyframe_interval_sec = keyframe_interval_sec
+        self.threads = threads
+        self.extra_args = [str(arg) for arg in extra_args or []]
+        self._proc: Optional[subprocess.Popen] = None
+        self._path: Optional[Path] = None
+        self._frame_size: Tuple[int, int] = (0, 0)
+        self._frames = 0
+        self._failed = False
+        self._stderr = None
+
+    def command(self, path: Path, fps: float, frame_size: Tuple[int, int]) -> List[str]:
+        width, height = frame_size
+        cmd = [
+            self.ffmpeg_path,
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-y",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "bgr24",
+            "-s",
+            f"{width}x{height}",
+            "-r",
+            f"{fps:g}",
+            "-i",
+            "-",
+            "-an",
+            "-c:v",
+            self.codec,
+        ]
+        if self.preset:
+            cmd += ["-preset", str(self.preset)]
+        if self.crf is not None:
+            cmd += ["-crf", str(self.crf)]
+        if self.bitrate:
+            cmd += ["-b:v", str(self.bitrate)]
+        if self.threads:
+            cmd += ["-threads", str(self.threads)]
+        # yuv420p is what browsers decode; the GOP bounds how much a cut-off clip loses.
+        cmd += ["-pix_fmt", "yuv420p", "-g", str(max(1, int(round(fps * self.keyframe_interval_sec))))]
+        if self.fragmented:
+            cmd += ["-movflags", "+frag_keyframe+empty_moov+default_base_moof"]
+        else:
+            cmd += ["-movflags", "+faststart"]
+        return cmd + self.extra_args + ["-f", "mp4", str(path)]
+
+    def open(self, path: Path, fps: float, frame_size: Tuple[int, int]) -> None:
+        self._path = Path(path)
+        self._frame_size = (int(frame_size[0]), int(frame_size[1]))
+        self._frames = 0
+        self._failed = False
+        # stderr goes to a file: nothing drains a pipe while frames are written, and the process
+        # must be reaped with wait4 (not communicate) to read its rusage.
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(
+            self.command(self._path, fps, self._frame_size),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=self._stderr,
+        )
+
+    @property
+    def is_open(self) -> bool:
+        return self._proc is not None
+
+    def write(self, frame) -> None:
+        if self._failed:
+            return
+        width, height = self._frame_size
+        if frame.shape[1] != width or frame.shape[0] != height:
+            # Raw video has no per-frame size; a mismatched frame would shear the rest of the clip.
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        try:
+            self._proc.stdin.write(np.ascontiguousarray(frame).data)
+        except (BrokenPipeError, OSError) as exc:
+            self._failed = True
+            logging.warning("ffmpeg stopped accepting frames for %s: %s", self._path.name, exc)
+            return
+        self._frames += 1
+
+    def close(self, timeout: float = 60.0) -> Dict:
+        proc, self._proc = self._proc, None
+        stderr_file, self._stderr = self._stderr, None
+        try:
+            proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass  # stdin already broken; the process has exited or will shortly.
+        returncode, cpu_sec = _reap(proc, timeout)
+        stderr_file.seek(0)
+        stderr = stderr_file.read()
+        stderr_file.close()
+        if returncode != 0:
+            message = stderr.decode("utf-8", errors="replace").strip().splitlines()
+            logging.warning(
+                "ffmpeg exited with %s for %s: %s", proc.returncode, self._path.name, message[-1] if message else ""
+            )
+        return _clip_stats(self.backend, self.codec, self._path, self._frames, cpu_sec)
+
+
+def build_encoder(config: Dict):
+    """The configured backend; falls back to OpenCV (with a warning) when ffmpeg is not installed."""
+    backend = config.get("backend", "opencv")
+    if backend == "ffmpeg":
+        ffmpeg_path = config.get("ffmpeg_path") or shutil.which("ffmpeg")
+        if ffmpeg_path:
+            crf = config.get("crf", 26)
+            return FfmpegEncoder(
+                ffmpeg_path,
+                codec=config.get("codec", "libx264"),
+                preset=config.get("preset", "veryfast") or None,
+                crf=int(crf) if crf is not None else None,
+                bitrate=config.get("bitrate") or None,
+                fragmented=bool(config.get("fragmented", True)),
+                keyframe_interval_sec=float(config.get("keyframe_interval_sec", 2)),
+                threads=int(config.get("threads", 0)),
+                extra_args=config.get("extra_args") or [],
+            )
+        logging.warning("encoder.backend is ffmpeg but ffmpeg was not found; using OpenCV (mp4v)")
+    elif backend != "opencv":
+        raise ValueError(f"Unknown encoder backend: {backend}")
+    return OpenCVEncoder(config.get("fourcc", "mp4v"))
+
+
+def _clip_stats(backend: str, codec: str, path: Optional[Path], frames: int, cpu_sec: float) -> Dict:
+    try:
+        size = path.stat().st_size if path is not None else 0
+    except OSError:
+        size = 0
+    return {
+        "backend": backend,
+        "codec": codec,
+        "frames": frames,
+        "encode_cpu_sec": round(cpu_sec, 3),
+        "file_bytes": size,
+    }
+
+
+def _reap(proc: subprocess.Popen, timeout: float) -> Tuple[int, float]:
+    """
+    Wait for `proc` (killing it after `timeout`) and return (exit code, its own CPU seconds).
+    Without wait4 (Windows) the CPU time is reported as 0.
+    """
+    if not hasattr(os, "wait4"):
+        try:
+            return proc.wait(timeout=timeout), 0.0
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            return proc.wait(), 0.0
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+            if pid:
+                break
+            if time.monotonic() >= deadline:
+                proc.kill()
+                _, status, usage = os.wait4(proc.pid, 0)
+                break
+            time.sleep(0.02)
+    except ChildProcessError:
+        # Already reaped elsewhere; the exit status and rusage are gone.
+        return proc.wait(), 0.0
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, usage.ru_utime + usage.ru_stime
@@ -1,24 +1,36 @@
 """
 Entry point for the edge capture loop.
-Loads config, initializes YOLO, and orchestrates detection/recording.
+Loads config, initializes the detector, and orchestrates detection/recording.
+Optional integrations and run modes are imported only when enabled, and the detector is warmed up
+before the first frame; `--profile-startup` prints where start-up time goes.
 """
 
 from __future__ import annotations
 
 import argparse
+import contextlib
+import functools
 import logging
 import os
+import time
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
 import cv2
 import yaml
 from dotenv import load_dotenv
 
-from detection import YoloDetector
+import metrics
 from notifier import Notifier
-from recorder import Recorder
+from startup import StartupProfile
 from supabase_client import SupabaseClient
 
+if TYPE_CHECKING:
+    from recorder import Recorder
+
+# End of module imports; the start-up profile counts everything before this as import time.
+_IMPORTED_AT = time.perf_counter()
+
 
 def load_config(path: Path) -> dict:
     with open(path, "r", encoding="utf-8") as f:
@@ -37,6 +49,262 @@ def _expand_env_vars(value):
     return value
 
 
+def build_detector(config: dict, model_path: str, min_conf: float, target_classes: list):
+    """Create the configured detector backend; only the chosen backend's runtime is imported."""
+    detector_cfg = config.get("detector", {}) or {}
+    backend = detector_cfg.get("backend", "ultralytics")
+
+    if backend == "onnx":
+        from onnx_detector import OnnxDetector
+
+        return OnnxDetector(
+            model_path,
+            conf_threshold=min_conf,
+            target_classes=target_classes,
+            labels_path=detector_cfg.get("labels_path") or None,
+            input_size=int(detector_cfg.get("input_size", 640)),
+            iou_threshold=float(detector_cfg.get("iou_threshold", 0.45)),
+            num_threads=int(detector_cfg.get("num_threads", 0)),
+            providers=detector_cfg.get("providers") or None,
+        )
+    if backend != "ultralytics":
+        raise RuntimeError(f"Unknown detector backend: {backend}")
+
+    from detection import YoloDetector
+
+    input_size = detector_cfg.get("input_size")
+    return YoloDetector(
+        model_path,
+        conf_threshold=min_conf,
+        target_classes=target_classes,
+        input_size=int(input_size) if input_size else None,
+    )
+
+
+def warm_up_detector(detector, config: dict):
+    """Run `detector.warmup_runs` blank inferences so the first real frame pays no lazy initialization."""
+    runs = int((config.get("detector", {}) or {}).get("warmup_runs", 1))
+    if runs > 0:
+        detector.warmup(runs)
+    return detector
+
+
+def build_warm_detector(config: dict, model_path: str, min_conf: float, target_classes: list):
+    """`build_detector` plus warm-up, for the multi-process pipeline's detector process."""
+    return warm_up_detector(build_detector(config, model_path, min_conf, target_classes), config)
+
+
+def build_classifier(config: dict):
+    """SpeciesNet second stage, or None when disabled; onnxruntime is only imported when enabled."""
+    classifier_cfg = config.get("classifier", {}) or {}
+    if not classifier_cfg.get("enabled", False):
+        return None
+
+    from classifier import SpeciesClassifier
+
+    classifier = SpeciesClassifier(classifier_cfg)
+    logging.info("Species classifier loaded: %s (%d labels)", classifier.model_path, len(classifier.labels))
+    return classifier
+
+
+def build_timeline(config: dict):
+    """Per-clip detection timeline prototype, tagged with the model and thresholds that produced it."""
+    if not (config.get("timeline", {}) or {}).get("enabled", True):
+        return None
+
+    from timeline import DetectionTimeline
+    from utils.model_metadata import file_sha256
+
+    detector_cfg = config.get("detector", {}) or {}
+    attrs = {
+        "model_path": str(config.get("model_path")),
+        "detector_backend": detector_cfg.get("backend", "ultralytics"),
+        "input_size": detector_cfg.get("input_size"),
+        "min_confidence": float(config.get("min_confidence", 0.35)),
+        "target_classes": config.get("target_classes") or [],
+    }
+    try:
+        attrs["model_sha256"] = file_sha256(Path(config.get("model_path")))
+    except (OSError, TypeError):
+        # e.g. an ultralytics model name that is downloaded on first use
+        attrs["model_sha256"] = None
+    return DetectionTimeline(attrs)
+
+
+def build_preroll(config: dict):
+    """Pre-roll ring buffer, or None when `preroll.seconds` is 0."""
+    preroll_cfg = config.get("preroll", {}) or {}
+    if float(preroll_cfg.get("seconds", 0) or 0) <= 0:
+        return None
+
+    from preroll import PrerollBuffer
+
+    return PrerollBuffer.from_config(preroll_cfg)
+
+
+def build_tracker(config: dict):
+    """Per-clip object tracker, or None when disabled."""
+    tracker_cfg = config.get("tracker", {}) or {}
+    if not tracker_cfg.get("enabled", False):
+        return None
+
+    from tracker import Tracker
+
+    return Tracker.from_config(tracker_cfg)
+
+
+def build_thumbnail_selector(config: dict):
+    """Best-frame thumbnail selector, or None when `thumbnail.mode` is not "best"."""
+    thumbnail_cfg = config.get("thumbnail", {}) or {}
+    if thumbnail_cfg.get("mode", "best") != "best":
+        return None
+
+    from thumbnail import BestFrameSelector
+
+    return BestFrameSelector.from_config(thumbnail_cfg)
+
+
+def build_recorder(
+    config: dict,
+    output_dir: Path,
+    device_id: str,
+    fps: float,
+    notifier: Notifier,
+    supabase_client,
+    classifier=None,
+    clip_index=None,
+    retention=None,
+) -> Recorder:
+    """Recorder with the configured pre-roll, background writer, tracker and optional shared services."""
+    from clip_writer import ClipWriter
+    from recorder import Recorder
+
+    encoder_cfg = config.get("encoder", {}) or {}
+    return Recorder(
+        output_dir=output_dir,
+        device_id=device_id,
+        no_animal_timeout_sec=int(config.get("no_animal_timeout_sec", 5)),
+        notifier=notifier,
+        supabase_client=supabase_client,
+        fps=fps,
+        thumbnail_quality=int(config.get("thumbnail_quality", 85)),
+        preroll=build_preroll(config),
+        clip_writer=ClipWriter.from_config(config.get("recorder_io", {}) or {}, encoder_cfg),
+        classifier=classifier,
+        tracker=build_tracker(config),
+        clip_index=clip_index,
+        retention=retention,
+        thumbnail_selector=build_thumbnail_selector(config),
+        segment_sec=float(encoder_cfg.get("segment_sec", 0)),
+        timeline=build_timeline(config),
+    )
+
+
+def build_clip_index(config: dict):
+    """Local SQLite clip index shared by all recorders, or None when disabled."""
+    if not (config.get("clip_index", {}) or {}).get("enabled", True):
+        return None
+
+    from clip_index import ClipIndex, default_index_path
+
+    return ClipIndex(default_index_path(config))
+
+
+def build_retention(config: dict, output_dir: Path, clip_index=None):
+    """Disk retention manager (not yet started), or None when disabled."""
+    retention_cfg = config.get("retention", {}) or {}
+    if not retention_cfg.get("enabled", False):
+        return None
+
+    from retention import RetentionManager
+
+    return RetentionManager.from_config(output_dir, retention_cfg, clip_index)
+
+
+def run_multi_camera(
+    config: dict,
+    detector,
+    notifier: Notifier,
+    supabase_client,
+    classifier=None,
+    clip_index=None,
+    retention=None,
+    startup: Optional[StartupProfile] = None,
+    profile_startup: bool = False,
+) -> None:
+    """One capture thread and Recorder per entry in `cameras`, sharing the detector and clip services."""
+    from ingest import open_capture
+    from motion import MotionGate
+    from multicam import CameraWorker, SharedDetectorScheduler
+
+    base_output_dir = Path(config.get("output_dir", "./captures"))
+    multi_cfg = config.get("multi_camera", {}) or {}
+    gate_cfg = config.get("motion_gate", {}) or {}
+    ingest_cfg = config.get("ingest", {}) or {}
+
+    workers = []
+    for idx, camera in enumerate(config.get("cameras") or []):
+        device_id = camera.get("device_id") or f"{config.get('device_id', 'device')}-{idx}"
+        source = camera.get("source", idx)
+        with startup.phase("camera open") if startup else contextlib.nullcontext():
+            cap = open_capture(source, ingest_cfg, name=device_id)
+        if not cap.isOpened():
+            logging.error("[%s] Unable to open camera source: %s; skipping", device_id, source)
+            continue
+        recorder = build_recorder(
+            config,
+            Path(camera.get("output_dir") or base_output_dir / device_id),
+            device_id,
+            cap.get(cv2.CAP_PROP_FPS) or 20.0,
+            notifier,
+            supabase_client,
+            classifier,
+            clip_index,
+            retention,
+        )
+        # Per-camera motion_gate keys (e.g. a different roi) override the global section.
+        gate = MotionGate({**gate_cfg, **(camera.get("motion_gate") or {})})
+        workers.append(CameraWorker(device_id, cap, recorder, gate, priority=int(camera.get("priority", 0))))
+        logging.info("[%s] Camera added (source=%s)", device_id, source)
+
+    if not workers:
+        raise RuntimeError("No camera in `cameras` could be opened")
+
+    scheduler = SharedDetectorScheduler(
+        detector,
+        workers,
+        max_batch=int(multi_cfg.get("max_batch", len(workers))),
+        schedule=multi_cfg.get("schedule", "round_robin"),
+        stats_interval_sec=float(multi_cfg.get("stats_interval_sec", 30)),
+    )
+    if startup:
+        startup.finish(print_report=profile_startup)
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        logging.info("Interrupted by user; shutting down.")
+    finally:
+        scheduler.stop()
+        scheduler.log_stats()
+        for worker in workers:
+            worker.recorder.close()
+            worker.cap.release()
+
+
+def _shutdown(uploader, clip_index, retention, exporter, notifier: Notifier) -> None:
+    """Close the services every run mode shares, after the mode has stopped its own capture and recorders."""
+    if uploader:
+        uploader.close()
+    if clip_index:
+        clip_index.close()
+    if retention:
+        retention.close()
+    if exporter:
+        exporter.close()
+    notifier.close()
+    logging.info("Capture loop ended.")
+
+
 def setup_logging(level: str) -> None:
     logging.basicConfig(
         level=getattr(logging, level.upper(), logging.INFO),
@@ -44,54 +312,196 @@ def setup_logging(level: str) -> None:
     )
 
 
-def run(config_path: Path, video_path: Path | None = None, loop_video: bool = False) -> None:
-    load_dotenv()
-    config = load_config(config_path)
-    setup_logging(config.get("logging", {}).get("level", "INFO"))
+def run(
+    config_path: Path,
+    video_path: Path | None = None,
+    loop_video: bool = False,
+    pipelined: bool = False,
+    multiprocess: bool = False,
+    profile_startup: bool = False,
+) -> None:
+    startup = StartupProfile(_IMPORTED_AT)
+    with startup.phase("config"):
+        load_dotenv()
+        config = load_config(config_path)
+        setup_logging(config.get("logging", {}).get("level", "INFO"))
 
     camera_source = str(video_path) if video_path else config.get("camera_source", 0)
     model_path = config.get("model_path")
     output_dir = Path(config.get("output_dir", "./captures"))
     device_id = config.get("device_id", "device-unknown")
-    timeout_sec = int(config.get("no_animal_timeout_sec", 5))
     min_conf = float(config.get("min_confidence", 0.35))
     target_classes = config.get("target_classes") or []
-    thumbnail_quality = int(config.get("thumbnail_quality", 85))
+    pipeline_cfg = config.get("pipeline", {}) or {}
+    pipelined = pipelined or bool(pipeline_cfg.get("enabled", False))
+    multiprocess = multiprocess or bool(pipeline_cfg.get("multiprocess", False))
+    multi_camera = bool(config.get("cameras") and not video_path)
+    if multiprocess and multi_camera:
+        logging.warning("pipeline.multiprocess is not supported with `cameras`; using threads")
+        multiprocess = False
 
     if not model_path:
         raise RuntimeError("model_path missing in config.yaml")
 
-    notifier = Notifier(config.get("notifications", {}) or {})
-    supabase_client = SupabaseClient(config.get("supabase", {}) or {})
-    detector = YoloDetector(model_path, conf_threshold=min_conf, target_classes=target_classes)
+    with startup.phase("services"):
+        exporter = metrics.MetricsExporter.from_config(config.get("metrics", {}) or {})
+        if exporter:
+            exporter.start()
+
+        notifier = Notifier(config.get("notifications", {}) or {})
+        supabase_cfg = config.get("supabase", {}) or {}
+        supabase_client = SupabaseClient(supabase_cfg)
+        outbox_cfg = supabase_cfg.get("outbox", {}) or {}
+        uploader = None
+        if supabase_client.client and outbox_cfg.get("enabled", True):
+            from upload_outbox import OutboxUploader, UploadOutbox
+
+            outbox_path = Path(outbox_cfg.get("path") or output_dir / "upload_outbox.sqlite3")
+            uploader = OutboxUploader(UploadOutbox(outbox_path), supabase_client, outbox_cfg)
+        clip_index = build_clip_index(config)
+        retention = build_retention(config, output_dir, clip_index)
+        if retention:
+            retention.start()
+
+    # In multi-process mode the detector is loaded (and warmed up) inside its own process instead.
+    detector = None
+    if not multiprocess:
+        with startup.phase("model load"):
+            detector = build_detector(config, model_path, min_conf, target_classes)
+        with startup.phase("warm-up"):
+            warm_up_detector(detector, config)
+    with startup.phase("classifier load"):
+        classifier = build_classifier(config)
+
+    if multi_camera:
+        logging.info("Multi-camera mode with %d camera(s)", len(config["cameras"]))
+        try:
+            run_multi_camera(
+                config,
+                detector,
+                notifier,
+                uploader or supabase_client,
+                classifier,
+                clip_index,
+                retention,
+                startup=startup,
+                profile_startup=profile_startup,
+            )
+        finally:
+            _shutdown(uploader, clip_index, retention, exporter, notifier)
+        return
 
     if video_path and not video_path.exists():
         raise RuntimeError(f"Video file not found: {video_path}")
 
-    cap = cv2.VideoCapture(camera_source)
+    if multiprocess:
+        from shm_pipeline import MultiProcessPipeline
+
+        pipeline = MultiProcessPipeline(
+            camera_source,
+            functools.partial(build_warm_detector, config, model_path, min_conf, target_classes),
+            gate_config=config.get("motion_gate", {}) or {},
+            ingest_config=None if video_path else config.get("ingest", {}) or {},
+            realtime=video_path is None,
+            loop_video=bool(video_path and loop_video),
+            ring_slots=int(pipeline_cfg.get("ring_slots", 8)),
+            stats_interval_sec=float(pipeline_cfg.get("stats_interval_sec", 30)),
+        )
+        # Camera open, model load and warm-up all happen in the child processes.
+        with startup.phase("pipeline start"):
+            pipeline.start()
+        recorder = build_recorder(
+            config,
+            output_dir,
+            device_id,
+            pipeline.fps,
+            notifier,
+            uploader or supabase_client,
+            classifier,
+            clip_index,
+            retention,
+        )
+        startup.finish(print_report=profile_startup)
+        logging.info("Capture loop started (device_id=%s, source=%s) [multiprocess]", device_id, camera_source)
+        try:
+            pipeline.run(recorder)
+        except KeyboardInterrupt:
+            logging.info("Interrupted by user; shutting down.")
+        finally:
+            pipeline.stop()
+            recorder.close()
+            _shutdown(uploader, clip_index, retention, exporter, notifier)
+        return
+
+    from motion import MotionGate
+
+    motion_gate = MotionGate(config.get("motion_gate", {}) or {})
+    with startup.phase("camera open"):
+        from ingest import MediaClock, StreamIngest, open_capture
+
+        if video_path:
+            cap = cv2.VideoCapture(camera_source)
+        else:
+            # Live sources go through StreamIngest: freshest frame, capture timestamps, reconnects.
+            cap = open_capture(camera_source, config.get("ingest", {}) or {}, name=device_id)
     if not cap.isOpened():
         raise RuntimeError(f"Unable to open camera source: {camera_source}")
+    ingest = cap if isinstance(cap, StreamIngest) else None
 
     fps = cap.get(cv2.CAP_PROP_FPS) or 20.0
-    recorder = Recorder(
-        output_dir=output_dir,
-        device_id=device_id,
-        no_animal_timeout_sec=timeout_sec,
-        notifier=notifier,
-        supabase_client=supabase_client,
-        fps=fps,
-        thumbnail_quality=thumbnail_quality,
+    # Files are stamped in media time so clip timing and the pre-roll window do not depend on decode speed.
+    media_clock = MediaClock(fps) if video_path else None
+    recorder = build_recorder(
+        config,
+        output_dir,
+        device_id,
+        fps,
+        notifier,
+        uploader or supabase_client,
+        classifier,
+        clip_index,
+        retention,
     )
 
+    startup.finish(print_report=profile_startup)
     logging.info(
-        "Capture loop started (device_id=%s, source=%s%s)",
+        "Capture loop started (device_id=%s, source=%s%s%s)",
         device_id,
         camera_source,
         " [loop]" if video_path and loop_video else "",
+        " [pipelined]" if pipelined else "",
     )
+
+    if pipelined:
+        from pipeline import CapturePipeline
+
+        pipeline = CapturePipeline(
+            cap,
+            lambda frame: motion_gate.filter(frame, recorder.recording, detector.detect),
+            recorder,
+            infer_queue_size=int(pipeline_cfg.get("infer_queue_size", 1)),
+            record_queue_size=int(pipeline_cfg.get("record_queue_size", 64)),
+            realtime=video_path is None,
+            loop_video=bool(video_path and loop_video),
+            stats_interval_sec=float(pipeline_cfg.get("stats_interval_sec", 30)),
+        )
+        try:
+            pipeline.run()
+        except KeyboardInterrupt:
+            logging.info("Interrupted by user; shutting down.")
+        finally:
+            pipeline.stop()
+            recorder.close()
+            cap.release()
+            if motion_gate.enabled:
+                logging.info("Motion gate: %s", motion_gate.summary())
+            _shutdown(uploader, clip_index, retention, exporter, notifier)
+        return
+
     frames_read = 0
     try:
         while True:
+            started = time.perf_counter()
             ret, frame = cap.read()
             if not ret:
                 if video_path and loop_video and frames_read > 0:
@@ -101,15 +511,24 @@ def run(config_path: Path, video_path: Path | None = None, loop_video: bool = Fa
                 logging.warning("Failed to read frame; stopping loop")
                 break
 
+            metrics.observe("read", time.perf_counter() - started)
+            metrics.inc("edge_frames_total")
             frames_read += 1
-            _, species_counts = detector.detect(frame)
-            recorder.process_frame(frame, species_counts)
+            detections, species_counts = motion_gate.filter(frame, recorder.recording, detector.detect)
+            recorder.process_frame(
+                frame,
+                species_counts,
+                detections=detections,
+                timestamp=ingest.last_captured_at if ingest else media_clock.next() if media_clock else None,
+            )
     except KeyboardInterrupt:
         logging.info("Interrupted by user; shutting down.")
     finally:
         recorder.close()
         cap.release()
-        logging.info("Capture loop ended.")
+        if motion_gate.enabled:
+            logging.info("Motion gate: %s", motion_gate.summary())
+        _shutdown(uploader, clip_index, retention, exporter, notifier)
 
 
 if __name__ == "__main__":
@@ -125,5 +544,27 @@ if __name__ == "__main__":
         action="store_true",
         help="When set with --video, restart from the beginning after reaching the end of the file",
     )
+    parser.add_argument(
+        "--pipelined",
+        action="store_true",
+        help="Run capture, inference and recording on separate threads (same as pipeline.enabled)",
+    )
+    parser.add_argument(
+        "--multiprocess",
+        action="store_true",
+        help="Run capture and detection in separate processes sharing frames via shared memory",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Print a breakdown of import, config, model load, warm-up and camera open times",
+    )
     args = parser.parse_args()
-    run(args.config, video_path=args.video, loop_video=args.loop_video)
+    run(
+        args.config,
+        video_path=args.video,
+        loop_video=args.loop_video,
+        pipelined=args.pipelined,
+        multiprocess=args.multiprocess,
+        profile_startup=args.profile_startup,
+    )
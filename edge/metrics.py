@@ -0,0 +1,365 @@
+"""
+Low-overhead instrumentation for the edge loop.
+Hot paths only bump counters or drop one latency sample into a fixed-bucket histogram;
+queue depths and memory are read lazily when metrics are scraped. A small HTTP server exposes
+them in the Prometheus text format on /metrics, and an optional thread appends a rolling CSV.
+"""
+
+from __future__ import annotations
+
+import bisect
+import csv
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Latency buckets in seconds, from sub-millisecond reads to multi-second uploads.
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _csv_key(name: str, key: LabelKey) -> str:
+    """Compact column name for CSV rows, e.g. edge_stage_seconds.inference."""
+    return name + "".join(f".{value}" for _, value in key)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bucket edge holding the q-th sample (coarse, but free to compute)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        running = 0
+        for edge, count in zip(self.buckets, self.counts):
+            running += count
+            if running >= rank:
+                return edge
+        return self.buckets[-1]
+
+
+class Registry:
+    """Counters, gauges and histograms keyed by name and label set."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        # Evaluated at scrape time: name -> list of (labels, fn).
+        self._callbacks: Dict[str, List[Tuple[LabelKey, Callable[[], float]]]] = {}
+        self.started = time.time()
+
+    def describe(self, name: str, kind: str, help_text: str, buckets: Tuple[float, ...] = STAGE_BUCKETS) -> None:
+        with self._lock:
+            self._help[name] = (kind, help_text)
+            if kind == "histogram":
+                self._buckets[name] = buckets
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = float(value)
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = _Histogram(self._buckets.get(name, STAGE_BUCKETS))
+            hist.observe(seconds)
+
+    def register_callback(self, name: str, fn: Callable[[], float], **labels) -> None:
+        """Read a value (queue depth, memory, a component's own counter) only when scraped."""
+        with self._lock:
+            entries = self._callbacks.setdefault(name, [])
+            key = _label_key(labels)
+            entries[:] = [(k, f) for k, f in entries if k != key] + [(key, fn)]
+
+    def unregister_callbacks(self, **labels) -> None:
+        """Drop callbacks carrying these labels (e.g. a camera that stopped)."""
+        wanted = set(_label_key(labels))
+        with self._lock:
+            for name, entries in self._callbacks.items():
+                entries[:] = [(k, f) for k, f in entries if not wanted.issubset(set(k))]
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            counters = {n: dict(s) for n, s in self._counters.items()}
+            gauges = {n: dict(s) for n, s in self._gauges.items()}
+            callbacks = {n: list(e) for n, e in self._callbacks.items()}
+            histograms = {
+                n: {k: (list(h.counts), h.total, h.count, h.buckets) for k, h in s.items()}
+                for n, s in self._histograms.items()
+            }
+            help_map = dict(self._help)
+
+        for name, entries in callbacks.items():
+            series = gauges.setdefault(name, {})
+            for key, fn in entries:
+                try:
+                    series[key] = float(fn())
+                except Exception:  # noqa: BLE001 - a broken probe must not break the scrape
+                    continue
+
+        for kind, metrics in (("counter", counters), ("gauge", gauges)):
+            for name, series in sorted(metrics.items()):
+                declared, help_text = help_map.get(name, (kind, name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {declared}")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+
+        for name, series in sorted(histograms.items()):
+            _, help_text = help_map.get(name, ("histogram", name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, (counts, total, count, buckets) in sorted(series.items()):
+                running = 0
+                for edge, bucket_count in zip(buckets, counts):
+                    running += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', f'{edge:g}'))} {running}")
+                lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+                lines.append(f"{name}_sum{_format_labels(key)} {total:g}")
+                lines.append(f"{name}_count{_format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def flat_snapshot(self) -> Dict[str, float]:
+        """One value per series (histograms as count/avg/p95) for CSV rows."""
+        row: Dict[str, float] = {}
+        with self._lock:
+            for name, series in self._counters.items():
+                for key, value in series.items():
+                    row[_csv_key(name, key)] = value
+            for name, series in self._gauges.items():
+                for key, value in series.items():
+                    row[_csv_key(name, key)] = value
+            for name, series in self._histograms.items():
+                for key, hist in series.items():
+                    base = _csv_key(name, key)
+                    row[base + "_count"] = hist.count
+                    row[base + "_avg_ms"] = round(1000.0 * hist.total / hist.count, 3) if hist.count else 0.0
+                    row[base + "_p95_ms"] = round(1000.0 * hist.quantile(0.95), 3)
+            callbacks = {n: list(e) for n, e in self._callbacks.items()}
+        for name, entries in callbacks.items():
+            for key, fn in entries:
+                try:
+                    row[_csv_key(name, key)] = float(fn())
+                except Exception:  # noqa: BLE001 - a broken probe must not break the dump
+                    continue
+        return row
+
+
+REGISTRY = Registry()
+REGISTRY.describe("edge_stage_seconds", "histogram", "Latency of each processing stage")
+REGISTRY.describe("edge_frames_total", "counter", "Frames read from the capture source")
+REGISTRY.describe("edge_frames_dropped_total", "counter", "Frames dropped by bounded queues")
+REGISTRY.describe("edge_inferences_total", "counter", "Detector runs (frames)")
+REGISTRY.describe("edge_queue_depth", "gauge", "Items waiting in each bounded queue")
+REGISTRY.describe("edge_recording", "gauge", "1 while a clip is being recorded")
+REGISTRY.describe("edge_clips_total", "counter", "Clips finished")
+REGISTRY.describe("edge_stream_connected", "gauge", "1 while the camera stream is connected")
+REGISTRY.describe("edge_stream_reconnects_total", "counter", "Camera stream reconnects")
+REGISTRY.describe("edge_process_resident_bytes", "gauge", "Resident memory of this process")
+REGISTRY.describe("edge_uptime_seconds", "gauge", "Seconds since the metrics registry was created")
+REGISTRY.describe("edge_startup_seconds", "gauge", "Time spent in each start-up phase before the capture loop")
+
+
+def observe(stage: str, seconds: float, **labels) -> None:
+    """Record one latency sample for a pipeline stage."""
+    REGISTRY.observe("edge_stage_seconds", seconds, stage=stage, **labels)
+
+
+@contextmanager
+def timed(stage: str, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe("edge_stage_seconds", time.perf_counter() - started, stage=stage, **labels)
+
+
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    REGISTRY.inc(name, value, **labels)
+
+
+def register_gauge(name: str, fn: Callable[[], float], help_text: Optional[str] = None, **labels) -> None:
+    if help_text:
+        REGISTRY.describe(name, "gauge", help_text)
+    REGISTRY.register_callback(name, fn, **labels)
+
+
+def resident_bytes() -> float:
+    """Current RSS from /proc on Linux; peak RSS from getrusage elsewhere."""
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            return float(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        import resource
+
+        return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) * 1024.0
+
+
+REGISTRY.register_callback("edge_process_resident_bytes", resident_bytes)
+REGISTRY.register_callback("edge_uptime_seconds", lambda: time.time() - REGISTRY.started)
+
+
+def _http_server(host: str, port: int):
+    """`/metrics` HTTP server; http.server is only imported when the endpoint is enabled."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            """Keep scrapes out of the application log."""
+
+    return ThreadingHTTPServer((host, port), MetricsHandler)
+
+
+class MetricsExporter:
+    """
+    Serves REGISTRY on http://host:port/metrics and/or appends it to a rolling CSV.
+    CSV rows carry per-second rates for counters (e.g. capture fps) computed between dumps;
+    the file is rotated to `<name>.1` once it exceeds `csv_max_mb`. When a new series appears, the
+    file is rewritten with the wider header, so it always has a single header row.
+    """
+
+    def __init__(self, config: Dict) -> None:
+        self.host = config.get("host", "127.0.0.1")
+        self.port = int(config.get("port", 9108))
+        self.csv_path = Path(config["csv_path"]) if config.get("csv_path") else None
+        self.csv_interval_sec = float(config.get("csv_interval_sec", 60))
+        self.csv_max_bytes = int(float(config.get("csv_max_mb", 10)) * 1024 * 1024)
+
+        self._server = None
+        self._stop = threading.Event()
+        self._csv_thread: Optional[threading.Thread] = None
+        self._csv_columns: Optional[List[str]] = None
+        self._last_row: Dict[str, float] = {}
+        self._last_time = time.monotonic()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> Optional["MetricsExporter"]:
+        if not config.get("enabled", False):
+            return None
+        return cls(config)
+
+    def start(self) -> None:
+        if self.port:
+            self._server = _http_server(self.host, self.port)
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+            logging.info("Metrics on http://%s:%d/metrics", self.host, self.port)
+        if self.csv_path:
+            self._csv_thread = threading.Thread(target=self._run_csv, name="metrics-csv", daemon=True)
+            self._csv_thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._csv_thread is not None:
+            self._csv_thread.join(timeout=5.0)
+            self.dump_csv()
+
+    def dump_csv(self) -> None:
+        now = time.monotonic()
+        snapshot = REGISTRY.flat_snapshot()
+        elapsed = max(now - self._last_time, 1e-6)
+        row: Dict[str, float] = {"timestamp": round(time.time(), 3)}
+        row.update(snapshot)
+        for name, value in snapshot.items():
+            if name.split(".", 1)[0].endswith("_total"):
+                row[name + "_per_sec"] = round((value - self._last_row.get(name, 0.0)) / elapsed, 3)
+        self._last_row, self._last_time = snapshot, now
+
+        self.csv_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.csv_path.exists() and self.csv_path.stat().st_size > self.csv_max_bytes:
+            os.replace(self.csv_path, self.csv_path.with_name(self.csv_path.name + ".1"))
+            self._csv_columns = None
+        if self._csv_columns is None and self.csv_path.exists():
+            # Keep appending to the file an earlier run left behind, under its header.
+            with open(self.csv_path, "r", newline="", encoding="utf-8") as f:
+                self._csv_columns = next(csv.reader(f), None)
+        new_columns = [c for c in row if c not in (self._csv_columns or [])]
+        if self._csv_columns and new_columns:
+            # New series appeared (e.g. the first clip): widen the header, older rows get empty cells.
+            self._csv_columns = self._csv_columns + new_columns
+            self._rewrite_csv()
+        elif self._csv_columns is None:
+            self._csv_columns = new_columns
+        write_header = not self.csv_path.exists()
+        with open(self.csv_path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=self._csv_columns, extrasaction="ignore")
+            if write_header:
+                writer.writeheader()
+            writer.writerow(row)
+
+    def _rewrite_csv(self) -> None:
+        """Rewrite the CSV under the current columns (atomically), so every row has one header."""
+        tmp_path = self.csv_path.with_name(self.csv_path.name + ".tmp")
+        with open(self.csv_path, "r", newline="", encoding="utf-8") as src, open(
+            tmp_path, "w", newline="", encoding="utf-8"
+        ) as dst:
+            writer = csv.DictWriter(dst, fieldnames=self._csv_columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(csv.DictReader(src))
+        os.replace(tmp_path, self.csv_path)
+
+    def _run_csv(self) -> None:
+        while not self._stop.wait(self.csv_interval_sec):
+            try:
+                self.dump_csv()
+            except OSError as exc:
+                logging.warning("Metrics CSV dump failed: %s", exc)
@@ -0,0 +1,160 @@
+"""
+Cheap motion pre-filter that decides whether a frame is worth running YOLO on.
+Works on a small grayscale copy of the frame so it costs a fraction of one inference.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Gates detector calls on scene changes inside an optional region of interest.
+    - Idle: run the detector only on frames with motion; otherwise report no animals.
+    - Recording: also run it every `active_infer_every_n` frames so the recorder sees the
+      animal leave (or stay still) and its silence timeout keeps working. Skipped frames
+      reuse the last detector result.
+    """
+
+    def __init__(self, config: Dict) -> None:
+        self.enabled = bool(config.get("enabled", False))
+        self.method = config.get("method", "diff")  # diff | mog2
+        self.downscale_width = int(config.get("downscale_width", 160))
+        self.pixel_threshold = int(config.get("pixel_threshold", 25))
+        self.min_area_ratio = float(config.get("min_area_ratio", 0.002))
+        self.background_alpha = float(config.get("background_alpha", 0.05))
+        self.active_infer_every_n = max(1, int(config.get("active_infer_every_n", 5)))
+        self.log_interval_sec = float(config.get("log_interval_sec", 60))
+        self.roi = config.get("roi")  # [x1, y1, x2, y2] as fractions of the frame
+        self.roi_mask_path = config.get("roi_mask")  # image where white pixels are watched
+
+        self.frames_seen = 0
+        self.inferences_run = 0
+        self.inferences_skipped = 0
+        self.last_motion_ratio = 0.0
+
+        self._background: Optional[np.ndarray] = None
+        self._subtractor = None
+        self._mask: Optional[np.ndarray] = None
+        self._mask_pixels = 0
+        self._small_size: Optional[tuple] = None
+        self._since_inference = 0
+        self._last_counts: Dict[str, int] = {}
+        self._last_log = time.monotonic()
+
+    def filter(
+        self,
+        frame,
+        recording: bool,
+        detect_fn: Callable[[object], Tuple[List[Dict], Dict[str, int]]],
+    ) -> Tuple[Optional[List[Dict]], Dict[str, int]]:
+        """
+        Return `(detections, species_counts)` for `frame`, calling `detect_fn` only when the gate opens.
+        Skipped frames get `None` detections (the detector did not look at them) but keep the held counts.
+        """
+        if self.should_infer(frame, recording):
+            detections, counts = detect_fn(frame)
+            self.record_result(counts)
+            return detections, counts
+        return None, self.held_counts(recording)
+
+    def should_infer(self, frame, recording: bool) -> bool:
+        """Decide whether this frame needs the detector. Callers that batch inference use this
+        directly and report back through `record_result`; skipped frames use `held_counts`."""
+        self.frames_seen += 1
+        if not self.enabled:
+            self.inferences_run += 1
+            return True
+
+        moving = self.has_motion(frame)
+        self._since_inference += 1
+        due = recording and self._since_inference >= self.active_infer_every_n
+        self._maybe_log()
+
+        if moving or due:
+            self._since_inference = 0
+            self.inferences_run += 1
+            return True
+        self.inferences_skipped += 1
+        return False
+
+    def record_result(self, species_counts: Dict[str, int]) -> None:
+        self._last_counts = species_counts
+
+    def held_counts(self, recording: bool) -> Dict[str, int]:
+        """Counts to report for a skipped frame: the last result while recording, otherwise none."""
+        if not recording:
+            self._last_counts = {}
+        return self._last_counts
+
+    def has_motion(self, frame) -> bool:
+        """Update the background model and report whether enough of the ROI changed."""
+        small = self._prepare(frame)
+        if self.method == "mog2":
+            if self._subtractor is None:
+                self._subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False)
+            changed = self._subtractor.apply(small)
+        else:
+            if self._background is None:
+                self._background = small.astype(np.float32)
+                return True
+            diff = cv2.absdiff(small, cv2.convertScaleAbs(self._background))
+            _, changed = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+            cv2.accumulateWeighted(small, self._background, self.background_alpha)
+
+        if self._mask is not None:
+            changed = cv2.bitwise_and(changed, self._mask)
+        self.last_motion_ratio = cv2.countNonZero(changed) / float(self._mask_pixels or changed.size)
+        return self.last_motion_ratio >= self.min_area_ratio
+
+    def summary(self) -> str:
+        total = self.inferences_run + self.inferences_skipped
+        saved = (100.0 * self.inferences_skipped / total) if total else 0.0
+        return (
+            f"motion gate skipped {self.inferences_skipped}/{total} inferences ({saved:.1f}% saved)"
+        )
+
+    def _prepare(self, frame) -> np.ndarray:
+        height, width = frame.shape[:2]
+        if self._small_size is None:
+            scale = min(1.0, self.downscale_width / float(width))
+            self._small_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+            self._mask = self._build_mask(*self._small_size)
+            self._mask_pixels = cv2.countNonZero(self._mask) if self._mask is not None else 0
+
+        small = cv2.resize(frame, self._small_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def _build_mask(self, width: int, height: int) -> Optional[np.ndarray]:
+        if self.roi_mask_path:
+            mask = cv2.imread(str(self.roi_mask_path), cv2.IMREAD_GRAYSCALE)
+            if mask is None:
+                logging.warning("Could not read ROI mask %s; watching the full frame", self.roi_mask_path)
+                return None
+            mask = cv2.resize(mask, (width, height), interpolation=cv2.INTER_NEAREST)
+            _, mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
+            return mask
+
+        if self.roi:
+            x1, y1, x2, y2 = [float(v) for v in self.roi]
+            mask = np.zeros((height, width), dtype=np.uint8)
+            mask[int(y1 * height) : int(y2 * height), int(x1 * width) : int(x2 * width)] = 255
+            return mask
+
+        return None
+
+    def _maybe_log(self) -> None:
+        if not self.log_interval_sec:
+            return
+        now = time.monotonic()
+        if now - self._last_log >= self.log_interval_sec:
+            logging.info("Motion gate: %s", self.summary())
+            self._last_log = now
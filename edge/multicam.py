@@ -0,0 +1,245 @@
+"""
+Multi-camera mode: one capture thread and Recorder per camera, one shared detector.
+The detector thread batches pending frames across cameras so a single model copy serves a whole site.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+
+import metrics
+from motion import MotionGate
+from recorder import Recorder
+
+
+class CameraWorker:
+    """
+    Reads one camera on its own thread and feeds its Recorder.
+    Frames that pass the motion gate are offered to the shared detector through a one-slot
+    mailbox (newer frames replace older ones). A frame is recorded with a result that arrived since
+    the previous frame; other frames hold the last result only while recording, like the gate.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        cap: cv2.VideoCapture,
+        recorder: Recorder,
+        motion_gate: MotionGate,
+        priority: int = 0,
+    ) -> None:
+        self.name = name
+        self.cap = cap
+        self.recorder = recorder
+        self.motion_gate = motion_gate
+        self.priority = priority
+
+        self.frames_read = 0
+        self.frames_offered = 0
+        self.frames_replaced = 0
+        self.inferences = 0
+        self.last_latency_ms = 0.0
+        self.total_latency_ms = 0.0
+        self.alive = True
+
+        self._pending: Optional[Tuple[float, object]] = None
+        self._new_counts: Optional[Dict[str, int]] = None
+        self._fresh: Optional[Tuple[object, List[Dict]]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"camera-{name}", daemon=True)
+
+    def start(self) -> None:
+        self._started = time.monotonic()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+
+    def take_pending(self) -> Optional[Tuple[float, object]]:
+        """Hand the waiting frame (capture time, frame) to the detector, if any."""
+        with self._lock:
+            pending, self._pending = self._pending, None
+        return pending
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            return self._pending is not None
+
+    def pending_since(self) -> float:
+        with self._lock:
+            return self._pending[0] if self._pending else float("inf")
+
+    def set_result(
+        self,
+        captured_at: float,
+        frame,
+        detections: List[Dict],
+        species_counts: Dict[str, int],
+    ) -> None:
+        latency_ms = (time.monotonic() - captured_at) * 1000.0
+        with self._lock:
+            self._new_counts = species_counts
+            self._fresh = (frame, detections)
+            self.inferences += 1
+            self.last_latency_ms = latency_ms
+            self.total_latency_ms += latency_ms
+        self.motion_gate.record_result(species_counts)
+
+    def stats(self) -> Dict[str, float]:
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        with self._lock:
+            avg_latency = self.total_latency_ms / self.inferences if self.inferences else 0.0
+            return {
+                "fps": round(self.frames_read / elapsed, 2),
+                "inference_fps": round(self.inferences / elapsed, 2),
+                "frames_read": self.frames_read,
+                "frames_offered": self.frames_offered,
+                "frames_replaced": self.frames_replaced,
+                "last_latency_ms": round(self.last_latency_ms, 1),
+                "avg_latency_ms": round(avg_latency, 1),
+                "recording": self.recorder.recording,
+            }
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                ret, frame = self.cap.read()
+                if not ret:
+                    logging.warning("[%s] Failed to read frame; stopping camera", self.name)
+                    break
+                metrics.observe("read", time.perf_counter() - started, camera=self.name)
+                metrics.inc("edge_frames_total", camera=self.name)
+                self.frames_read += 1
+
+                if self.motion_gate.should_infer(frame, self.recorder.recording):
+                    with self._lock:
+                        if self._pending is not None:
+                            self.frames_replaced += 1
+                        self._pending = (time.monotonic(), frame)
+                    self.frames_offered += 1
+
+                with self._lock:
+                    new_counts, self._new_counts = self._new_counts, None
+                    fresh, self._fresh = self._fresh, None
+                # A new detector result counts on this frame; other frames hold the last one only while
+                # recording (`MotionGate.held_counts`), as in single-camera mode.
+                if new_counts is not None:
+                    species_counts = new_counts
+                else:
+                    species_counts = self.motion_gate.held_counts(self.recorder.recording)
+                self.recorder.process_frame(
+                    frame,
+                    species_counts,
+                    timestamp=getattr(self.cap, "last_captured_at", None),
+                )
+                if fresh is not None:
+                    self.recorder.add_detections(*fresh)
+        except Exception as exc:  # noqa: BLE001 - one camera failing must not take down the others
+            logging.exception("[%s] Camera worker crashed: %s", self.name, exc)
+        finally:
+            self.alive = False
+
+
+class SharedDetectorScheduler:
+    """
+    Single detector thread serving many CameraWorkers.
+    - schedule="round_robin": rotate which camera goes first so none is starved.
+    - schedule="priority": higher `priority` cameras first, then the oldest waiting frame.
+    Up to `max_batch` pending frames are run through `detect_batch` in one call.
+    """
+
+    def __init__(
+        self,
+        detector,
+        workers: List[CameraWorker],
+        max_batch: int = 4,
+        schedule: str = "round_robin",
+        stats_interval_sec: float = 30.0,
+    ) -> None:
+        if schedule not in ("round_robin", "priority"):
+            raise ValueError(f"Unknown camera schedule: {schedule}")
+        self.detector = detector
+        self.workers = workers
+        self.max_batch = max(1, int(max_batch))
+        self.schedule = schedule
+        self.stats_interval_sec = stats_interval_sec
+
+        self.batches = 0
+        self.frames_inferred = 0
+        self.last_batch_ms = 0.0
+        self._next_start = 0
+
+    def run(self) -> None:
+        """Serve detection requests until every camera has stopped."""
+        for worker in self.workers:
+            worker.start()
+
+        last_stats = time.monotonic()
+        while any(worker.alive for worker in self.workers):
+            picked = self._pick()
+            if not picked:
+                time.sleep(0.002)
+            else:
+                self._infer(picked)
+
+            if self.stats_interval_sec and time.monotonic() - last_stats >= self.stats_interval_sec:
+                self.log_stats()
+                last_stats = time.monotonic()
+
+    def stop(self) -> None:
+        for worker in self.workers:
+            worker.stop()
+
+    def log_stats(self) -> None:
+        logging.info(
+            "Detector: %d batches, %d frames, last batch %.1fms",
+            self.batches,
+            self.frames_inferred,
+            self.last_batch_ms,
+        )
+        for worker in self.workers:
+            logging.info("[%s] %s", worker.name, worker.stats())
+
+    def _pick(self) -> List[Tuple[CameraWorker, float, object]]:
+        ready = [worker for worker in self.workers if worker.has_pending()]
+        if not ready:
+            return []
+
+        if self.schedule == "priority":
+            ready.sort(key=lambda worker: (-worker.priority, worker.pending_since()))
+        else:
+            count = len(self.workers)
+            order = {id(worker): (idx - self._next_start) % count for idx, worker in enumerate(self.workers)}
+            ready.sort(key=lambda worker: order[id(worker)])
+            self._next_start = (self._next_start + 1) % count
+
+        picked = []
+        for worker in ready[: self.max_batch]:
+            pending = worker.take_pending()
+            if pending is not None:
+                picked.append((worker, pending[0], pending[1]))
+        return picked
+
+    def _infer(self, picked: List[Tuple[CameraWorker, float, object]]) -> None:
+        started = time.perf_counter()
+        try:
+            results = self.detector.detect_batch([frame for _, _, frame in picked])
+        except Exception as exc:  # noqa: BLE001 - keep serving the other cameras
+            logging.warning("Batched inference failed: %s", exc)
+            return
+        self.last_batch_ms = (time.perf_counter() - started) * 1000.0
+        self.batches += 1
+        self.frames_inferred += len(picked)
+
+        for (worker, captured_at, frame), (detections, species_counts) in zip(picked, results):
+            worker.set_result(captured_at, frame, detections, species_counts)
@@ -1,12 +1,54 @@
 """
 Notification helpers for new clips (Telegram Bot API or Discord webhook).
+Messages are sent from a background worker over a pooled HTTP session, rate limited per
+provider, and bursts of clips are coalesced into one summary message.
+`requests` is only imported when notifications are enabled.
 """
 
+from __future__ import annotations
+
 import logging
 import os
-from typing import Dict
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import metrics
+
+if TYPE_CHECKING:
+    import requests
+
+_STOP = object()
+
 
-import requests
+class TokenBucket:
+    """Classic token bucket: `rate_per_min` sustained, up to `burst` back-to-back sends."""
+
+    def __init__(self, rate_per_min: float, burst: int) -> None:
+        self.rate_per_sec = max(float(rate_per_min), 0.001) / 60.0
+        self.capacity = max(1, int(burst))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def wait_time(self) -> float:
+        """Seconds until one token is available (0 if one can be taken now)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_sec)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate_per_sec
+
+    def take(self) -> None:
+        self.tokens -= 1.0
+
+    def block_for(self, seconds: float) -> None:
+        """Honour a provider-issued Retry-After."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
 
 
 class Notifier:
@@ -15,37 +57,172 @@ class Notifier:
         self.provider = config.get("provider", "telegram")
         self.telegram = config.get("telegram", {}) or {}
         self.discord = config.get("discord", {}) or {}
+        self.timeout_sec = float(config.get("timeout_sec", 10))
+        self.coalesce_window_sec = float(config.get("coalesce_window_sec", 15))
+        self.max_retries = int(config.get("max_retries", 3))
+        # Defaults stay under Telegram's ~20 msg/min per chat and Discord's 30 req/min per webhook.
+        rate_cfg = config.get("rate_limit", {}) or {}
+        self.buckets = {
+            provider: TokenBucket(
+                rate_per_min=float((rate_cfg.get(provider) or {}).get("per_minute", default_rate)),
+                burst=int((rate_cfg.get(provider) or {}).get("burst", 3)),
+            )
+            for provider, default_rate in (("telegram", 18), ("discord", 25))
+        }
+
+        self.sent = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.clips_coalesced = 0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+
+        self._session: Optional[requests.Session] = None
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        if self.enabled:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=2)
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+            self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+            self._thread.start()
+            metrics.register_gauge("edge_queue_depth", self._queue.qsize, queue="notify")
 
     def send_new_clip_notification(self, clip_metadata: Dict) -> None:
+        """Queue a clip for notification; returns immediately."""
         if not self.enabled:
             return
+        self._queue.put((time.monotonic(), clip_metadata))
 
-        try:
-            if self.provider == "discord":
-                self._send_discord(clip_metadata)
-            else:
-                self._send_telegram(clip_metadata)
-        except Exception as exc:  # noqa: BLE001 - best-effort notify
-            logging.warning("Notification failed: %s", exc)
-
-    def _send_telegram(self, clip_metadata: Dict) -> None:
+    def close(self, timeout: float = 15.0) -> None:
+        """Flush queued notifications and stop the worker."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+        self._session.close()
+        logging.info("Notifier stats: %s", self.stats())
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self._queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "clips_coalesced": self.clips_coalesced,
+            "last_latency_ms": round(self.last_latency_ms, 1),
+            "max_latency_ms": round(self.max_latency_ms, 1),
+        }
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            # Collect everything that arrives within the coalescing window into one message.
+            batch = [item]
+            deadline = time.monotonic() + self.coalesce_window_sec
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    nxt = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stopping = True
+                    break
+                batch.append(nxt)
+
+            self._deliver(batch)
+
+    def _deliver(self, batch: List) -> None:
+        import requests
+
+        if len(batch) > 1:
+            self.clips_coalesced += len(batch) - 1
+        clips = [metadata for _, metadata in batch]
+        text = self._render_message(clips[0]) if len(clips) == 1 else self._render_summary(clips)
+        provider = "discord" if self.provider == "discord" else "telegram"
+        bucket = self.buckets[provider]
+
+        for _ in range(self.max_retries + 1):
+            wait = bucket.wait_time()
+            while wait > 0:
+                time.sleep(wait)
+                wait = bucket.wait_time()
+            bucket.take()
+
+            try:
+                if provider == "discord":
+                    response = self._send_discord(text)
+                else:
+                    response = self._send_telegram(text)
+            except requests.RequestException as exc:
+                logging.warning("Notification failed: %s", exc)
+                continue
+
+            if response is None:
+                return  # provider not configured
+            if response.status_code == 429:
+                self.rate_limited += 1
+                bucket.block_for(self._retry_after(response))
+                continue
+            if response.ok:
+                metrics.observe("notify_delivery", time.monotonic() - batch[0][0])
+                latency = (time.monotonic() - batch[0][0]) * 1000.0
+                self.last_latency_ms = latency
+                self.max_latency_ms = max(self.max_latency_ms, latency)
+                self.sent += 1
+                return
+
+            logging.warning("Notification rejected (%s): %s", response.status_code, response.text[:200])
+            break
+
+        self.failed += 1
+
+    def _send_telegram(self, text: str) -> Optional[requests.Response]:
         token = self.telegram.get("bot_token") or os.getenv("TELEGRAM_BOT_TOKEN")
         chat_id = self.telegram.get("chat_id") or os.getenv("TELEGRAM_CHAT_ID")
         if not token or not chat_id:
             logging.debug("Telegram not configured; skipping notification")
-            return
+            return None
 
-        text = self._render_message(clip_metadata)
         url = f"https://api.telegram.org/bot{token}/sendMessage"
-        requests.post(url, json={"chat_id": chat_id, "text": text, "parse_mode": "Markdown"})
+        return self._session.post(
+            url,
+            json={"chat_id": chat_id, "text": text, "parse_mode": "Markdown"},
+            timeout=self.timeout_sec,
+        )
 
-    def _send_discord(self, clip_metadata: Dict) -> None:
+    def _send_discord(self, text: str) -> Optional[requests.Response]:
         webhook_url = self.discord.get("webhook_url") or os.getenv("DISCORD_WEBHOOK_URL")
         if not webhook_url:
             logging.debug("Discord not configured; skipping notification")
-            return
-        message = self._render_message(clip_metadata)
-        requests.post(webhook_url, json={"content": message})
+            return None
+        return self._session.post(webhook_url, json={"content": text}, timeout=self.timeout_sec)
+
+    @staticmethod
+    def _retry_after(response: requests.Response) -> float:
+        """Telegram puts it in the JSON body, Discord in the body and the Retry-After header."""
+        try:
+            body = response.json()
+            value = (body.get("parameters") or {}).get("retry_after") or body.get("retry_after")
+            if value is not None:
+                return float(value)
+        except ValueError:
+            pass
+        try:
+            return float(response.headers.get("Retry-After", 5))
+        except ValueError:
+            return 5.0
 
     @staticmethod
     def _render_message(clip_metadata: Dict) -> str:
@@ -61,3 +238,18 @@ class Notifier:
             f"Start: {clip_metadata.get('start_time_utc')}\n"
             f"End: {clip_metadata.get('end_time_utc')}"
         )
+
+    @staticmethod
+    def _render_summary(clips: List[Dict]) -> str:
+        totals: Dict[str, int] = {}
+        for clip in clips:
+            for species, count in (clip.get("species_counts") or {}).items():
+                totals[species] = max(totals.get(species, 0), count)
+        species = ", ".join(f"{name} x{count}" for name, count in sorted(totals.items())) or "unknown species"
+        devices = sorted({clip.get("device_id", "device") for clip in clips})
+        return (
+            f"{len(clips)} new wildlife clips from {', '.join(devices)}:\n"
+            f"{species}\n"
+            f"From: {clips[0].get('start_time_utc')}\n"
+            f"To: {clips[-1].get('end_time_utc')}"
+        )
@@ -0,0 +1,251 @@
+"""
+ONNX Runtime detector backend that mirrors YoloDetector without the PyTorch stack.
+Runs the same exported models as the web app (YOLOv8 heads with NMS, or NMS-free YOLOv10).
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+import metrics
+from utils.model_metadata import load_labels
+
+# Same padding colour ultralytics uses for letterboxing.
+_PAD_VALUE = 114
+# Class offset used to run class-aware NMS in a single pass.
+_MAX_WH = 7680.0
+# Output strides of the YOLOv8 detection head; anchors = sum((input_size / stride) ** 2).
+_HEAD_STRIDES = (8, 16, 32)
+
+
+class OnnxDetector:
+    """Drop-in replacement for YoloDetector backed by an exported `.onnx` model."""
+
+    def __init__(
+        self,
+        model_path: str,
+        conf_threshold: float = 0.35,
+        target_classes: List[str] | None = None,
+        labels_path: Optional[str] = None,
+        input_size: int = 640,
+        iou_threshold: float = 0.45,
+        max_detections: int = 300,
+        num_threads: int = 0,
+        providers: Optional[List[str]] = None,
+    ) -> None:
+        self.model_path = str(model_path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = int(num_threads)
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            self.model_path,
+            sess_options=options,
+            providers=providers or ["CPUExecutionProvider"],
+        )
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Prefer the exported static size; fall back to the configured one for dynamic axes.
+        shape = model_input.shape
+        self.input_size = shape[2] if isinstance(shape[2], int) else int(input_size)
+        self.fixed_batch = shape[0] if isinstance(shape[0], int) else None
+
+        self.class_names = self._load_labels(labels_path)
+        # Decided once from the declared output shape; dynamic shapes are resolved on the first output.
+        self.head = _head_layout(self.session.get_outputs()[0].shape[1:], len(self.class_names), self.input_size)
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.max_detections = max_detections
+        self.target_classes = set(target_classes or [])
+
+    def warmup(self, runs: int = 1) -> None:
+        """
+        Run blank frames at `input_size` through preprocessing, the session and postprocessing so
+        onnxruntime's lazy allocations happen now rather than on the first real frame.
+        Not counted in the stage metrics.
+        """
+        frame = np.zeros((self.input_size, self.input_size, 3), dtype=np.uint8)
+        for _ in range(max(0, int(runs))):
+            tensor, transform = self._letterbox(frame)
+            output = self._run(tensor[None])
+            self._postprocess(output[0], transform, frame.shape[:2])
+
+    def detect(self, frame) -> Tuple[List[Dict], Dict[str, int]]:
+        """
+        Run inference on a frame and return both raw detections and per-species counts.
+        The per-species counts are used by the recorder to decide start/stop.
+        """
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames: Sequence) -> List[Tuple[List[Dict], Dict[str, int]]]:
+        """Run inference over several frames; one `(detections, species_counts)` pair per frame."""
+        if not frames:
+            return []
+
+        started = time.perf_counter()
+        tensors, transforms = zip(*(self._letterbox(frame) for frame in frames))
+        batch = np.stack(tensors)
+        metrics.observe("preprocess", time.perf_counter() - started)
+
+        started = time.perf_counter()
+        outputs = self._run(batch)
+        metrics.observe("inference", time.perf_counter() - started)
+        metrics.inc("edge_inferences_total", len(frames))
+
+        started = time.perf_counter()
+        parsed = [
+            self._postprocess(output, transform, frame.shape[:2])
+            for output, transform, frame in zip(outputs, transforms, frames)
+        ]
+        metrics.observe("postprocess", time.perf_counter() - started)
+        return parsed
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        """One session call, or several for static-batch exports: chunks of `fixed_batch`, the last padded."""
+        if not self.fixed_batch or len(batch) == self.fixed_batch:
+            return self.session.run(None, {self.input_name: batch})[0]
+        outputs = []
+        for start in range(0, len(batch), self.fixed_batch):
+            chunk = batch[start : start + self.fixed_batch]
+            if len(chunk) < self.fixed_batch:
+                padding = np.zeros((self.fixed_batch - len(chunk),) + chunk.shape[1:], dtype=chunk.dtype)
+                chunk = np.concatenate([chunk, padding])
+            outputs.append(self.session.run(None, {self.input_name: chunk})[0])
+        return np.concatenate(outputs)[: len(batch)]
+
+    def _letterbox(self, frame) -> Tuple[np.ndarray, Tuple[float, float, float]]:
+        """Resize with unchanged aspect ratio and pad to a square NCHW float tensor."""
+        height, width = frame.shape[:2]
+        size = self.input_size
+        gain = min(size / height, size / width)
+        new_w, new_h = int(round(width * gain)), int(round(height * gain))
+        pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+
+        resized = frame
+        if (new_w, new_h) != (width, height):
+            resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        top, left = int(round(pad_y - 0.1)), int(round(pad_x - 0.1))
+        canvas = np.full((size, size, 3), _PAD_VALUE, dtype=np.uint8)
+        canvas[top : top + new_h, left : left + new_w] = resized
+
+        # BGR HWC uint8 -> RGB CHW float32 in [0, 1].
+        tensor = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+        return np.ascontiguousarray(tensor), (gain, left, top)
+
+    def _postprocess(
+        self,
+        output: np.ndarray,
+        transform: Tuple[float, float, float],
+        frame_shape: Tuple[int, int],
+    ) -> Tuple[List[Dict], Dict[str, int]]:
+        if output.ndim != 2:
+            return [], {}
+
+        if self.head is None:
+            self.head = _head_layout(output.shape, len(self.class_names), self.input_size) or "channels_first"
+        if self.head == "end2end":
+            # YOLOv10 end-to-end head: [x1, y1, x2, y2, score, class] per row, already deduplicated.
+            keep = output[:, 4] >= self.conf_threshold
+            boxes = output[keep, :4]
+            scores = output[keep, 4]
+            cls_ids = output[keep, 5].astype(int)
+        else:
+            # YOLOv8 head: [4 + classes, anchors] (or transposed); needs NMS.
+            preds = output.T if self.head == "channels_first" else output
+            class_scores = preds[:, 4:]
+            cls_ids = class_scores.argmax(axis=1)
+            scores = class_scores[np.arange(len(preds)), cls_ids]
+            keep = scores >= self.conf_threshold
+            preds, scores, cls_ids = preds[keep], scores[keep], cls_ids[keep]
+            boxes = _xywh_to_xyxy(preds[:, :4])
+            order = _nms(boxes + (cls_ids[:, None] * _MAX_WH), scores, self.iou_threshold)
+            boxes, scores, cls_ids = boxes[order], scores[order], cls_ids[order]
+
+        order = np.argsort(-scores, kind="stable")[: self.max_detections]
+        boxes, scores, cls_ids = boxes[order], scores[order], cls_ids[order]
+
+        # Undo the letterbox and clip to the original frame.
+        gain, left, top = transform
+        height, width = frame_shape
+        boxes = (boxes - np.array([left, top, left, top], dtype=np.float32)) / gain
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+
+        detections: List[Dict] = []
+        species_counts: Dict[str, int] = defaultdict(int)
+        for cls_id, confidence, box in zip(cls_ids.tolist(), scores.tolist(), boxes.tolist()):
+            species = self.class_names.get(cls_id, str(cls_id))
+            if self.target_classes and species not in self.target_classes:
+                continue
+            species_counts[species] += 1
+            detections.append({"species": species, "confidence": confidence, "box": box})
+
+        return detections, dict(species_counts)
+
+    def _load_labels(self, labels_path: Optional[str]) -> Dict[int, str]:
+        """Labels come from the web app's JSON list, falling back to embedded ONNX metadata."""
+        labels = load_labels(labels_path, self.model_path)
+        if labels:
+            return dict(enumerate(labels))
+        logging.warning("No labels for %s; using numeric class ids", self.model_path)
+        return {}
+
+
+def _head_layout(shape: Sequence, num_classes: int, input_size: int) -> Optional[str]:
+    """
+    Output layout of one image's result from its shape (no batch axis):
+    "channels_first" ([4 + classes, anchors], YOLOv8), "channels_last" (the transposed export), or
+    "end2end" ([max_det, 6] rows after NMS, YOLOv10). None while the shape is still symbolic.
+    The anchor count and the label count are checked first, so a two-class YOLOv8 head (also six
+    channels) is not taken for end-to-end rows.
+    """
+    if len(shape) != 2 or not all(isinstance(dim, int) for dim in shape):
+        return None
+    rows, cols = shape
+    anchors = sum((int(input_size) // stride) ** 2 for stride in _HEAD_STRIDES)
+    if cols == anchors:
+        return "channels_first"
+    if rows == anchors:
+        return "channels_last"
+    if num_classes and rows == 4 + num_classes:
+        return "channels_first"
+    if num_classes and cols == 4 + num_classes and cols != 6:
+        return "channels_last"
+    if cols == 6:
+        return "end2end"
+    return "channels_first" if rows < cols else "channels_last"
+
+
+def _xywh_to_xyxy(boxes: np.ndarray) -> np.ndarray:
+    half = boxes[:, 2:4] / 2.0
+    return np.concatenate([boxes[:, :2] - half, boxes[:, :2] + half], axis=1)
+
+
+def _nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy NMS; each step suppresses against all remaining boxes at once."""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=int)
+
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        inter_h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = inter_w * inter_h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou < iou_threshold]
+    return np.array(keep, dtype=int)
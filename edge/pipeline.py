@@ -0,0 +1,244 @@
+"""
+Threaded grab/detect/record pipeline for the edge capture loop.
+The camera is drained on its own thread so a slow detector never backs up the capture buffer;
+the recorder still sees every captured frame, paired with the most recent detection result.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import cv2
+
+import metrics
+from ingest import MediaClock
+from recorder import Recorder
+
+# Marker pushed through the queues once the source is exhausted.
+_END = object()
+
+
+class FrameQueue:
+    """
+    Small bounded queue with an explicit overflow policy.
+    - drop_oldest=True keeps only the freshest items (live cameras).
+    - drop_oldest=False blocks the producer instead (video files must not skip frames).
+    """
+
+    def __init__(self, maxsize: int, drop_oldest: bool = True) -> None:
+        self.maxsize = max(1, int(maxsize))
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+        self._closed = False
+        self._items: Deque = deque()
+        self._cond = threading.Condition()
+
+    def put(self, item, force: bool = False) -> None:
+        """Enqueue an item; `force` bypasses the bound (used for the end marker)."""
+        with self._cond:
+            if not force:
+                if self.drop_oldest:
+                    while len(self._items) >= self.maxsize:
+                        self._items.popleft()
+                        self.dropped += 1
+                else:
+                    while len(self._items) >= self.maxsize and not self._closed:
+                        self._cond.wait()
+            self._items.append(item)
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        """Release any producer blocked on a full queue."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get(self, timeout: Optional[float] = None):
+        """Pop the oldest item, or return None if nothing arrived within `timeout`."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+
+class CapturePipeline:
+    """
+    Runs capture, inference and recording as three decoupled stages.
+    - Grabber thread: reads frames as fast as the source produces them.
+    - Inference thread: always works on the newest frame and publishes its detections.
+    - Caller thread (`run`): feeds every captured frame into the recorder with the latest counts;
+      each fresh result's boxes are handed over once, together with the frame they were found on.
+    """
+
+    def __init__(
+        self,
+        cap: cv2.VideoCapture,
+        detect_fn: Callable[[object], Tuple[List[Dict], Dict[str, int]]],
+        recorder: Recorder,
+        infer_queue_size: int = 1,
+        record_queue_size: int = 64,
+        realtime: bool = True,
+        loop_video: bool = False,
+        stats_interval_sec: float = 30.0,
+    ) -> None:
+        self.cap = cap
+        self.detect_fn = detect_fn
+        self.recorder = recorder
+        self.loop_video = loop_video
+        # Files are stamped in media time so clip timing does not depend on decode speed.
+        self.media_clock = None if realtime else MediaClock(cap.get(cv2.CAP_PROP_FPS))
+        self.stats_interval_sec = stats_interval_sec
+
+        # Live sources drop stale frames; files block so every frame is processed.
+        self.infer_queue = FrameQueue(infer_queue_size, drop_oldest=realtime)
+        self.record_queue = FrameQueue(record_queue_size, drop_oldest=realtime)
+
+        self.frames_grabbed = 0
+        self.frames_inferred = 0
+        self.frames_recorded = 0
+        self.last_inference_ms = 0.0
+
+        # (frame index, frame, detections, species_counts) of the newest inference result.
+        self._latest: Tuple[int, object, List[Dict], Dict[str, int]] = (-1, None, [], {})
+        self._latest_lock = threading.Lock()
+        self._stop = threading.Event()
+        metrics.register_gauge("edge_queue_depth", lambda: len(self.infer_queue), queue="infer")
+        metrics.register_gauge("edge_queue_depth", lambda: len(self.record_queue), queue="record")
+        metrics.register_gauge("edge_frames_dropped_total", lambda: self.infer_queue.dropped, queue="infer")
+        metrics.register_gauge("edge_frames_dropped_total", lambda: self.record_queue.dropped, queue="record")
+        self._threads = [
+            threading.Thread(target=self._grab_loop, name="capture-grabber", daemon=True),
+            threading.Thread(target=self._infer_loop, name="capture-inference", daemon=True),
+        ]
+
+    def run(self) -> None:
+        """Start the worker threads and drive the recorder until the source ends or `stop` is called."""
+        for thread in self._threads:
+            thread.start()
+
+        last_stats = time.monotonic()
+        consumed_idx = -1
+        try:
+            while not self._stop.is_set():
+                item = self.record_queue.get(timeout=0.5)
+                if item is None:
+                    continue
+                if item is _END:
+                    break
+
+                _, frame, captured_at = item
+                with self._latest_lock:
+                    result_idx, result_frame, detections, species_counts = self._latest
+                # Stamp with the capture time, not the time the frame left the record queue.
+                self.recorder.process_frame(frame, species_counts, timestamp=captured_at)
+                if result_idx != consumed_idx:
+                    consumed_idx = result_idx
+                    # None means a gated-off frame: nothing was looked at, so the tracker just coasts.
+                    if detections is not None:
+                        self.recorder.add_detections(result_frame, detections)
+                self.frames_recorded += 1
+
+                if self.stats_interval_sec and time.monotonic() - last_stats >= self.stats_interval_sec:
+                    self._log_stats()
+                    last_stats = time.monotonic()
+        finally:
+            self.stop()
+            self._log_stats()
+
+    def stop(self) -> None:
+        """Signal the worker threads to exit and wait for them briefly."""
+        self._stop.set()
+        for queue in (self.infer_queue, self.record_queue):
+            queue.close()
+            queue.put(_END, force=True)
+        for thread in self._threads:
+            if thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout=2.0)
+
+    def stats(self) -> Dict[str, float]:
+        """Snapshot of per-stage counters and queue depths."""
+        return {
+            "frames_grabbed": self.frames_grabbed,
+            "frames_inferred": self.frames_inferred,
+            "frames_recorded": self.frames_recorded,
+            "infer_queue_depth": len(self.infer_queue),
+            "record_queue_depth": len(self.record_queue),
+            "infer_dropped": self.infer_queue.dropped,
+            "record_dropped": self.record_queue.dropped,
+            "last_inference_ms": round(self.last_inference_ms, 1),
+        }
+
+    def _grab_loop(self) -> None:
+        frame_idx = 0
+        try:
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                ret, frame = self.cap.read()
+                if not ret:
+                    if self.loop_video and frame_idx > 0:
+                        logging.info("Reached end of test video; looping from start")
+                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    logging.warning("Failed to read frame; stopping pipeline")
+                    break
+
+                metrics.observe("read", time.perf_counter() - started)
+                metrics.inc("edge_frames_total")
+                self.frames_grabbed += 1
+                # StreamIngest reports when the frame was captured; plain captures leave it to the recorder.
+                captured_at = getattr(self.cap, "last_captured_at", None)
+                if captured_at is None and self.media_clock is not None:
+                    captured_at = self.media_clock.next()
+                self.infer_queue.put((frame_idx, frame))
+                self.record_queue.put((frame_idx, frame, captured_at))
+                frame_idx += 1
+        finally:
+            self.infer_queue.put(_END, force=True)
+            self.record_queue.put(_END, force=True)
+
+    def _infer_loop(self) -> None:
+        while not self._stop.is_set():
+            item = self.infer_queue.get(timeout=0.5)
+            if item is None:
+                continue
+            if item is _END:
+                break
+
+            frame_idx, frame = item
+            started = time.perf_counter()
+            try:
+                detections, species_counts = self.detect_fn(frame)
+            except Exception as exc:  # noqa: BLE001 - keep the pipeline alive on a bad frame
+                logging.warning("Inference failed on frame %d: %s", frame_idx, exc)
+                continue
+            self.last_inference_ms = (time.perf_counter() - started) * 1000.0
+            self.frames_inferred += 1
+            with self._latest_lock:
+                self._latest = (frame_idx, frame, detections, species_counts)
+
+    def _log_stats(self) -> None:
+        stats = self.stats()
+        logging.info(
+            "Pipeline stats: grabbed=%d inferred=%d recorded=%d queues(infer=%d, record=%d) "
+            "dropped(infer=%d, record=%d) inference=%.1fms",
+            stats["frames_grabbed"],
+            stats["frames_inferred"],
+            stats["frames_recorded"],
+            stats["infer_queue_depth"],
+            stats["record_queue_depth"],
+            stats["infer_dropped"],
+            stats["record_dropped"],
+            stats["last_inference_ms"],
+        )
@@ -0,0 +1,125 @@
+"""
+Memory-bounded pre-roll buffer so clips include the seconds before the first detection.
+Frames are kept compressed (JPEG) or downscaled so the footprint stays predictable.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Iterator, Tuple
+
+import cv2
+import numpy as np
+
+
+class PrerollBuffer:
+    """
+    Ring buffer of the most recent `seconds` of frames, capped at `max_memory_mb`.
+    - mode="jpeg": store JPEG bytes (small, costs one encode per idle frame).
+    - mode="raw": store copies downscaled by `scale` (no codec cost, more memory).
+    """
+
+    def __init__(
+        self,
+        seconds: float,
+        max_memory_mb: float = 64.0,
+        mode: str = "jpeg",
+        jpeg_quality: int = 80,
+        scale: float = 1.0,
+    ) -> None:
+        self.seconds = float(seconds)
+        self.max_bytes = int(float(max_memory_mb) * 1024 * 1024)
+        self.mode = mode
+        self.jpeg_quality = int(jpeg_quality)
+        self.scale = float(scale)
+
+        self.memory_bytes = 0
+        self.evicted_for_memory = 0
+        self._frames: Deque[Tuple[datetime, object, int]] = deque()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "PrerollBuffer | None":
+        """Build a buffer from the `preroll` config section, or None when disabled."""
+        seconds = float(config.get("seconds", 0) or 0)
+        if seconds <= 0:
+            return None
+        return cls(
+            seconds=seconds,
+            max_memory_mb=float(config.get("max_memory_mb", 64)),
+            mode=config.get("mode", "jpeg"),
+            jpeg_quality=int(config.get("jpeg_quality", 80)),
+            scale=float(config.get("scale", 1.0)),
+        )
+
+    def push(self, frame, timestamp: datetime) -> None:
+        """Store a frame and evict anything older than the window or over the memory cap."""
+        if self.mode == "raw":
+            stored = frame
+            if self.scale != 1.0:
+                stored = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+            else:
+                stored = frame.copy()
+            size = stored.nbytes
+        else:
+            ok, encoded = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+            if not ok:
+                return
+            stored = encoded
+            size = encoded.nbytes
+
+        self._frames.append((timestamp, stored, size))
+        self.memory_bytes += size
+
+        while self._frames and (timestamp - self._frames[0][0]).total_seconds() > self.seconds:
+            self._pop_oldest()
+        while self._frames and self.memory_bytes > self.max_bytes:
+            self._pop_oldest()
+            self.evicted_for_memory += 1
+
+    def oldest_timestamp(self) -> datetime | None:
+        return self._frames[0][0] if self._frames else None
+
+    def take(self) -> "PrerollBuffer":
+        """Move the buffered frames, still encoded, into a new buffer and empty this one (no decoding)."""
+        taken = PrerollBuffer(self.seconds, self.max_bytes / (1024 * 1024), self.mode, self.jpeg_quality, self.scale)
+        taken._frames, self._frames = self._frames, deque()
+        taken.memory_bytes, self.memory_bytes = self.memory_bytes, 0
+        return taken
+
+    def drain(self, frame_size: Tuple[int, int]) -> Iterator[np.ndarray]:
+        """Yield buffered frames oldest-first at `frame_size` (width, height) and empty the buffer."""
+        while self._frames:
+            _, stored, _ = self._pop_oldest()
+            frame = cv2.imdecode(stored, cv2.IMREAD_COLOR) if self.mode != "raw" else stored
+            if frame is None:
+                logging.debug("Skipping undecodable pre-roll frame")
+                continue
+            if (frame.shape[1], frame.shape[0]) != frame_size:
+                frame = cv2.resize(frame, frame_size, interpolation=cv2.INTER_LINEAR)
+            yield frame
+
+    def clear(self) -> None:
+        self._frames.clear()
+        self.memory_bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        span = 0.0
+        if len(self._frames) > 1:
+            span = (self._frames[-1][0] - self._frames[0][0]).total_seconds()
+        return {
+            "frames": len(self._frames),
+            "span_sec": round(span, 2),
+            "memory_mb": round(self.memory_bytes / (1024 * 1024), 2),
+            "max_memory_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "evicted_for_memory": self.evicted_for_memory,
+        }
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def _pop_oldest(self) -> Tuple[datetime, object, int]:
+        item = self._frames.popleft()
+        self.memory_bytes -= item[2]
+        return item
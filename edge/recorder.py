@@ -1,29 +1,45 @@
 """
 Stateful recorder that starts/stops clips based on YOLO detections.
 Avoids rapid start/stop jitter by waiting for a silence timeout before closing a clip.
+Encoding and clip finalization are delegated to a ClipWriter so they can run off the capture thread.
 """
 
 from __future__ import annotations
 
 import json
 import logging
+import time
 from collections import defaultdict
 from datetime import datetime, timezone
+from functools import partial
 from pathlib import Path
-from typing import Dict, Optional
-
-import cv2
+from typing import TYPE_CHECKING, Dict, List, Optional
 
+import metrics
+from clip_writer import ClipWriter
 from notifier import Notifier
 from supabase_client import SupabaseClient
+from thumbnail import BestFrameSelector, encode_jpeg
 from utils.paths import get_new_clip_paths, ensure_dir
 
+if TYPE_CHECKING:
+    # Optional parts, built by the caller only when enabled.
+    from preroll import PrerollBuffer
+    from timeline import DetectionTimeline
+    from tracker import Tracker
+
 
 class Recorder:
     """
     Maintains recording state machine.
     - Start when at least one detection is present.
     - Keep writing frames until `no_animal_timeout_sec` of silence elapses.
+    - Optionally prepend the buffered pre-roll so the animal's approach is kept.
+    - Optionally keep the best detection crops for a second-stage species classifier.
+    - Optionally track individuals across frames for unique counts and per-track dwell time.
+    - Optionally pick the thumbnail as the best-scoring detection frame instead of the first one.
+    - Optionally split events longer than `segment_sec` into back-to-back clips.
+    - Optionally save every frame's detections as a compact timeline next to the clip JSON.
     """
 
     def __init__(
@@ -35,6 +51,15 @@ class Recorder:
         supabase_client: SupabaseClient,
         fps: float = 20.0,
         thumbnail_quality: int = 85,
+        preroll: Optional[PrerollBuffer] = None,
+        clip_writer: Optional[ClipWriter] = None,
+        classifier=None,
+        tracker: Optional[Tracker] = None,
+        clip_index=None,
+        retention=None,
+        thumbnail_selector: Optional[BestFrameSelector] = None,
+        segment_sec: float = 0.0,
+        timeline: Optional[DetectionTimeline] = None,
     ) -> None:
         self.output_dir = ensure_dir(output_dir)
         self.device_id = device_id
@@ -43,35 +68,76 @@ class Recorder:
         self.supabase_client = supabase_client
         self.fps = fps or 20.0
         self.thumbnail_quality = thumbnail_quality
+        self.preroll = preroll
+        # Without an explicit writer, encoding and finalization run inline on the caller's thread.
+        self.clip_writer = clip_writer or ClipWriter(threaded=False)
+        self.classifier = classifier
+        self.tracker = tracker
+        self.clip_index = clip_index
+        self.retention = retention
+        self.thumbnail_selector = thumbnail_selector
+        self.segment_sec = max(0.0, float(segment_sec or 0.0))
+        self.timeline = timeline
 
         self.recording = False
-        self.video_writer: Optional[cv2.VideoWriter] = None
+        self.clips_finished = 0
         self.clip_paths: Dict[str, Path] = {}
         self.species_counts: Dict[str, int] = defaultdict(int)
         self.frames_with_animals = 0
+        self.max_confidence = 0.0
         self.last_seen_time: Optional[datetime] = None
         self.clip_start_time: Optional[datetime] = None
+        self.preroll_sec = 0.0
         self.thumbnail_frame = None
         self.last_frame = None
+        self.crop_collector = None
+        self.clip_thumbnail: Optional[BestFrameSelector] = None
+        self.clip_timeline: Optional[DetectionTimeline] = None
+        # Video filename of the previous segment when this clip continues a long event.
+        self.continues_clip: Optional[str] = None
+        self._register_metrics()
+        # Confirmed tracks for the latest frame (boxes are predictions when the detector skipped it).
+        self.tracks: List[Dict] = []
+        self.clip_tracks: Dict[int, Dict] = {}
+        self._last_timestamp: Optional[datetime] = None
 
-    def process_frame(self, frame, species_counts: Dict[str, int]) -> None:
+    def process_frame(
+        self,
+        frame,
+        species_counts: Dict[str, int],
+        timestamp: Optional[datetime] = None,
+        detections: Optional[List[Dict]] = None,
+    ) -> None:
         """
         Main loop entrypoint. Called once per frame.
         Decides when to start/stop recording based on detections.
+        `timestamp` overrides wall-clock time (e.g. media time when processing recorded files).
+        `detections` are the boxes found on this very frame, or None if the detector did not run on it.
         """
-        now = datetime.now(timezone.utc)
+        now = timestamp or datetime.now(timezone.utc)
         has_animals = bool(species_counts)
         self.last_frame = frame
+        self._last_timestamp = now
+        if self.tracker is not None:
+            self.tracks = self.tracker.predict()
+
+        if self.recording and self.segment_sec and self.clip_start_time:
+            if (now - self.clip_start_time).total_seconds() >= self.segment_sec:
+                self._roll_clip(now, frame)
 
         if has_animals:
             self.last_seen_time = now
             if not self.recording:
                 self._start_clip(now, frame)
             self.frames_with_animals += 1
-            self.thumbnail_frame = frame.copy() if self.thumbnail_frame is None else self.thumbnail_frame
+            if self.clip_thumbnail is None and self.thumbnail_frame is None:
+                self.thumbnail_frame = frame.copy()
 
+        wrote_frame = self.recording
         if self.recording:
-            self.video_writer.write(frame)
+            self.clip_writer.write(frame)
+            if self.clip_timeline is not None:
+                self.clip_timeline.add_frame((now - self.clip_start_time).total_seconds())
             for species, count in species_counts.items():
                 self.species_counts[species] = max(self.species_counts.get(species, 0), count)
 
@@ -80,37 +146,126 @@ class Recorder:
             if silence > self.no_animal_timeout_sec:
                 self._stop_clip()
 
+        # Only frames that did not go into a clip are kept for the next pre-roll.
+        if not wrote_frame and self.preroll is not None:
+            self.preroll.push(frame, now)
+
+        if detections is not None:
+            self.add_detections(frame, detections)
+
+    def add_detections(self, frame, detections: List[Dict]) -> None:
+        """
+        Record a detector result for `frame` (which may be older than the last processed frame).
+        An empty list still counts: it tells the tracker nothing was found.
+        """
+        if self.recording and detections:
+            self.max_confidence = max(self.max_confidence, max(det["confidence"] for det in detections))
+        if self.tracker is not None:
+            self.tracks = self.tracker.update(detections)
+            if self.recording:
+                self._observe_tracks(self._last_timestamp)
+        if self.recording and self.clip_timeline is not None:
+            self.clip_timeline.add_detections(detections)
+        if self.recording and self.crop_collector is not None and detections:
+            self.crop_collector.offer(frame, detections)
+        if self.recording and self.clip_thumbnail is not None and detections:
+            self.clip_thumbnail.offer(frame, detections)
+
+    def _observe_tracks(self, now: Optional[datetime]) -> None:
+        """Extend each matched confirmed track's time span within the current clip."""
+        for track in self.tracks:
+            if track["coasting"]:
+                continue
+            entry = self.clip_tracks.setdefault(
+                track["track_id"],
+                {"species": track["species"], "first_seen": now, "last_seen": now, "max_confidence": 0.0},
+            )
+            entry["last_seen"] = now
+            entry["max_confidence"] = max(entry["max_confidence"], track["confidence"])
+
+    def _register_metrics(self) -> None:
+        """Expose recorder and writer state; read only when metrics are scraped."""
+        device = self.device_id
+
+        def writer_stat(key: str):
+            return lambda: self.clip_writer.stats()[key]
+
+        metrics.register_gauge("edge_recording", lambda: float(self.recording), device=device)
+        metrics.register_gauge("edge_clips_total", lambda: self.clips_finished, device=device)
+        metrics.register_gauge("edge_queue_depth", writer_stat("frame_queue_depth"), queue="encode", device=device)
+        metrics.register_gauge(
+            "edge_queue_depth", writer_stat("finalize_queue_depth"), queue="finalize", device=device
+        )
+        metrics.register_gauge(
+            "edge_frames_dropped_total", writer_stat("frames_dropped"), queue="encode", device=device
+        )
+
     def close(self) -> None:
-        """Stop any ongoing recording when shutting down cleanly."""
+        """Stop any ongoing recording and flush pending encode/finalize work when shutting down."""
         if self.recording:
             self._stop_clip()
+        self.clip_writer.shutdown()
+        logging.info("Clip writer stats: %s", self.clip_writer.stats())
 
     def _start_clip(self, now: datetime, frame) -> None:
-        self.clip_paths = get_new_clip_paths(self.output_dir, now)
+        # With pre-roll the clip really starts at the oldest buffered frame.
+        start_time = now
+        if self.preroll is not None and self.preroll.oldest_timestamp() is not None:
+            start_time = self.preroll.oldest_timestamp()
+        self.clip_paths = get_new_clip_paths(self.output_dir, start_time)
         height, width = frame.shape[:2]
-        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-        self.video_writer = cv2.VideoWriter(
-            str(self.clip_paths["video_path"]),
-            fourcc,
-            self.fps,
-            (width, height),
-        )
+        self.clip_writer.open(self.clip_paths["video_path"], self.fps, (width, height))
         self.recording = True
-        self.clip_start_time = now
+        self.clip_start_time = start_time
+        self.preroll_sec = (now - start_time).total_seconds()
         self.last_seen_time = now
         self.species_counts = defaultdict(int)
         self.frames_with_animals = 0
+        self.max_confidence = 0.0
         self.thumbnail_frame = None
+        self.crop_collector = self.classifier.new_collector() if self.classifier is not None else None
+        self.clip_thumbnail = self.thumbnail_selector.new_clip() if self.thumbnail_selector is not None else None
+        self.clip_timeline = self.timeline.new_clip() if self.timeline is not None else None
+        self.clip_tracks = {}
+        self.continues_clip = None
         logging.info("Started recording clip %s", self.clip_paths["video_path"].name)
+        if self.preroll is not None:
+            self._flush_preroll((width, height))
+
+    def _flush_preroll(self, frame_size) -> None:
+        # The buffer is handed over still encoded and decoded on the encoder thread, so starting a
+        # clip costs the capture thread the same however long the pre-roll is.
+        stats = self.preroll.stats()
+        buffered = self.preroll.take()
+        written = len(buffered)
+        self.clip_writer.write_many(buffered.drain(frame_size))
+        if self.clip_timeline is not None:
+            self.clip_timeline.skip_frames(written)
+        logging.info(
+            "Queued %d pre-roll frames (%.1fs, %.2f MB of %.2f MB cap)",
+            written,
+            self.preroll_sec,
+            stats["memory_mb"],
+            stats["max_memory_mb"],
+        )
 
-    def _stop_clip(self) -> None:
-        end_time = self.last_seen_time or datetime.now(timezone.utc)
-        if self.video_writer:
-            self.video_writer.release()
+    def _roll_clip(self, now: datetime, frame) -> None:
+        """Close the current segment at `now` and carry on in a new clip, without losing a frame."""
+        previous = self.clip_paths["video_path"].name
+        last_seen_time = self.last_seen_time
+        self._stop_clip(end_time=now)
+        self._start_clip(now, frame)
+        # The silence timeout still counts from the last detection, not from the cut.
+        self.last_seen_time = last_seen_time
+        self.continues_clip = previous
+
+    def _stop_clip(self, end_time: Optional[datetime] = None) -> None:
+        end_time = end_time or self.last_seen_time or datetime.now(timezone.utc)
         self.recording = False
 
         if not self.clip_start_time:
             logging.warning("Tried to stop clip without start time; skipping save")
+            self.clip_writer.close()
             return
 
         duration_sec = (end_time - self.clip_start_time).total_seconds()
@@ -123,44 +278,142 @@ class Recorder:
             "device_id": self.device_id,
             "species_counts": dict(self.species_counts),
             "frames_with_animals": self.frames_with_animals,
+            "max_confidence": round(self.max_confidence, 4),
+            "preroll_sec": self.preroll_sec,
         }
+        if self.continues_clip:
+            metadata["continues_clip"] = self.continues_clip
+        if self.tracker is not None:
+            metadata.update(self._track_summary())
 
-        self._write_metadata(metadata)
-        self._write_thumbnail()
-
-        # Fire-and-forget best-effort notifications/cloud sync.
-        self.notifier.send_new_clip_notification(metadata)
-        self.supabase_client.insert_clip_metadata(metadata, self.clip_paths.get("thumbnail_path"))
-
-        logging.info(
-            "Finished clip %s (%.1fs, %s)",
-            metadata["video_filename"],
-            duration_sec,
-            metadata.get("species_counts"),
+        self.clips_finished += 1
+        # Prefer a frame that had detections; fall back to last frame.
+        thumbnail_frame = self.thumbnail_frame if self.thumbnail_frame is not None else self.last_frame
+        # Everything below the file close runs on the finalizer thread; hand it a snapshot.
+        self.clip_writer.close(
+            partial(
+                self._finalize_clip,
+                metadata,
+                dict(self.clip_paths),
+                thumbnail_frame,
+                self.crop_collector,
+                self.clip_thumbnail,
+                self.clip_timeline,
+            )
         )
 
         # Reset state.
-        self.video_writer = None
         self.clip_paths = {}
         self.species_counts = defaultdict(int)
         self.frames_with_animals = 0
         self.clip_start_time = None
+        self.preroll_sec = 0.0
         self.thumbnail_frame = None
         self.last_frame = None
+        self.crop_collector = None
+        self.clip_thumbnail = None
+        self.clip_timeline = None
+        self.clip_tracks = {}
 
-    def _write_metadata(self, metadata: Dict) -> None:
-        ensure_dir(self.clip_paths["metadata_path"].parent)
-        with open(self.clip_paths["metadata_path"], "w", encoding="utf-8") as f:
+    def _track_summary(self) -> Dict:
+        """Unique individuals per species and dwell time per track for the clip metadata."""
+        unique: Dict[str, int] = defaultdict(int)
+        tracks = []
+        for track_id, entry in sorted(self.clip_tracks.items()):
+            unique[entry["species"]] += 1
+            tracks.append(
+                {
+                    "track_id": track_id,
+                    "species": entry["species"],
+                    "first_seen_utc": entry["first_seen"].isoformat(),
+                    "dwell_sec": round((entry["last_seen"] - entry["first_seen"]).total_seconds(), 2),
+                    "max_confidence": round(entry["max_confidence"], 4),
+                }
+            )
+        return {"unique_individuals": dict(unique), "tracks": tracks}
+
+    def _finalize_clip(
+        self,
+        metadata: Dict,
+        clip_paths: Dict[str, Path],
+        thumbnail_frame,
+        crop_collector=None,
+        clip_thumbnail: Optional[BestFrameSelector] = None,
+        clip_timeline: Optional[DetectionTimeline] = None,
+        encode_stats: Optional[Dict] = None,
+    ) -> None:
+        """Classify kept crops, write sidecar files and run best-effort notifications/cloud sync."""
+        timings = self.clip_writer.timings
+        if encode_stats is not None:
+            metadata["encoder"] = encode_stats
+
+        if crop_collector is not None and len(crop_collector):
+            started = time.perf_counter()
+            try:
+                metadata["species_classification"] = self.classifier.summarize(crop_collector)
+            except Exception as exc:  # noqa: BLE001 - the clip is still useful without it
+                logging.warning("Species classification failed for %s: %s", metadata["video_filename"], exc)
+            timings.record("classify", time.perf_counter() - started)
+
+        started = time.perf_counter()
+        thumbnail_jpeg = None
+        if clip_thumbnail is not None and clip_thumbnail.best() is not None:
+            thumbnail_jpeg = clip_thumbnail.encode_jpeg(self.thumbnail_quality)
+            metadata["thumbnail"] = clip_thumbnail.stats()
+            sheet = clip_thumbnail.contact_sheet()
+            if sheet is not None:
+                self._write_bytes(encode_jpeg(sheet, self.thumbnail_quality), clip_paths["contact_sheet_path"])
+                metadata["thumbnail"]["contact_sheet"] = clip_paths["contact_sheet_path"].name
+        elif thumbnail_frame is not None:
+            thumbnail_jpeg = encode_jpeg(thumbnail_frame, self.thumbnail_quality)
+        if clip_timeline is not None and len(clip_timeline):
+            clip_timeline.save(clip_paths["timeline_path"])
+            metadata["timeline"] = {
+                "file": clip_paths["timeline_path"].name,
+                "frames": len(clip_timeline),
+                "detections": clip_timeline.detection_count,
+            }
+        self._write_metadata(metadata, clip_paths["metadata_path"])
+        self._write_bytes(thumbnail_jpeg, clip_paths["thumbnail_path"])
+        timings.record("sidecars", time.perf_counter() - started)
+
+        if self.clip_index is not None:
+            started = time.perf_counter()
+            try:
+                self.clip_index.add(metadata)
+            except Exception as exc:  # noqa: BLE001 - the sidecar is written; `rebuild` can recover
+                logging.warning("Failed to index clip %s: %s", metadata["video_filename"], exc)
+            timings.record("index", time.perf_counter() - started)
+
+        if self.retention is not None:
+            self.retention.on_clip_finalized(metadata, clip_paths)
+
+        # Fire-and-forget best-effort notifications/cloud sync.
+        started = time.perf_counter()
+        self.notifier.send_new_clip_notification(metadata)
+        timings.record("notify", time.perf_counter() - started)
+
+        started = time.perf_counter()
+        self.supabase_client.insert_clip_metadata(
+            metadata, clip_paths.get("thumbnail_path"), thumbnail_bytes=thumbnail_jpeg
+        )
+        timings.record("upload", time.perf_counter() - started)
+
+        logging.info(
+            "Finished clip %s (%.1fs, %s)",
+            metadata["video_filename"],
+            metadata["duration_sec"],
+            metadata.get("species_counts"),
+        )
+
+    def _write_metadata(self, metadata: Dict, metadata_path: Path) -> None:
+        ensure_dir(metadata_path.parent)
+        with open(metadata_path, "w", encoding="utf-8") as f:
             json.dump(metadata, f, indent=2)
 
-    def _write_thumbnail(self) -> None:
-        # Prefer a frame that had detections; fall back to last frame.
-        frame = self.thumbnail_frame if self.thumbnail_frame is not None else self.last_frame
-        if frame is None:
+    def _write_bytes(self, data: Optional[bytes], path: Path) -> None:
+        if data is None:
             return
-        ensure_dir(self.clip_paths["thumbnail_path"].parent)
-        cv2.imwrite(
-            str(self.clip_paths["thumbnail_path"]),
-            frame,
-            [int(cv2.IMWRITE_JPEG_QUALITY), int(self.thumbnail_quality)],
-        )
+        ensure_dir(path.parent)
+        with open(path, "wb") as f:
+            f.write(data)
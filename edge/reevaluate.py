@@ -0,0 +1,145 @@
+"""
+Re-evaluate saved clips under different recorder settings without running a model.
+Each clip's detection timeline (`clip_*.npz`) is replayed through the recorder's start/stop logic
+with the given confidence threshold, target classes and silence timeout, and the result is compared
+with the clip's saved metadata: would it still be recorded, with which species, for how long.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from timeline import DetectionTimeline, replay
+
+
+def collect_timelines(inputs: List[str]) -> List[Path]:
+    """Timeline files from clip JSONs, `.npz` files, or directories searched recursively."""
+    found: List[Path] = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            found.extend(sorted(path.rglob("*.npz")))
+        elif path.suffix == ".json":
+            found.append(path.with_suffix(".npz"))
+        else:
+            found.append(path)
+    return found
+
+
+def reevaluate(
+    timeline_path: Path,
+    no_animal_timeout_sec: float,
+    min_confidence: float = 0.0,
+    target_classes: Optional[List[str]] = None,
+) -> Dict:
+    """Replay one timeline; includes the saved clip metadata's values when the JSON sidecar exists."""
+    started = time.perf_counter()
+    timeline = DetectionTimeline.load(timeline_path)
+    metadata_path = timeline_path.with_suffix(".json")
+    metadata: Optional[Dict] = None
+    if metadata_path.exists():
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+    # Timeline rows start after the pre-roll, but the saved duration counts it.
+    preroll_sec = float((metadata or {}).get("preroll_sec") or 0.0)
+    clips = replay(timeline, no_animal_timeout_sec, min_confidence, target_classes, preroll_sec)
+    result = {
+        "timeline": str(timeline_path),
+        "frames": len(timeline),
+        "detections": timeline.detection_count,
+        "would_record": bool(clips),
+        "clips": clips,
+    }
+    if metadata is not None:
+        result["original"] = {
+            "duration_sec": metadata.get("duration_sec"),
+            "species_counts": metadata.get("species_counts", {}),
+            "max_confidence": metadata.get("max_confidence"),
+        }
+        species = {}
+        for clip in clips:
+            for name, count in clip["species_counts"].items():
+                species[name] = max(species.get(name, 0), count)
+        result["species_changed"] = species != result["original"]["species_counts"]
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return result
+
+
+def main() -> None:
+    from main import load_config
+
+    parser = argparse.ArgumentParser(description="Replay saved detection timelines under new recorder settings")
+    parser.add_argument("inputs", nargs="+", help="Clip JSONs, timeline .npz files, or directories")
+    parser.add_argument("--config", type=Path, default=Path("edge/config.yaml"), help="Defaults for the settings")
+    parser.add_argument("--min-confidence", type=float, help="Detections below this are dropped")
+    parser.add_argument("--target-classes", nargs="*", help="Only these species count (default: config)")
+    parser.add_argument("--no-animal-timeout-sec", type=float, help="Silence that ends a clip")
+    parser.add_argument("--output", type=Path, help="Write the full report as JSON")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    config = load_config(args.config) if args.config.exists() else {}
+    min_confidence = args.min_confidence if args.min_confidence is not None else config.get("min_confidence", 0.35)
+    target_classes = args.target_classes if args.target_classes is not None else config.get("target_classes") or []
+    timeout = (
+        args.no_animal_timeout_sec
+        if args.no_animal_timeout_sec is not None
+        else float(config.get("no_animal_timeout_sec", 5))
+    )
+
+    started = time.perf_counter()
+    results = []
+    for path in collect_timelines(args.inputs):
+        try:
+            result = reevaluate(path, timeout, float(min_confidence), target_classes)
+        except (OSError, ValueError, KeyError) as exc:
+            logging.warning("Skipping %s: %s", path, exc)
+            continue
+        results.append(result)
+        original = result.get("original")
+        species = ", ".join(
+            f"{name}={count}" for clip in result["clips"] for name, count in clip["species_counts"].items()
+        )
+        logging.info(
+            "%s: %s, %d clip(s) [%s], %.1fs%s",
+            path.name,
+            "kept" if result["would_record"] else "dropped",
+            len(result["clips"]),
+            species or "-",
+            sum(clip["duration_sec"] for clip in result["clips"]),
+            f" (was {original['duration_sec']}s {original['species_counts']})" if original else "",
+        )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    kept = sum(1 for result in results if result["would_record"])
+    logging.info(
+        "Re-evaluated %d timeline(s) in %.1f ms: %d kept, %d dropped (min_confidence=%s, timeout=%ss, classes=%s)",
+        len(results),
+        elapsed_ms,
+        kept,
+        len(results) - kept,
+        min_confidence,
+        timeout,
+        target_classes or "all",
+    )
+    if args.output:
+        report = {
+            "settings": {
+                "min_confidence": float(min_confidence),
+                "target_classes": target_classes,
+                "no_animal_timeout_sec": timeout,
+            },
+            "elapsed_ms": round(elapsed_ms, 3),
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""
+Disk-budget retention for local captures.
+Clip sizes are scanned once at startup and then tracked incrementally as clips are finalized.
+When the clip budget or the free-space watermark is crossed, old clips are optionally re-encoded
+to a lower bitrate first, then videos are evicted by policy. The JSON sidecar and thumbnail are
+kept and every action is recorded in the clip metadata (and, for evictions, in the clip index).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+_GB = 1024**3
+# Primary species values treated as "nobody knows what this was" by the lowest_confidence policy.
+_UNKNOWN_SPECIES = {"", "unknown", "blank", "animal"}
+
+# Sort keys for eviction candidates; the first entry goes first.
+_POLICY_KEYS = {
+    "oldest": lambda entry: entry["started_at"],
+    "shortest": lambda entry: (entry["duration_sec"], entry["started_at"]),
+    "lowest_confidence": lambda entry: (
+        not entry["unknown_species"],
+        entry["confidence"],
+        entry["started_at"],
+    ),
+}
+
+
+class RetentionManager:
+    """
+    Keeps `output_dir` within `max_gb` of clips and at least `min_free_gb` free on its disk.
+    - Policies: "oldest", "shortest", or "lowest_confidence" (unknown species first, then lowest
+      detector confidence).
+    - With `transcode_after_days`, clips older than that are re-encoded with ffmpeg before any
+      video is deleted; eviction only starts if that is not enough.
+    - Eviction frees `hysteresis_gb` beyond the limit so the next clip does not trigger it again.
+    """
+
+    def __init__(self, output_dir: Path, config: Dict, clip_index=None) -> None:
+        self.output_dir = Path(output_dir)
+        self.clip_index = clip_index
+        self.max_bytes = int(float(config.get("max_gb", 0) or 0) * _GB)
+        self.min_free_bytes = int(float(config.get("min_free_gb", 1.0) or 0) * _GB)
+        self.hysteresis_bytes = int(float(config.get("hysteresis_gb", 0.5) or 0) * _GB)
+        self.policy = config.get("policy", "oldest")
+        if self.policy not in _POLICY_KEYS:
+            raise ValueError(f"Unknown retention policy: {self.policy}")
+        self.check_interval_sec = float(config.get("check_interval_sec", 300))
+        self.rescan_interval_sec = float(config.get("rescan_interval_hours", 24)) * 3600.0
+        self.transcode_after_days = config.get("transcode_after_days")
+        self.transcode_crf = int(config.get("transcode_crf", 32))
+        self.transcode_max_height = int(config.get("transcode_max_height", 480))
+
+        self.clips_evicted = 0
+        self.clips_transcoded = 0
+        self.bytes_freed = 0
+        self.last_error: Optional[str] = None
+
+        # metadata_path -> clip entry (paths, sizes and the fields the policies sort on).
+        self._entries: Dict[Path, Dict] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._ffmpeg = shutil.which("ffmpeg") if self.transcode_after_days is not None else None
+        if self.transcode_after_days is not None and not self._ffmpeg:
+            logging.warning("Retention: transcode_after_days is set but ffmpeg was not found; only evicting")
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+
+    @classmethod
+    def from_config(cls, output_dir: Path, config: Dict, clip_index=None) -> Optional["RetentionManager"]:
+        if not config.get("enabled", False):
+            return None
+        return cls(output_dir, config, clip_index)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def on_clip_finalized(self, metadata: Dict, clip_paths: Dict[str, Path]) -> None:
+        """Account for a clip the recorder just wrote and check the budget soon."""
+        entry = self._entry_from_metadata(metadata, Path(clip_paths["metadata_path"]))
+        if entry is None:
+            return
+        with self._lock:
+            self._add(entry)
+        self._wake.set()
+
+    def enforce(self) -> int:
+        """Bring usage back within limits; returns bytes freed."""
+        needed = self._bytes_to_free()
+        if needed <= 0:
+            return 0
+        target = needed + self.hysteresis_bytes
+        freed = 0
+
+        if self._ffmpeg:
+            for entry in self._candidates(transcode=True):
+                if freed >= target or self._stop.is_set():
+                    break
+                freed += self._transcode(entry)
+
+        for entry in self._candidates(transcode=False):
+            if freed >= target or self._stop.is_set():
+                break
+            freed += self._evict(entry, reason="over budget" if self._over_budget() else "low disk space")
+
+        logging.info(
+            "Retention: freed %.1f MB (%d clips tracked, %.2f GB)",
+            freed / 1024**2,
+            len(self._entries),
+            self._total_bytes / _GB,
+        )
+        return freed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            tracked = len(self._entries)
+            total = self._total_bytes
+        return {
+            "clips_tracked": tracked,
+            "clip_gb": round(total / _GB, 3),
+            "free_gb": round(self._free_bytes() / _GB, 3),
+            "clips_transcoded": self.clips_transcoded,
+            "clips_evicted": self.clips_evicted,
+            "freed_gb": round(self.bytes_freed / _GB, 3),
+            "last_error": self.last_error,
+        }
+
+    def close(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        logging.info("Retention stats: %s", self.stats())
+
+    def scan(self) -> None:
+        """Rebuild the size catalog from the sidecars on disk (startup and occasional reconciliation)."""
+        entries = {}
+        for metadata_path in self.output_dir.rglob("clip_*.json"):
+            try:
+                with open(metadata_path, "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError) as exc:
+                logging.debug("Retention: skipping %s: %s", metadata_path, exc)
+                continue
+            entry = self._entry_from_metadata(metadata, metadata_path)
+            if entry is not None:
+                entries[metadata_path] = entry
+        with self._lock:
+            self._entries = entries
+            self._total_bytes = sum(e["video_bytes"] + e["sidecar_bytes"] for e in entries.values())
+        logging.info("Retention: tracking %d clip(s), %.2f GB", len(entries), self._total_bytes / _GB)
+
+    def _run(self) -> None:
+        self.scan()
+        last_scan = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                if self.rescan_interval_sec and time.monotonic() - last_scan >= self.rescan_interval_sec:
+                    self.scan()
+                    last_scan = time.monotonic()
+                self.enforce()
+            except Exception as exc:  # noqa: BLE001 - retention must never stop recording
+                self.last_error = str(exc)
+                logging.warning("Retention check failed: %s", exc)
+            self._wake.wait(self.check_interval_sec)
+            self._wake.clear()
+
+    def _entry_from_metadata(self, metadata: Dict, metadata_path: Path) -> Optional[Dict]:
+        retention = metadata.get("retention") or {}
+        if retention.get("evicted_at"):
+            return None
+        video_path = metadata_path.with_suffix(".mp4")
+        if not video_path.exists():
+            return None
+
+        try:
+            started_at = datetime.fromisoformat(metadata["start_time_utc"])
+        except (KeyError, ValueError):
+            started_at = datetime.fromtimestamp(video_path.stat().st_mtime, tz=timezone.utc)
+        if started_at.tzinfo is None:
+            started_at = started_at.replace(tzinfo=timezone.utc)
+
+        species_counts = metadata.get("species_counts") or {}
+        primary = max(species_counts, key=species_counts.get) if species_counts else ""
+        classified = (metadata.get("species_classification") or {}).get("top_species")
+        thumbnail_path = metadata_path.with_suffix(".jpg")
+        contact_sheet_path = metadata_path.with_name(f"{metadata_path.stem}_sheet.jpg")
+        sidecars = (metadata_path, thumbnail_path, contact_sheet_path, metadata_path.with_suffix(".npz"))
+        return {
+            "metadata_path": metadata_path,
+            "video_path": video_path,
+            # Key of the clip's row in the clip index.
+            "local_video_path": metadata.get("local_video_path") or str(video_path),
+            "started_at": started_at,
+            "duration_sec": float(metadata.get("duration_sec") or 0.0),
+            "confidence": float(metadata.get("max_confidence") or 0.0),
+            "unknown_species": (classified or primary).lower() in _UNKNOWN_SPECIES,
+            "transcoded": bool(retention.get("transcoded_at")),
+            "video_bytes": _size(video_path),
+            "sidecar_bytes": sum(_size(path) for path in sidecars),
+        }
+
+    def _add(self, entry: Dict) -> None:
+        previous = self._entries.get(entry["metadata_path"])
+        if previous is not None:
+            self._total_bytes -= previous["video_bytes"] + previous["sidecar_bytes"]
+        self._entries[entry["metadata_path"]] = entry
+        self._total_bytes += entry["video_bytes"] + entry["sidecar_bytes"]
+
+    def _candidates(self, transcode: bool) -> List[Dict]:
+        with self._lock:
+            entries = list(self._entries.values())
+        if transcode:
+            cutoff = datetime.now(timezone.utc) - timedelta(days=float(self.transcode_after_days))
+            entries = [e for e in entries if not e["transcoded"] and e["started_at"] < cutoff]
+        return sorted(entries, key=_POLICY_KEYS[self.policy])
+
+    def _bytes_to_free(self) -> int:
+        needed = 0
+        if self.max_bytes:
+            with self._lock:
+                needed = self._total_bytes - self.max_bytes
+        if self.min_free_bytes:
+            needed = max(needed, self.min_free_bytes - self._free_bytes())
+        return needed
+
+    def _over_budget(self) -> bool:
+        return bool(self.max_bytes) and self._total_bytes > self.max_bytes
+
+    def _free_bytes(self) -> int:
+        try:
+            return shutil.disk_usage(self.output_dir).free
+        except OSError:
+            return 0
+
+    def _evict(self, entry: Dict, reason: str) -> int:
+        try:
+            entry["video_path"].unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            self.last_error = str(exc)
+            logging.warning("Retention: could not delete %s: %s", entry["video_path"], exc)
+            return 0
+
+        freed = entry["video_bytes"]
+        evicted_at = datetime.now(timezone.utc).isoformat()
+        self._update_metadata(
+            entry["metadata_path"],
+            {
+                "evicted_at": evicted_at,
+                "evicted_reason": reason,
+                "policy": self.policy,
+                "freed_bytes": freed,
+            },
+        )
+        if self.clip_index is not None:
+            try:
+                self.clip_index.mark_evicted(entry["local_video_path"], evicted_at)
+            except Exception as exc:  # noqa: BLE001 - the index can be rebuilt from the sidecars
+                self.last_error = str(exc)
+                logging.warning("Retention: could not update the clip index for %s: %s", entry["video_path"], exc)
+        with self._lock:
+            # Evicted clips leave the catalog entirely (their small sidecars are no longer counted).
+            if self._entries.pop(entry["metadata_path"], None) is not None:
+                self._total_bytes -= entry["video_bytes"] + entry["sidecar_bytes"]
+        self.clips_evicted += 1
+        self.bytes_freed += freed
+        logging.info("Retention: evicted %s (%.1f MB, %s)", entry["video_path"].name, freed / 1024**2, reason)
+        return freed
+
+    def _transcode(self, entry: Dict) -> int:
+        tmp_path = entry["video_path"].with_suffix(".transcode.mp4")
+        cmd = [
+            self._ffmpeg,
+            "-nostdin",
+            "-loglevel",
+            "error",
+            "-y",
+            "-i",
+            str(entry["video_path"]),
+            "-vf",
+            f"scale=-2:'min({self.transcode_max_height},ih)'",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "veryfast",
+            "-crf",
+            str(self.transcode_crf),
+            "-an",
+            str(tmp_path),
+        ]
+        try:
+            subprocess.run(cmd, check=True, capture_output=True, timeout=600)
+        except (OSError, subprocess.SubprocessError) as exc:
+            self.last_error = str(exc)
+            logging.warning("Retention: transcode of %s failed: %s", entry["video_path"].name, exc)
+            tmp_path.unlink(missing_ok=True)
+            return 0
+
+        new_bytes = _size(tmp_path)
+        if not new_bytes or new_bytes >= entry["video_bytes"]:
+            # Already small (or broken output): keep the original and do not try again.
+            tmp_path.unlink(missing_ok=True)
+            entry["transcoded"] = True
+            return 0
+
+        os.replace(tmp_path, entry["video_path"])
+        freed = entry["video_bytes"] - new_bytes
+        self._update_metadata(
+            entry["metadata_path"],
+            {
+                "transcoded_at": datetime.now(timezone.utc).isoformat(),
+                "original_bytes": entry["video_bytes"],
+                "transcoded_bytes": new_bytes,
+                "transcode_crf": self.transcode_crf,
+            },
+        )
+        with self._lock:
+            entry["transcoded"] = True
+            entry["video_bytes"] = new_bytes
+            self._total_bytes -= freed
+        self.clips_transcoded += 1
+        self.bytes_freed += freed
+        return freed
+
+    def _update_metadata(self, metadata_path: Path, changes: Dict) -> None:
+        """Merge `changes` into the sidecar's "retention" section (atomic replace)."""
+        try:
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            metadata["retention"] = {**(metadata.get("retention") or {}), **changes}
+            tmp_path = metadata_path.with_suffix(".json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(metadata, f, indent=2)
+            os.replace(tmp_path, metadata_path)
+        except (OSError, ValueError) as exc:
+            self.last_error = str(exc)
+            logging.warning("Retention: could not update %s: %s", metadata_path, exc)
+
+
+def _size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
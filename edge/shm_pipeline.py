@@ -0,0 +1,478 @@
+"""
+Multi-process capture loop with a shared-memory frame ring.
+Capture and detection run in their own processes, so decoding, the detector and the recorder's
+encoding no longer share one GIL. Frames are decoded once into a ring of preallocated
+`multiprocessing.shared_memory` slots; only slot indices and detection results cross process
+boundaries, never pickled frames.
+
+Slot ownership is kept by the parent process, which also runs the Recorder:
+- the capture process takes a free slot, decodes into it and reports it filled;
+- the parent holds one reference for the recorder and, when the detector is idle, one for the detector;
+- once both are released the slot goes back on the free queue, so a slot is never rewritten while read.
+The recorder reads frames straight from the ring while idle. While a clip is open (or about to open)
+it gets a private copy, since the encoder queue and pre-roll keep frames beyond the call.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing as mp
+import queue
+import signal
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import metrics
+from ingest import MediaClock, StreamIngest, open_capture
+from motion import MotionGate
+from recorder import Recorder
+
+# Marker sent to the detector process to make it exit.
+_END = None
+
+
+class FrameRing:
+    """
+    Fixed number of equally sized frame slots in one shared-memory block.
+    The creating process owns the block and unlinks it on `close()`; others `attach()` by spec.
+    """
+
+    def __init__(self, slots: int, shape: Tuple[int, ...], dtype: str = "|u1", name: Optional[str] = None) -> None:
+        self.slots = max(2, int(slots))
+        self.shape = tuple(int(dim) for dim in shape)
+        self.dtype = np.dtype(dtype)
+        self.slot_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.owner = name is None
+        if self.owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * self.slots)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.name = self._shm.name
+        self._views = [
+            np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf, offset=slot * self.slot_bytes)
+            for slot in range(self.slots)
+        ]
+
+    @classmethod
+    def attach(cls, spec: Dict) -> "FrameRing":
+        return cls(spec["slots"], spec["shape"], spec["dtype"], name=spec["name"])
+
+    def spec(self) -> Dict:
+        """Picklable description for `attach()` in another process."""
+        return {"name": self.name, "slots": self.slots, "shape": self.shape, "dtype": self.dtype.str}
+
+    def __getitem__(self, slot: int) -> np.ndarray:
+        return self._views[slot]
+
+    def close(self) -> None:
+        self._views = []
+        try:
+            self._shm.close()
+        except BufferError:
+            # Someone still holds a view (e.g. the recorder's last frame); the mapping goes with the process.
+            logging.debug("Frame ring %s still referenced; leaving it mapped", self.name)
+        if self.owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class MultiProcessPipeline:
+    """
+    Capture process -> shared-memory ring -> detector process, with the Recorder in this process.
+    - `start()` spawns the capture process, sizes the ring from the first frame and starts the detector.
+    - `run(recorder)` feeds every captured frame into the recorder with the latest detection counts.
+    Live sources drop frames when every slot is busy; files block instead, and every frame is detected.
+    """
+
+    def __init__(
+        self,
+        source,
+        detector_factory: Callable[[], object],
+        gate_config: Optional[Dict] = None,
+        ingest_config: Optional[Dict] = None,
+        realtime: bool = True,
+        loop_video: bool = False,
+        ring_slots: int = 8,
+        stats_interval_sec: float = 30.0,
+        start_method: str = "spawn",
+    ) -> None:
+        self.source = source
+        self.realtime = realtime
+        self.ring_slots = max(2, int(ring_slots))
+        self.stats_interval_sec = stats_interval_sec
+        self.fps = 0.0
+        self.ring: Optional[FrameRing] = None
+
+        self.frames_grabbed = 0
+        self.frames_inferred = 0
+        self.frames_recorded = 0
+        self.frames_copied = 0
+        self.last_inference_ms = 0.0
+
+        ctx = mp.get_context(start_method)
+        # Everything the children send (frames, results, end/error notices) arrives on one queue.
+        self._events = ctx.Queue()
+        self._setup = ctx.Queue()
+        self._free_slots = ctx.Queue()
+        self._requests = ctx.Queue()
+        self._stop = ctx.Event()
+        self._recording = ctx.RawValue("b", 0)
+        self._capture_dropped = ctx.RawValue("L", 0)
+        self._refs: List[int] = []
+        self._waiting: Deque[Tuple[int, object]] = deque()
+        self._detector_idle = True
+        self._started_at = 0.0
+        self._stopped = False
+
+        log_level = logging.getLogger().getEffectiveLevel()
+        self._ctx = ctx
+        self._detector_args = (detector_factory, gate_config or {}, log_level)
+        self._capture = ctx.Process(
+            target=_capture_main,
+            args=(
+                source,
+                ingest_config,
+                realtime,
+                loop_video,
+                self._events,
+                self._setup,
+                self._free_slots,
+                self._stop,
+                self._capture_dropped,
+                log_level,
+            ),
+            name="edge-capture",
+            daemon=True,
+        )
+        self._detector: Optional[mp.Process] = None
+        metrics.register_gauge("edge_queue_depth", lambda: sum(1 for refs in self._refs if refs), queue="ring")
+        metrics.register_gauge("edge_frames_dropped_total", lambda: self._capture_dropped.value, queue="ring")
+
+    def start(self, timeout: float = 60.0) -> "MultiProcessPipeline":
+        """Open the source in the capture process and wait for the detector to load its model; sets `fps`."""
+        self._capture.start()
+        try:
+            event = self._events.get(timeout=timeout)
+        except queue.Empty:
+            event = ("error", f"Capture process did not open {self.source} within {timeout:.0f}s")
+        if event[0] != "open":
+            self.stop()
+            raise RuntimeError(event[1] if event[0] == "error" else f"Unexpected capture event: {event[0]}")
+
+        _, shape, dtype, fps = event
+        self.fps = fps
+        self.ring = FrameRing(self.ring_slots, shape, dtype)
+        self._refs = [0] * self.ring.slots
+        detector_factory, gate_config, log_level = self._detector_args
+        self._detector = self._ctx.Process(
+            target=_detect_main,
+            args=(
+                detector_factory,
+                gate_config,
+                self.ring.spec(),
+                self._requests,
+                self._events,
+                self._recording,
+                self._stop,
+                log_level,
+            ),
+            name="edge-detector",
+            daemon=True,
+        )
+        self._detector.start()
+        # Frames only start flowing once the model is loaded.
+        try:
+            event = self._events.get(timeout=timeout)
+        except queue.Empty:
+            event = ("error", f"Detector process did not load the model within {timeout:.0f}s")
+        if event[0] != "ready":
+            self.stop()
+            raise RuntimeError(event[1] if event[0] == "error" else "Detector process failed to start")
+        for slot in range(self.ring.slots):
+            self._free_slots.put(slot)
+        self._setup.put(self.ring.spec())
+        logging.info(
+            "Frame ring: %d slots of %s (%.1f MB shared)",
+            self.ring.slots,
+            "x".join(str(dim) for dim in shape),
+            self.ring.slot_bytes * self.ring.slots / 2**20,
+        )
+        return self
+
+    def run(self, recorder: Recorder) -> None:
+        """Drive the recorder until the source ends, a child process exits or `stop` is called."""
+        if self.ring is None:
+            raise RuntimeError("MultiProcessPipeline.run() called before start()")
+        self._started_at = time.monotonic()
+        last_stats = time.monotonic()
+        latest_counts: Dict[str, int] = {}
+        capture_done = False
+        try:
+            while not self._stop.is_set():
+                try:
+                    event = self._events.get(timeout=0.5)
+                except queue.Empty:
+                    if not (self._capture.is_alive() and self._detector.is_alive()):
+                        logging.error("A pipeline process exited unexpectedly; stopping")
+                        break
+                    continue
+
+                kind = event[0]
+                if kind == "frame":
+                    _, slot, captured_at = event
+                    self.frames_grabbed += 1
+                    metrics.inc("edge_frames_total")
+                    self._refs[slot] = 1
+                    if self.realtime:
+                        # Newest frame to the detector if it is free; the recorder never waits for it.
+                        if self._detector_idle:
+                            self._dispatch(slot)
+                        self._record(recorder, slot, captured_at, latest_counts)
+                    else:
+                        self._waiting.append((slot, captured_at))
+                elif kind == "result":
+                    _, slot, detections, counts, elapsed = event
+                    self._detector_idle = True
+                    if counts is not None:
+                        latest_counts = counts
+                        self.frames_inferred += 1
+                        self.last_inference_ms = elapsed * 1000.0
+                        metrics.observe("detect", elapsed)
+                        # None means a gated-off frame: nothing was looked at, so the tracker just coasts.
+                        if detections is not None:
+                            recorder.add_detections(self.ring[slot], detections)
+                    self._release(slot)
+                elif kind == "end":
+                    if event[1] != "capture":
+                        logging.error("Detector process exited; stopping pipeline")
+                        break
+                    capture_done = True
+                else:
+                    logging.error("%s", event[1])
+                    break
+
+                # Files: every frame is detected, in order, and recorded as it is handed to the detector.
+                while not self.realtime and self._detector_idle and self._waiting:
+                    slot, captured_at = self._waiting.popleft()
+                    self._dispatch(slot)
+                    self._record(recorder, slot, captured_at, latest_counts)
+                self._recording.value = int(recorder.recording)
+                if capture_done and (self.realtime or (self._detector_idle and not self._waiting)):
+                    break
+
+                if self.stats_interval_sec and time.monotonic() - last_stats >= self.stats_interval_sec:
+                    self._log_stats()
+                    last_stats = time.monotonic()
+        finally:
+            self.stop()
+            self._log_stats()
+
+    def stop(self) -> None:
+        """Ask both processes to exit, wait for them (terminating stragglers) and unlink the ring."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._stop.set()
+        self._setup.put(None)
+        self._requests.put(_END)
+
+        processes = [proc for proc in (self._capture, self._detector) if proc is not None and proc.pid]
+        deadline = time.monotonic() + 5.0
+        while any(proc.is_alive() for proc in processes) and time.monotonic() < deadline:
+            # Keep draining so a child blocked on a full pipe can finish its last put and exit.
+            try:
+                self._events.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for proc in processes:
+            if proc.is_alive():
+                logging.warning("%s did not exit; terminating", proc.name)
+                proc.terminate()
+            proc.join(timeout=1.0)
+        for q in (self._setup, self._requests, self._free_slots):
+            q.cancel_join_thread()
+        if self.ring is not None:
+            self.ring.close()
+
+    def stats(self) -> Dict[str, float]:
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        return {
+            "frames_grabbed": self.frames_grabbed,
+            "frames_inferred": self.frames_inferred,
+            "frames_recorded": self.frames_recorded,
+            "frames_copied": self.frames_copied,
+            "capture_dropped": self._capture_dropped.value,
+            "slots_in_use": sum(1 for refs in self._refs if refs),
+            "fps": round(self.frames_recorded / elapsed, 1) if elapsed else 0.0,
+            "last_inference_ms": round(self.last_inference_ms, 1),
+        }
+
+    def _dispatch(self, slot: int) -> None:
+        self._refs[slot] += 1
+        self._detector_idle = False
+        self._requests.put(slot)
+
+    def _record(self, recorder: Recorder, slot: int, captured_at, counts: Dict[str, int]) -> None:
+        frame = self.ring[slot]
+        if recorder.recording or counts:
+            frame = frame.copy()
+            self.frames_copied += 1
+        recorder.process_frame(frame, counts, timestamp=captured_at)
+        self.frames_recorded += 1
+        self._release(slot)
+
+    def _release(self, slot: int) -> None:
+        self._refs[slot] -= 1
+        if self._refs[slot] == 0:
+            self._free_slots.put(slot)
+
+    def _log_stats(self) -> None:
+        stats = self.stats()
+        logging.info(
+            "Multi-process stats: grabbed=%d inferred=%d recorded=%d (%.1f fps) copied=%d "
+            "dropped=%d slots_in_use=%d inference=%.1fms",
+            stats["frames_grabbed"],
+            stats["frames_inferred"],
+            stats["frames_recorded"],
+            stats["fps"],
+            stats["frames_copied"],
+            stats["capture_dropped"],
+            stats["slots_in_use"],
+            stats["last_inference_ms"],
+        )
+
+
+def _child_setup(log_level: int) -> None:
+    # Ctrl+C reaches the whole process group; only the parent handles it and shuts the children down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=log_level, format="%(asctime)s [%(levelname)s] %(processName)s: %(message)s")
+
+
+def _capture_main(
+    source,
+    ingest_config: Optional[Dict],
+    realtime: bool,
+    loop_video: bool,
+    events,
+    setup,
+    free_slots,
+    stop,
+    dropped,
+    log_level: int,
+) -> None:
+    _child_setup(log_level)
+    if ingest_config is not None:
+        cap = open_capture(source, ingest_config, name="capture")
+    else:
+        cap = cv2.VideoCapture(source)
+    ring = None
+    try:
+        ret, pending = cap.read() if cap.isOpened() else (False, None)
+        if not ret:
+            events.put(("error", f"Unable to open camera source: {source}"))
+            return
+        events.put(("open", pending.shape, pending.dtype.str, cap.get(cv2.CAP_PROP_FPS) or 20.0))
+        # Files are stamped in media time so clip timing does not depend on decode speed.
+        media_clock = None if realtime else MediaClock(cap.get(cv2.CAP_PROP_FPS))
+        spec = setup.get()
+        if spec is None:
+            return
+        ring = FrameRing.attach(spec)
+
+        frames_read = 0
+        while not stop.is_set():
+            try:
+                slot = free_slots.get(timeout=0.5) if not realtime else free_slots.get_nowait()
+            except queue.Empty:
+                if not realtime:
+                    continue
+                slot = None
+
+            target = ring[slot] if slot is not None else None
+            if pending is not None:
+                ret, frame, pending = True, pending, None
+            elif isinstance(cap, StreamIngest) or target is None:
+                ret, frame = cap.read()
+            else:
+                # Decode straight into the shared slot when the backend allows it.
+                ret, frame = cap.read(target)
+            if not ret:
+                if loop_video and frames_read > 0:
+                    logging.info("Reached end of test video; looping from start")
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    if slot is not None:
+                        free_slots.put(slot)
+                    continue
+                if not loop_video:
+                    logging.info("Capture source ended")
+                break
+
+            frames_read += 1
+            if slot is None:
+                # Every slot is still being read: drop this frame rather than fall behind the camera.
+                dropped.value += 1
+                continue
+            if not np.shares_memory(frame, target):
+                if frame.shape == target.shape:
+                    np.copyto(target, frame)
+                else:
+                    # A reconnect came back at another resolution; keep the ring's size.
+                    cv2.resize(frame, (target.shape[1], target.shape[0]), dst=target)
+            if isinstance(cap, StreamIngest):
+                captured_at = cap.last_captured_at
+            else:
+                captured_at = media_clock.next() if media_clock is not None else None
+            events.put(("frame", slot, captured_at))
+    finally:
+        events.put(("end", "capture"))
+        cap.release()
+        if ring is not None:
+            ring.close()
+
+
+def _detect_main(
+    detector_factory,
+    gate_config: Dict,
+    ring_spec: Dict,
+    requests,
+    events,
+    recording,
+    stop,
+    log_level: int,
+) -> None:
+    _child_setup(log_level)
+    ring = FrameRing.attach(ring_spec)
+    try:
+        detector = detector_factory()
+        gate = MotionGate(gate_config)
+        events.put(("ready",))
+        while not stop.is_set():
+            try:
+                slot = requests.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if slot is _END:
+                break
+
+            started = time.perf_counter()
+            try:
+                detections, counts = gate.filter(ring[slot], bool(recording.value), detector.detect)
+            except Exception as exc:  # noqa: BLE001 - keep the pipeline alive on a bad frame
+                logging.warning("Inference failed: %s", exc)
+                detections, counts = None, None
+            # Always answer, even on failure: the parent only frees the slot once it hears back.
+            events.put(("result", slot, detections, counts, time.perf_counter() - started))
+        if gate.enabled:
+            logging.info("Motion gate: %s", gate.summary())
+    except Exception as exc:  # noqa: BLE001 - report to the parent instead of dying silently
+        logging.exception("Detector process failed: %s", exc)
+    finally:
+        events.put(("end", "detector"))
+        ring.close()
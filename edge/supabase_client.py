@@ -1,6 +1,7 @@
 """
 Supabase client wrapper for inserting clip metadata and (optionally) thumbnails.
 Only lightweight data is pushed; raw mp4 stays local on the edge device.
+The `supabase` package is only imported when sync is enabled.
 """
 
 from __future__ import annotations
@@ -8,9 +9,13 @@ from __future__ import annotations
 import logging
 import os
 from pathlib import Path
-from typing import Dict, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional
 
-from supabase import Client, create_client
+if TYPE_CHECKING:
+    from supabase import Client
+
+# Unique per clip (see infra/supabase_schema.sql); upserting on it makes retried inserts idempotent.
+CLIP_CONFLICT_COLUMNS = "device_id,local_video_path"
 
 
 class SupabaseClient:
@@ -28,21 +33,66 @@ class SupabaseClient:
         self.client: Optional[Client] = None
 
         if self.enabled and url and key:
+            from supabase import create_client
+
             self.client = create_client(url, key)
         elif self.enabled:
             logging.warning(
                 "Supabase enabled but missing URL or service role key; set env vars or config values."
             )
 
-    def insert_clip_metadata(self, clip_metadata: Dict, thumbnail_path: Optional[Path]) -> None:
-        """Upload thumbnail (if configured) and insert metadata row."""
+    def insert_clip_metadata(
+        self,
+        clip_metadata: Dict,
+        thumbnail_path: Optional[Path],
+        thumbnail_bytes: Optional[bytes] = None,
+    ) -> None:
+        """Upload thumbnail (if configured) and insert metadata row; in-memory JPEG bytes skip the file read."""
         if not self.enabled or not self.client:
             return
 
         thumbnail_url = None
-        if thumbnail_path and self.bucket and Path(thumbnail_path).exists():
-            thumbnail_url = self._upload_thumbnail(Path(thumbnail_path))
+        if thumbnail_path and self.bucket and (thumbnail_bytes is not None or Path(thumbnail_path).exists()):
+            thumbnail_url = self._upload_thumbnail(Path(thumbnail_path), thumbnail_bytes)
+
+        row = self.build_row(clip_metadata, thumbnail_url)
+
+        try:
+            self.client.table("clips").upsert(row, on_conflict=CLIP_CONFLICT_COLUMNS).execute()
+        except Exception as exc:  # noqa: BLE001 - best-effort sync
+            logging.warning("Failed to insert metadata into Supabase: %s", exc)
+
+    def insert_rows(self, rows: List[Dict]) -> None:
+        """
+        Upsert many prepared rows in a single request. Raises on failure so callers can retry.
+        A request that timed out after the server committed it updates the same rows on retry
+        instead of inserting duplicates.
+        """
+        if not self.client:
+            raise RuntimeError("Supabase client is not configured")
+        if rows:
+            self.client.table("clips").upsert(rows, on_conflict=CLIP_CONFLICT_COLUMNS).execute()
+
+    def upload_thumbnail(self, thumbnail_path: Path, data: Optional[bytes] = None) -> Optional[str]:
+        """
+        Upload a thumbnail and return its public URL. Raises on failure so callers can retry.
+        `data` is the already-encoded JPEG; the file is only read when it is not given.
+        """
+        if not self.client or not self.bucket:
+            return None
+
+        storage_path = f"{self.folder}/{thumbnail_path.name}"
+        # Supabase storage client expects header values to be strings; ensure upsert is passed as "true".
+        upload_options = {"content-type": "image/jpeg", "upsert": "true"}
+        if data is None:
+            with open(thumbnail_path, "rb") as file_obj:
+                data = file_obj.read()
+        self.client.storage.from_(self.bucket).upload(storage_path, data, upload_options)
+        return self.client.storage.from_(self.bucket).get_public_url(storage_path)
 
+    @staticmethod
+    def build_row(clip_metadata: Dict, thumbnail_url: Optional[str]) -> Dict:
+        """Map recorder metadata onto the `clips` table columns."""
         species_counts = clip_metadata.get("species_counts") or {}
         primary_species = max(species_counts, key=species_counts.get) if species_counts else None
         max_animals = max(species_counts.values()) if species_counts else 0
@@ -59,25 +109,16 @@ class SupabaseClient:
             "thumbnail_url": thumbnail_url,
             "local_video_path": clip_metadata.get("local_video_path"),
         }
+        # Always present (None without a classification): PostgREST rejects bulk inserts whose rows have different keys.
+        classification = clip_metadata.get("species_classification") or {}
+        row["classified_species"] = classification.get("top_species")
+        row["species_scores"] = classification.get("species_scores")
+        return row
 
-        try:
-            self.client.table("clips").insert(row).execute()
-        except Exception as exc:  # noqa: BLE001 - best-effort sync
-            logging.warning("Failed to insert metadata into Supabase: %s", exc)
-
-    def _upload_thumbnail(self, thumbnail_path: Path) -> Optional[str]:
+    def _upload_thumbnail(self, thumbnail_path: Path, data: Optional[bytes] = None) -> Optional[str]:
         """Upload thumbnail to Supabase storage and return a public URL."""
-        if not self.client or not self.bucket:
+        try:
+            return self.upload_thumbnail(thumbnail_path, data)
+        except Exception as exc:  # noqa: BLE001
+            logging.warning("Failed to upload thumbnail: %s", exc)
             return None
-
-        storage_path = f"{self.folder}/{thumbnail_path.name}"
-        # Supabase storage client expects header values to be strings; ensure upsert is passed as "true".
-        upload_options = {"content-type": "image/jpeg", "upsert": "true"}
-        with open(thumbnail_path, "rb") as file_obj:
-            try:
-                self.client.storage.from_(self.bucket).upload(storage_path, file_obj, upload_options)
-            except Exception as exc:  # noqa: BLE001
-                logging.warning("Failed to upload thumbnail: %s", exc)
-                return None
-
-        return self.client.storage.from_(self.bucket).get_public_url(storage_path)
@@ -0,0 +1,202 @@
+"""
+Local stand-in for the parts of Supabase the edge app uses, for testing uploads without a project.
+- REST: `POST /rest/v1/clips` inserts a row or list of rows. It upserts on `?on_conflict=` like
+  PostgREST and rejects batches whose rows have different keys. `GET /rest/v1/clips` lists rows.
+- Storage: `POST|PUT /storage/v1/object/<bucket>/<path>` stores a file, and
+  `GET /storage/v1/object/public/<bucket>/<path>` serves it back.
+- Fault injection: `--fail-rate` fails requests before anything is stored. `--fail-after-commit`
+  stores the rows and then answers 503, like a request that timed out after the server committed
+  it, so retries can be checked for duplicates.
+
+    python supabase_local.py --port 54321 --fail-rate 0.3 --fail-after-commit 0.2 --dump rows.json
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_SERVICE_ROLE_KEY=local.stand.in python main.py ...
+"""
+
+from __future__ import annotations
+
+import argparse
+import email
+import json
+import logging
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+
+class LocalSupabase:
+    """In-memory tables and buckets behind a threaded HTTP server; `url` is what SUPABASE_URL should be."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 54321,
+        fail_rate: float = 0.0,
+        fail_after_commit: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.fail_rate = float(fail_rate)
+        self.fail_after_commit = float(fail_after_commit)
+        self.tables: Dict[str, List[Dict]] = {}
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "LocalSupabase":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="supabase-local", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "injected_failures": self.failures,
+                "rows": {name: len(rows) for name, rows in self.tables.items()},
+                "objects": len(self.objects),
+            }
+
+    def should_fail(self, rate: float) -> bool:
+        with self._lock:
+            failed = rate > 0 and self._random.random() < rate
+            self.failures += failed
+            return failed
+
+    def upsert(self, table: str, rows: List[Dict], on_conflict: Optional[List[str]]) -> List[Dict]:
+        if len({tuple(sorted(row)) for row in rows}) > 1:
+            raise ValueError("All object keys must match")
+        with self._lock:
+            stored = self.tables.setdefault(table, [])
+            for row in rows:
+                existing = None
+                if on_conflict:
+                    key = [row.get(column) for column in on_conflict]
+                    existing = next(
+                        (old for old in stored if [old.get(column) for column in on_conflict] == key), None
+                    )
+                if existing is not None:
+                    existing.update(row)
+                else:
+                    stored.append({"id": len(stored) + 1, **row})
+        return rows
+
+
+def _handler_for(service: LocalSupabase):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            parts = urlsplit(self.path).path.strip("/").split("/")
+            if parts[:2] == ["rest", "v1"] and len(parts) == 3:
+                with service._lock:
+                    self._reply(200, json.dumps(service.tables.get(parts[2], [])).encode("utf-8"))
+                return
+            if parts[:4] == ["storage", "v1", "object", "public"] and len(parts) > 5:
+                data = service.objects.get((parts[4], "/".join(parts[5:])))
+                if data is not None:
+                    self._reply(200, data, "application/octet-stream")
+                    return
+            self._reply(404, b'{"message": "not found"}')
+
+        def do_POST(self) -> None:
+            url = urlsplit(self.path)
+            parts = url.path.strip("/").split("/")
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            with service._lock:
+                service.requests += 1
+            if service.should_fail(service.fail_rate):
+                self._reply(503, b'{"message": "injected failure"}')
+                return
+
+            if parts[:2] == ["rest", "v1"] and len(parts) == 3:
+                payload = json.loads(body or b"[]")
+                rows = payload if isinstance(payload, list) else [payload]
+                on_conflict = parse_qs(url.query).get("on_conflict", [""])[0]
+                try:
+                    stored = service.upsert(parts[2], rows, on_conflict.split(",") if on_conflict else None)
+                except ValueError as exc:
+                    self._reply(400, json.dumps({"code": "PGRST102", "message": str(exc)}).encode("utf-8"))
+                    return
+            elif parts[:3] == ["storage", "v1", "object"] and len(parts) > 4:
+                with service._lock:
+                    service.objects[(parts[3], "/".join(parts[4:]))] = _file_bytes(self.headers, body)
+                stored = {"Key": "/".join(parts[3:])}
+            else:
+                self._reply(404, b'{"message": "not found"}')
+                return
+
+            if service.should_fail(service.fail_after_commit):
+                self._reply(503, b'{"message": "injected failure after commit"}')
+                return
+            self._reply(201, json.dumps(stored).encode("utf-8"))
+
+        do_PUT = do_POST
+
+        def _reply(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt: str, *args) -> None:
+            logging.debug("supabase-local: " + fmt, *args)
+
+    return Handler
+
+
+def _file_bytes(headers, body: bytes) -> bytes:
+    """The uploaded file, unwrapped from multipart/form-data when the client sent a form."""
+    content_type = headers.get("Content-Type", "")
+    if not content_type.startswith("multipart/"):
+        return body
+    message = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body)
+    for part in message.walk():
+        if part.get_filename() or part.get_param("name", header="content-disposition") == "file":
+            return part.get_payload(decode=True) or b""
+    return body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Supabase REST and Storage APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests failed before storing")
+    parser.add_argument(
+        "--fail-after-commit", type=float, default=0.0, help="Fraction of requests failed after storing"
+    )
+    parser.add_argument("--seed", type=int, help="Seed for repeatable failure injection")
+    parser.add_argument("--dump", type=Path, help="Write the tables as JSON on exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    service = LocalSupabase(args.host, args.port, args.fail_rate, args.fail_after_commit, args.seed).start()
+    logging.info("Local Supabase stand-in on %s (Ctrl+C to stop)", service.url)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        logging.info("Stats: %s", service.stats())
+        if args.dump:
+            with open(args.dump, "w", encoding="utf-8") as f:
+                json.dump(service.tables, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Streaming best-frame selection for clip thumbnails.
+Each detector result is scored by confidence, box size, framing and sharpness of the animal crop;
+only the best frame so far is kept, copied into one buffer that is reused for the whole clip.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Sharpness is squashed as var / (var + _SHARPNESS_HALF) so it saturates instead of dominating.
+_SHARPNESS_HALF = 100.0
+# Boxes touching the frame border are usually an animal half out of the picture.
+_EDGE_PENALTY = 0.5
+_EDGE_MARGIN_PX = 2
+
+
+class BestFrameSelector:
+    """
+    Keeps the highest-scoring detection frame of one clip.
+    - `offer(frame, detections)` scores the frame and copies it only when it beats the current best.
+    - Sharpness (Laplacian variance) is measured on the best box, downscaled to `sharpness_size`,
+      and skipped when the frame could not win even if perfectly sharp.
+    - With `contact_sheet_k`, small tiles of the top-K frames are kept for a contact sheet.
+    """
+
+    def __init__(
+        self,
+        sharpness_size: int = 96,
+        contact_sheet_k: int = 0,
+        tile_width: int = 320,
+    ) -> None:
+        self.sharpness_size = max(16, int(sharpness_size))
+        self.contact_sheet_k = max(0, int(contact_sheet_k))
+        self.tile_width = max(32, int(tile_width))
+
+        # -inf so a zero-score frame (low confidence, flat crop, degenerate boxes) still beats no frame.
+        self.best_score = float("-inf")
+        self.best_detections: List[Dict] = []
+        self.candidates = 0
+        self.sharpness_runs = 0
+        self._best: Optional[np.ndarray] = None
+        self._has_best = False
+        # Scratch buffers for the sharpness measure, allocated once.
+        self._small = np.empty((self.sharpness_size, self.sharpness_size, 3), dtype=np.uint8)
+        self._gray = np.empty((self.sharpness_size, self.sharpness_size), dtype=np.uint8)
+        self._laplacian = np.empty((self.sharpness_size, self.sharpness_size), dtype=np.float32)
+        # Min-heap of (score, tie-breaker, tile) for the contact sheet.
+        self._tiles: List[Tuple[float, int, np.ndarray]] = []
+        self._counter = itertools.count()
+
+    @classmethod
+    def from_config(cls, config: Dict) -> Optional["BestFrameSelector"]:
+        """None when `mode: first` (keep the first detection frame, the old behaviour)."""
+        if config.get("mode", "best") != "best":
+            return None
+        return cls(
+            sharpness_size=int(config.get("sharpness_size", 96)),
+            contact_sheet_k=int(config.get("contact_sheet_k", 0)),
+            tile_width=int(config.get("contact_sheet_tile_width", 320)),
+        )
+
+    def new_clip(self) -> "BestFrameSelector":
+        """Fresh selector with the same settings; one per clip, so finalizing never races the next clip."""
+        return BestFrameSelector(self.sharpness_size, self.contact_sheet_k, self.tile_width)
+
+    def offer(self, frame, detections: List[Dict]) -> bool:
+        """Score `frame` by its detections; returns True if it became the new best."""
+        if not detections:
+            return False
+        self.candidates += 1
+        height, width = frame.shape[:2]
+
+        # Framing score without sharpness: an upper bound, since sharpness is at most 1.
+        # Frames whose boxes are all empty after clipping score 0 and skip the sharpness measure.
+        best_det, bound = None, 0.0
+        for det in detections:
+            x1, y1, x2, y2 = _clip_box(det["box"], width, height)
+            area = (x2 - x1) * (y2 - y1) / float(width * height)
+            if area <= 0:
+                continue
+            framing = det["confidence"] * np.sqrt(area)
+            if min(x1, y1, width - x2, height - y2) <= _EDGE_MARGIN_PX:
+                framing *= _EDGE_PENALTY
+            if best_det is None or framing > bound:
+                best_det, bound = (x1, y1, x2, y2), framing
+
+        threshold = self.best_score
+        if self.contact_sheet_k:
+            # A frame that cannot win may still earn a place on the contact sheet.
+            threshold = min(
+                threshold, self._tiles[0][0] if len(self._tiles) >= self.contact_sheet_k else float("-inf")
+            )
+        if bound <= threshold:
+            return False
+
+        score = bound * self._sharpness(frame, best_det) if best_det is not None else 0.0
+        if self.contact_sheet_k:
+            self._keep_tile(frame, score)
+        if score <= self.best_score:
+            return False
+
+        if self._best is None or self._best.shape != frame.shape:
+            self._best = np.empty_like(frame)
+        np.copyto(self._best, frame)
+        self._has_best = True
+        self.best_score = score
+        self.best_detections = [dict(det) for det in detections]
+        return True
+
+    def best(self) -> Optional[np.ndarray]:
+        return self._best if self._has_best else None
+
+    def encode_jpeg(self, quality: int = 85) -> Optional[bytes]:
+        """The best frame as JPEG bytes, ready to write and upload without re-reading the file."""
+        best = self.best()
+        return encode_jpeg(best, quality) if best is not None else None
+
+    def contact_sheet(self, columns: int = 4) -> Optional[np.ndarray]:
+        """Grid of the top-K tiles, best first, or None when disabled or empty."""
+        if not self._tiles:
+            return None
+        tiles = [tile for _, _, tile in sorted(self._tiles, key=lambda item: -item[0])]
+        tile_h = max(tile.shape[0] for tile in tiles)
+        columns = max(1, min(columns, len(tiles)))
+        rows = (len(tiles) + columns - 1) // columns
+        sheet = np.zeros((rows * tile_h, columns * self.tile_width, 3), dtype=np.uint8)
+        for idx, tile in enumerate(tiles):
+            top, left = (idx // columns) * tile_h, (idx % columns) * self.tile_width
+            sheet[top : top + tile.shape[0], left : left + self.tile_width] = tile
+        return sheet
+
+    def stats(self) -> Dict:
+        return {
+            "score": round(float(self.best_score), 4) if self._has_best else 0.0,
+            "candidates": self.candidates,
+            "sharpness_runs": self.sharpness_runs,
+        }
+
+    def _sharpness(self, frame, box) -> float:
+        x1, y1, x2, y2 = box
+        self.sharpness_runs += 1
+        size = (self.sharpness_size, self.sharpness_size)
+        cv2.resize(frame[y1:y2, x1:x2], size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        cv2.Laplacian(self._gray, cv2.CV_32F, dst=self._laplacian)
+        variance = float(self._laplacian.var())
+        return variance / (variance + _SHARPNESS_HALF)
+
+    def _keep_tile(self, frame, score: float) -> None:
+        if len(self._tiles) >= self.contact_sheet_k and score <= self._tiles[0][0]:
+            return
+        height, width = frame.shape[:2]
+        tile_h = max(1, int(round(height * self.tile_width / width)))
+        tile = cv2.resize(frame, (self.tile_width, tile_h), interpolation=cv2.INTER_AREA)
+        item = (score, next(self._counter), tile)
+        if len(self._tiles) < self.contact_sheet_k:
+            heapq.heappush(self._tiles, item)
+        else:
+            heapq.heapreplace(self._tiles, item)
+
+
+def encode_jpeg(frame, quality: int = 85) -> Optional[bytes]:
+    ok, encoded = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+    return encoded.tobytes() if ok else None
+
+
+def _clip_box(box, width: int, height: int) -> Tuple[int, int, int, int]:
+    x1, y1, x2, y2 = [int(round(v)) for v in box]
+    return max(0, x1), max(0, y1), min(width, x2), min(height, y2)
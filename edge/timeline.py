@@ -0,0 +1,221 @@
+"""
+Compact per-frame detection timelines.
+A clip's timeline keeps every frame's time and whether the detector ran on it, plus every
+detection as columnar arrays (frame row, class id, confidence, box, track id), saved as a
+compressed `.npz` next to the clip JSON. `replay()` re-runs the recorder's start/stop decisions
+over a timeline with different thresholds, classes or silence timeout, without the video or a model.
+
+Detections were stored after the detector's own `min_confidence` and `target_classes` filter, so
+a replay can tighten those settings but not loosen them.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+TIMELINE_VERSION = 1
+
+
+class DetectionTimeline:
+    """
+    Append-only detection log for one clip (or one source video in batch mode).
+    - `add_frame(time_sec)` appends a frame row; `add_detections(detections)` attaches a detector
+      result to the newest row and marks it as a frame the detector ran on.
+    - Rows are held in `array` buffers while recording and packed into NumPy arrays on `save()`.
+    """
+
+    def __init__(self, attrs: Optional[Dict] = None) -> None:
+        self.attrs = dict(attrs or {})
+        self.labels: List[str] = []
+        self._label_ids: Dict[str, int] = {}
+        self._next_index = 0
+        self._frame_index = array("I")
+        self._frame_time = array("f")
+        self._ran = array("B")
+        self._det_frame = array("I")
+        self._class_id = array("H")
+        self._confidence = array("f")
+        self._box = array("f")
+        self._track_id = array("i")
+
+    def new_clip(self) -> "DetectionTimeline":
+        """Empty timeline with the same attributes (model hash, detector thresholds)."""
+        return DetectionTimeline(self.attrs)
+
+    def skip_frames(self, count: int) -> None:
+        """Account for frames written without a row (the pre-roll), keeping frame indices aligned."""
+        self._next_index += max(0, int(count))
+
+    def add_frame(self, time_sec: float, index: Optional[int] = None) -> None:
+        self._next_index = self._next_index if index is None else int(index)
+        self._frame_index.append(self._next_index)
+        self._frame_time.append(float(time_sec))
+        self._ran.append(0)
+        self._next_index += 1
+
+    def add_detections(self, detections: Iterable[Dict]) -> None:
+        if not self._ran:
+            return
+        row = len(self._ran) - 1
+        self._ran[row] = 1
+        for det in detections:
+            label = det["species"]
+            class_id = self._label_ids.get(label)
+            if class_id is None:
+                class_id = self._label_ids[label] = len(self.labels)
+                self.labels.append(label)
+            self._det_frame.append(row)
+            self._class_id.append(class_id)
+            self._confidence.append(float(det["confidence"]))
+            self._box.extend(float(v) for v in det["box"])
+            self._track_id.append(int(det.get("track_id", -1)))
+
+    def __len__(self) -> int:
+        return len(self._frame_index)
+
+    @property
+    def detection_count(self) -> int:
+        return len(self._det_frame)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "frame_index": np.frombuffer(self._frame_index, dtype=np.uint32),
+            "frame_time": np.frombuffer(self._frame_time, dtype=np.float32),
+            "ran": np.frombuffer(self._ran, dtype=np.uint8).astype(bool),
+            "det_frame": np.frombuffer(self._det_frame, dtype=np.uint32),
+            "class_id": np.frombuffer(self._class_id, dtype=np.uint16),
+            "confidence": np.frombuffer(self._confidence, dtype=np.float32),
+            "box": np.frombuffer(self._box, dtype=np.float32).reshape(-1, 4),
+            "track_id": np.frombuffer(self._track_id, dtype=np.int32),
+            "labels": np.array(self.labels, dtype=str),
+            "attrs": np.array(json.dumps({**self.attrs, "version": TIMELINE_VERSION})),
+        }
+
+    def save(self, path: Path) -> Path:
+        """Write a compressed `.npz` atomically; a reader never sees a half-written timeline."""
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **self.to_arrays())
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> "DetectionTimeline":
+        with np.load(path, allow_pickle=False) as data:
+            timeline = cls(json.loads(str(data["attrs"])))
+            timeline.labels = [str(label) for label in data["labels"]]
+            timeline._label_ids = {label: idx for idx, label in enumerate(timeline.labels)}
+            timeline._frame_index = array("I", data["frame_index"].astype(np.uint32).tobytes())
+            timeline._frame_time = array("f", data["frame_time"].astype(np.float32).tobytes())
+            timeline._ran = array("B", data["ran"].astype(np.uint8).tobytes())
+            timeline._det_frame = array("I", data["det_frame"].astype(np.uint32).tobytes())
+            timeline._class_id = array("H", data["class_id"].astype(np.uint16).tobytes())
+            timeline._confidence = array("f", data["confidence"].astype(np.float32).tobytes())
+            timeline._box = array("f", data["box"].astype(np.float32).tobytes())
+            timeline._track_id = array("i", data["track_id"].astype(np.int32).tobytes())
+        if timeline._frame_index:
+            timeline._next_index = timeline._frame_index[-1] + 1
+        return timeline
+
+    def frame_detections(self) -> Dict[int, Optional[List[Dict]]]:
+        """Frame index -> detections (None where the detector did not run), as the detectors return them."""
+        arrays = self.to_arrays()
+        result: Dict[int, Optional[List[Dict]]] = {
+            int(index): ([] if ran else None) for index, ran in zip(arrays["frame_index"], arrays["ran"])
+        }
+        for row, class_id, confidence, box, track_id in zip(
+            arrays["det_frame"], arrays["class_id"], arrays["confidence"], arrays["box"], arrays["track_id"]
+        ):
+            det = {
+                "species": self.labels[class_id],
+                "confidence": round(float(confidence), 4),
+                "box": [float(v) for v in box],
+            }
+            if track_id >= 0:
+                det["track_id"] = int(track_id)
+            result[int(arrays["frame_index"][row])].append(det)
+        return result
+
+
+def replay(
+    timeline: DetectionTimeline,
+    no_animal_timeout_sec: float,
+    min_confidence: float = 0.0,
+    target_classes: Optional[Iterable[str]] = None,
+    preroll_sec: float = 0.0,
+) -> List[Dict]:
+    """
+    The clips the recorder would have cut from this stretch of frames under the given settings,
+    with their recomputed metadata (offsets are seconds from the timeline's first frame time base).
+    Frames the detector skipped hold the previous result while a clip is recording and count as
+    empty otherwise, as the motion gate does. `preroll_sec` is added to each clip's duration, the
+    way the recorder dates a clip from its oldest pre-roll frame.
+    """
+    arrays = timeline.to_arrays()
+    frame_count = len(arrays["frame_index"])
+    if not frame_count:
+        return []
+
+    keep = arrays["confidence"] >= min_confidence
+    if target_classes:
+        allowed = [idx for idx, label in enumerate(timeline.labels) if label in set(target_classes)]
+        keep &= np.isin(arrays["class_id"], allowed)
+    rows, classes = arrays["det_frame"][keep], arrays["class_id"][keep]
+    counts = np.zeros((frame_count, max(1, len(timeline.labels))), dtype=np.int32)
+    np.add.at(counts, (rows, classes), 1)
+    best = np.zeros(frame_count, dtype=np.float32)
+    np.maximum.at(best, rows, arrays["confidence"][keep])
+    ran = arrays["ran"]
+    seen = counts.sum(axis=1) > 0
+    times = arrays["frame_time"].astype(np.float64)
+
+    # Row whose counts each frame reports (-1: none); whether a skipped frame holds depends on the
+    # recording state, so this follows the start/stop loop instead of a plain forward fill.
+    source = np.full(frame_count, -1, dtype=np.int64)
+    clips: List[Dict] = []
+    start = last_seen = None
+    last = -1
+    for row in range(frame_count):
+        if ran[row]:
+            last = row
+        elif start is None:
+            last = -1
+        source[row] = last
+        now = times[row]
+        has_animals = last >= 0 and seen[last]
+        if has_animals:
+            if start is None:
+                start = row
+            last_seen = row
+        if start is not None and not has_animals and now - times[last_seen] > no_animal_timeout_sec:
+            clips.append(_clip_summary(timeline.labels, times, counts, source, best, ran, start, last_seen, row))
+            start = last_seen = None
+    if start is not None:
+        clips.append(_clip_summary(timeline.labels, times, counts, source, best, ran, start, last_seen, frame_count))
+    for clip in clips:
+        clip["duration_sec"] = round(clip["duration_sec"] + float(preroll_sec), 3)
+    return clips
+
+
+def _clip_summary(labels, times, counts, source, best, ran, start: int, last_seen: int, stop: int) -> Dict:
+    """Metadata of frames [start, stop), ending at the last frame with animals, like `Recorder._stop_clip`."""
+    rows = source[start:stop]
+    window = np.where(rows[:, None] >= 0, counts[np.maximum(rows, 0)], 0)
+    species = {labels[idx]: int(count) for idx, count in enumerate(window.max(axis=0)) if count}
+    ran_best = best[start:stop][ran[start:stop]]
+    return {
+        "start_offset_sec": round(float(times[start]), 3),
+        "end_offset_sec": round(float(times[last_seen]), 3),
+        "duration_sec": float(times[last_seen] - times[start]),
+        "frames": stop - start,
+        "frames_with_animals": int((window.sum(axis=1) > 0).sum()),
+        "species_counts": species,
+        "max_confidence": round(float(ran_best.max()), 4) if ran_best.size else 0.0,
+    }
@@ -0,0 +1,209 @@
+"""
+SORT-style multi-object tracker: constant-velocity Kalman filters on boxes plus IoU association.
+All tracks are predicted and corrected together with NumPy, so the per-frame cost stays tiny
+and boxes can be carried forward on frames the detector skipped.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List
+
+import numpy as np
+
+# State: [cx, cy, area, aspect, vx, vy, v_area]; measurement: [cx, cy, area, aspect].
+_F = np.eye(7, dtype=np.float64)
+_F[0, 4] = _F[1, 5] = _F[2, 6] = 1.0
+_H = np.eye(4, 7, dtype=np.float64)
+# Noise settings from the original SORT implementation.
+_R = np.diag([1.0, 1.0, 10.0, 10.0])
+_Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.0001])
+_P0 = np.diag([10.0, 10.0, 10.0, 10.0, 10000.0, 10000.0, 10000.0])
+
+
+class Tracker:
+    """
+    Assigns stable track IDs to detections.
+    - `predict()` advances every track by one frame; call it for every frame.
+    - `update(detections)` corrects tracks with the detector output for the current frame,
+      matching by IoU (same species only when `per_class`), and starts tracks for leftovers.
+    - Tracks are reported once they have `min_hits` matches, and dropped after `max_misses`
+      detector runs without a match or `max_coast_frames` frames without any detector run.
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.3,
+        min_hits: int = 2,
+        max_misses: int = 3,
+        max_coast_frames: int = 60,
+        per_class: bool = True,
+    ) -> None:
+        self.iou_threshold = iou_threshold
+        self.min_hits = max(1, int(min_hits))
+        self.max_misses = max(0, int(max_misses))
+        self.max_coast_frames = max(1, int(max_coast_frames))
+        self.per_class = per_class
+
+        self._next_id = 1
+        self._x = np.zeros((0, 7))
+        self._p = np.zeros((0, 7, 7))
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._hits = np.zeros(0, dtype=np.int64)
+        self._misses = np.zeros(0, dtype=np.int64)
+        self._since_update = np.zeros(0, dtype=np.int64)
+        self._confidence = np.zeros(0)
+        self._species: List[str] = []
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "Tracker":
+        """Build from the `tracker` config section; `main.build_tracker` checks `enabled` first."""
+        return cls(
+            iou_threshold=float(config.get("iou_threshold", 0.3)),
+            min_hits=int(config.get("min_hits", 2)),
+            max_misses=int(config.get("max_misses", 3)),
+            max_coast_frames=int(config.get("max_coast_frames", 60)),
+            per_class=bool(config.get("per_class", True)),
+        )
+
+    def predict(self) -> List[Dict]:
+        """Advance all tracks one frame and return the confirmed ones with their predicted boxes."""
+        if len(self._ids):
+            # Keep the area positive when a shrinking box would overshoot.
+            shrinking = self._x[:, 2] + self._x[:, 6] <= 0
+            self._x[shrinking, 6] = 0.0
+            self._x = self._x @ _F.T
+            self._p = _F @ self._p @ _F.T + _Q
+            self._since_update += 1
+            self._drop(self._since_update > self.max_coast_frames)
+        return self.tracks()
+
+    def update(self, detections: List[Dict]) -> List[Dict]:
+        """
+        Correct tracks with this frame's detections and return the confirmed tracks.
+        Matched detections get a `track_id` key (also for tracks not yet confirmed).
+        """
+        boxes = np.array([det["box"] for det in detections], dtype=np.float64).reshape(-1, 4)
+        matches, unmatched_dets, unmatched_tracks = self._associate(boxes, detections)
+
+        if matches:
+            rows = np.array([t for t, _ in matches])
+            cols = np.array([d for _, d in matches])
+            self._correct(rows, _boxes_to_z(boxes[cols]))
+            self._hits[rows] += 1
+            self._misses[rows] = 0
+            self._since_update[rows] = 0
+            for row, col in matches:
+                self._confidence[row] = detections[col]["confidence"]
+                detections[col]["track_id"] = int(self._ids[row])
+
+        if len(unmatched_tracks):
+            self._misses[unmatched_tracks] += 1
+
+        for col in unmatched_dets:
+            self._spawn(boxes[col], detections[col])
+            detections[col]["track_id"] = int(self._ids[-1])
+
+        self._drop(self._misses > self.max_misses)
+        return self.tracks()
+
+    def tracks(self) -> List[Dict]:
+        confirmed = np.flatnonzero(self._hits >= self.min_hits)
+        boxes = _x_to_boxes(self._x[confirmed]) if len(confirmed) else np.zeros((0, 4))
+        return [
+            {
+                "track_id": int(self._ids[row]),
+                "species": self._species[row],
+                "box": [round(float(v), 1) for v in box],
+                "confidence": round(float(self._confidence[row]), 4),
+                "hits": int(self._hits[row]),
+                "coasting": bool(self._since_update[row] > 0),
+            }
+            for row, box in zip(confirmed, boxes)
+        ]
+
+    def reset(self) -> None:
+        self._drop(np.ones(len(self._ids), dtype=bool))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _associate(self, boxes: np.ndarray, detections: List[Dict]):
+        """Greedy highest-IoU-first matching; returns (matches, unmatched det idx, unmatched track idx)."""
+        n_tracks, n_dets = len(self._ids), len(boxes)
+        if n_tracks == 0 or n_dets == 0:
+            return [], list(range(n_dets)), np.arange(n_tracks)
+
+        iou = _iou_matrix(_x_to_boxes(self._x), boxes)
+        if self.per_class:
+            det_species = np.array([det["species"] for det in detections], dtype=object)
+            track_species = np.array(self._species, dtype=object)
+            iou[track_species[:, None] != det_species[None, :]] = 0.0
+
+        matches = []
+        track_free = np.ones(n_tracks, dtype=bool)
+        det_free = np.ones(n_dets, dtype=bool)
+        for flat in np.argsort(-iou, axis=None):
+            t, d = divmod(int(flat), n_dets)
+            if iou[t, d] < self.iou_threshold:
+                break
+            if track_free[t] and det_free[d]:
+                matches.append((t, d))
+                track_free[t] = det_free[d] = False
+        return matches, list(np.flatnonzero(det_free)), np.flatnonzero(track_free)
+
+    def _correct(self, rows: np.ndarray, z: np.ndarray) -> None:
+        x, p = self._x[rows], self._p[rows]
+        y = z - x @ _H.T
+        s = _H @ p @ _H.T + _R
+        k = p @ _H.T @ np.linalg.inv(s)
+        self._x[rows] = x + np.einsum("nij,nj->ni", k, y)
+        self._p[rows] = (np.eye(7) - k @ _H) @ p
+
+    def _spawn(self, box: np.ndarray, det: Dict) -> None:
+        x = np.zeros((1, 7))
+        x[0, :4] = _boxes_to_z(box[None, :])[0]
+        self._x = np.vstack([self._x, x])
+        self._p = np.concatenate([self._p, _P0[None]], axis=0)
+        self._ids = np.append(self._ids, self._next_id)
+        self._hits = np.append(self._hits, 1)
+        self._misses = np.append(self._misses, 0)
+        self._since_update = np.append(self._since_update, 0)
+        self._confidence = np.append(self._confidence, det["confidence"])
+        self._species.append(det["species"])
+        self._next_id += 1
+
+    def _drop(self, mask: np.ndarray) -> None:
+        if not mask.any():
+            return
+        keep = ~mask
+        self._x, self._p = self._x[keep], self._p[keep]
+        self._ids, self._hits = self._ids[keep], self._hits[keep]
+        self._misses, self._since_update = self._misses[keep], self._since_update[keep]
+        self._confidence = self._confidence[keep]
+        self._species = [s for s, k in zip(self._species, keep) if k]
+
+
+def _boxes_to_z(boxes: np.ndarray) -> np.ndarray:
+    w = boxes[:, 2] - boxes[:, 0]
+    h = boxes[:, 3] - boxes[:, 1]
+    return np.stack(
+        [boxes[:, 0] + w / 2.0, boxes[:, 1] + h / 2.0, w * h, w / np.maximum(h, 1e-6)], axis=1
+    )
+
+
+def _x_to_boxes(x: np.ndarray) -> np.ndarray:
+    area = np.maximum(x[:, 2], 0.0)
+    w = np.sqrt(area * np.maximum(x[:, 3], 0.0))
+    h = area / np.maximum(w, 1e-6)
+    return np.stack([x[:, 0] - w / 2.0, x[:, 1] - h / 2.0, x[:, 0] + w / 2.0, x[:, 1] + h / 2.0], axis=1)
+
+
+def _iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
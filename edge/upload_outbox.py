@@ -0,0 +1,284 @@
+"""
+Durable on-disk outbox for Supabase sync.
+The recorder appends finished clips to a local SQLite queue; a background uploader drains it
+in batches with retries, so a network blip delays a row instead of losing it.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import metrics
+from supabase_client import SupabaseClient
+from utils.paths import ensure_dir
+
+_SCHEMA = """
+create table if not exists pending_uploads (
+  id integer primary key autoincrement,
+  metadata text not null,
+  thumbnail_path text,
+  thumbnail_url text,
+  status text not null default 'pending', -- pending | dead
+  attempts integer not null default 0,
+  next_attempt_at real not null,
+  last_error text,
+  created_at real not null
+);
+create index if not exists pending_uploads_due_idx on pending_uploads (status, next_attempt_at);
+"""
+# Columns added after the first release, created on existing outbox files at open.
+_ADDED_COLUMNS = {"thumbnail_url": "text"}
+
+
+class UploadOutbox:
+    """SQLite-backed queue of clip rows waiting to be synced."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        ensure_dir(self.path.parent)
+        self._lock = threading.Lock()
+        # Generous busy timeout: batch workers in other processes may append at the same time.
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30.0, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("pragma synchronous=normal")
+        self._conn.executescript(_SCHEMA)
+        existing = {row[1] for row in self._conn.execute("pragma table_info(pending_uploads)")}
+        for column, kind in _ADDED_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"alter table pending_uploads add column {column} {kind}")
+
+    def enqueue(self, clip_metadata: Dict, thumbnail_path: Optional[Path]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "insert into pending_uploads (metadata, thumbnail_path, next_attempt_at, created_at) "
+                "values (?, ?, ?, ?)",
+                (json.dumps(clip_metadata), str(thumbnail_path) if thumbnail_path else None, now, now),
+            )
+
+    def insert_clip_metadata(
+        self, clip_metadata: Dict, thumbnail_path: Optional[Path], thumbnail_bytes: Optional[bytes] = None
+    ) -> None:
+        """Recorder-compatible alias for `enqueue`, for processes that only produce rows."""
+        self.enqueue(clip_metadata, thumbnail_path)
+
+    def due(self, limit: int) -> List[Dict]:
+        """Oldest pending entries whose retry time has come."""
+        with self._lock:
+            rows = self._conn.execute(
+                "select id, metadata, thumbnail_path, thumbnail_url, attempts from pending_uploads "
+                "where status = 'pending' and next_attempt_at <= ? order by id limit ?",
+                (time.time(), int(limit)),
+            ).fetchall()
+        return [
+            {
+                "id": row[0],
+                "metadata": json.loads(row[1]),
+                "thumbnail_path": row[2],
+                "thumbnail_url": row[3],
+                "attempts": row[4],
+            }
+            for row in rows
+        ]
+
+    def set_thumbnail_url(self, entry_id: int, url: str) -> None:
+        """Remember an uploaded thumbnail so a retry of the row does not upload it again."""
+        with self._lock:
+            self._conn.execute("update pending_uploads set thumbnail_url = ? where id = ?", (url, entry_id))
+
+    def mark_done(self, ids: List[int]) -> None:
+        with self._lock:
+            self._conn.executemany("delete from pending_uploads where id = ?", [(i,) for i in ids])
+
+    def mark_failed(
+        self,
+        entries: List[Dict],
+        error: str,
+        base_backoff_sec: float,
+        max_backoff_sec: float,
+        max_attempts: int,
+    ) -> int:
+        """Schedule a retry with exponential backoff; returns how many entries were given up on."""
+        now = time.time()
+        dead = 0
+        updates = []
+        for entry in entries:
+            attempts = entry["attempts"] + 1
+            status = "pending"
+            if max_attempts and attempts >= max_attempts:
+                status = "dead"
+                dead += 1
+            delay = min(max_backoff_sec, base_backoff_sec * (2 ** (attempts - 1)))
+            updates.append((status, attempts, now + delay, error[:500], entry["id"]))
+        with self._lock:
+            self._conn.executemany(
+                "update pending_uploads set status = ?, attempts = ?, next_attempt_at = ?, last_error = ? "
+                "where id = ?",
+                updates,
+            )
+        return dead
+
+    def depth(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("select status, count(*) from pending_uploads group by status").fetchall()
+        counts = {"pending": 0, "dead": 0}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class OutboxUploader:
+    """
+    Background worker that drains an UploadOutbox into Supabase.
+    - Thumbnails for a batch are uploaded concurrently through the client's shared HTTP session;
+      each URL is saved with its entry, so retries only upload the thumbnails still missing.
+    - Rows are inserted with one bulk request per batch; a failed batch is split in halves down to
+      single rows, so one bad row does not hold back the others.
+    - Only the entries that failed back off (exponentially, per entry); an entry is dropped to
+      "dead" after `max_attempts`.
+    Exposes `insert_clip_metadata` so the recorder can use it in place of SupabaseClient.
+    """
+
+    def __init__(self, outbox: UploadOutbox, supabase_client: SupabaseClient, config: Dict) -> None:
+        self.outbox = outbox
+        self.supabase_client = supabase_client
+        self.batch_size = int(config.get("batch_size", 50))
+        self.poll_interval_sec = float(config.get("poll_interval_sec", 5))
+        self.base_backoff_sec = float(config.get("base_backoff_sec", 5))
+        self.max_backoff_sec = float(config.get("max_backoff_sec", 600))
+        self.max_attempts = int(config.get("max_attempts", 20))
+
+        self.rows_uploaded = 0
+        self.thumbnails_uploaded = 0
+        self.thumbnails_failed = 0
+        self.batches_failed = 0
+        self.entries_dead = 0
+        self.last_error: Optional[str] = None
+
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, int(config.get("upload_workers", 4))), thread_name_prefix="thumb-upload"
+        )
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="outbox-uploader", daemon=True)
+        self._thread.start()
+        metrics.register_gauge("edge_queue_depth", lambda: self.outbox.depth()["pending"], queue="outbox")
+
+    def insert_clip_metadata(
+        self, clip_metadata: Dict, thumbnail_path: Optional[Path], thumbnail_bytes: Optional[bytes] = None
+    ) -> None:
+        """
+        Persist the clip for upload and wake the worker; never touches the network.
+        In-memory thumbnail bytes are not kept: uploads may happen after a restart, so the file is the source.
+        """
+        self.outbox.enqueue(clip_metadata, thumbnail_path)
+        self._wake.set()
+
+    def drain_once(self) -> int:
+        """Upload one batch of due entries; returns how many rows were inserted."""
+        entries = self.outbox.due(self.batch_size)
+        if not entries:
+            return 0
+
+        started = time.perf_counter()
+        failed: Dict[str, List[Dict]] = {}
+        ready = []
+        for entry, error in zip(entries, self._pool.map(self._upload_thumbnail, entries)):
+            if error is None:
+                ready.append(entry)
+            else:
+                failed.setdefault(error, []).append(entry)
+        done = self._insert(ready, failed)
+
+        if done:
+            metrics.observe("upload_batch", time.perf_counter() - started)
+            self.outbox.mark_done([entry["id"] for entry in done])
+            self.rows_uploaded += len(done)
+        for error, failed_entries in failed.items():
+            self.last_error = error
+            dead = self.outbox.mark_failed(
+                failed_entries, error, self.base_backoff_sec, self.max_backoff_sec, self.max_attempts
+            )
+            self.entries_dead += dead
+            logging.warning(
+                "Outbox upload of %d clip(s) failed (%s); will retry%s",
+                len(failed_entries),
+                error,
+                f", gave up on {dead}" if dead else "",
+            )
+        return len(done)
+
+    def stats(self) -> Dict:
+        depth = self.outbox.depth()
+        return {
+            "queue_depth": depth["pending"],
+            "dead_entries": depth["dead"],
+            "rows_uploaded": self.rows_uploaded,
+            "thumbnails_uploaded": self.thumbnails_uploaded,
+            "thumbnails_failed": self.thumbnails_failed,
+            "batches_failed": self.batches_failed,
+            "last_error": self.last_error,
+        }
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stop the worker after one last drain attempt; pending rows stay on disk for next start."""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=timeout)
+        self._pool.shutdown(wait=True)
+        logging.info("Upload outbox stats: %s", self.stats())
+        self.outbox.close()
+
+    def _upload_thumbnail(self, entry: Dict) -> Optional[str]:
+        """Upload the entry's thumbnail unless an earlier attempt did; returns the error, or None."""
+        path = entry.get("thumbnail_path")
+        if entry.get("thumbnail_url") or not path or not Path(path).exists():
+            return None
+        try:
+            url = self.supabase_client.upload_thumbnail(Path(path))
+        except Exception as exc:  # noqa: BLE001 - retried with the entry
+            self.thumbnails_failed += 1
+            return f"thumbnail upload failed: {exc}"
+        if url:
+            self.outbox.set_thumbnail_url(entry["id"], url)
+            entry["thumbnail_url"] = url
+            self.thumbnails_uploaded += 1
+        return None
+
+    def _insert(self, entries: List[Dict], failed: Dict[str, List[Dict]]) -> List[Dict]:
+        """Upsert the entries' rows, halving the batch on failure; returns the entries stored."""
+        if not entries:
+            return []
+        rows = [self.supabase_client.build_row(entry["metadata"], entry.get("thumbnail_url")) for entry in entries]
+        try:
+            self.supabase_client.insert_rows(rows)
+            return entries
+        except Exception as exc:  # noqa: BLE001 - any failure is retried later
+            self.batches_failed += 1
+            if len(entries) == 1:
+                failed.setdefault(str(exc), []).append(entries[0])
+                return []
+        middle = len(entries) // 2
+        return self._insert(entries[:middle], failed) + self._insert(entries[middle:], failed)
+
+    def _run(self) -> None:
+        while True:
+            # Keep draining while full batches come back; otherwise wait for new clips or the poll tick.
+            while self.drain_once() >= self.batch_size and not self._stop.is_set():
+                pass
+            if self._stop.is_set():
+                break
+            self._wake.wait(self.poll_interval_sec)
+            self._wake.clear()
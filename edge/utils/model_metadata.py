@@ -0,0 +1,300 @@
+"""
+Read ONNX model metadata (opsets, producer, `metadata_props`) without loading the graph or weights,
+and turn embedded class names into the canonical labels JSON used by the edge detectors and the
+web app's `labelsUrl` files.
+
+The ModelProto is walked at the protobuf wire level: the `graph` field, which holds every weight
+tensor, is skipped with a single seek, so reading labels from a 100 MB model touches a few KB.
+
+Usage:
+    python utils/model_metadata.py ../web/public/models/model.onnx
+    python utils/model_metadata.py ../web/public/models/model.onnx --labels-out labels.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+# ModelProto field numbers (onnx/onnx.proto3).
+_IR_VERSION = 1
+_PRODUCER_NAME = 2
+_PRODUCER_VERSION = 3
+_DOMAIN = 4
+_MODEL_VERSION = 5
+_DOC_STRING = 6
+_OPSET_IMPORT = 8
+_METADATA_PROPS = 14
+
+# Protobuf wire types.
+_VARINT, _I64, _LEN, _I32 = 0, 1, 2, 5
+
+# Metadata keys that hold class names, in order of preference (ultralytics exports use "names").
+LABEL_KEYS = ("names", "labels", "classes")
+
+_CACHE_VERSION = 1
+_cache_lock = threading.Lock()
+_memory_cache: Dict[str, Dict] = {}
+
+
+def read_metadata(model_path: Path) -> Dict:
+    """
+    Top-level ModelProto fields except the graph:
+    `{ir_version, producer_name, producer_version, domain, model_version, doc_string, opset, metadata_props}`.
+    """
+    metadata: Dict = {"opset": {}, "metadata_props": {}}
+    with open(model_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        while f.tell() < size:
+            field, wire_type = _read_key(f)
+            if wire_type == _VARINT:
+                value = _read_varint(f)
+                if field == _IR_VERSION:
+                    metadata["ir_version"] = value
+                elif field == _MODEL_VERSION:
+                    metadata["model_version"] = value
+            elif wire_type == _LEN:
+                length = _read_varint(f)
+                if field in (_OPSET_IMPORT, _METADATA_PROPS, _PRODUCER_NAME, _PRODUCER_VERSION, _DOMAIN, _DOC_STRING):
+                    payload = f.read(length)
+                    if len(payload) != length:
+                        raise ValueError(f"{model_path} is truncated")
+                    _store_field(metadata, field, payload)
+                else:
+                    # Graph, training info, functions: skip without reading.
+                    f.seek(length, os.SEEK_CUR)
+            elif wire_type == _I64:
+                f.seek(8, os.SEEK_CUR)
+            elif wire_type == _I32:
+                f.seek(4, os.SEEK_CUR)
+            else:
+                raise ValueError(f"{model_path} is not an ONNX model (wire type {wire_type})")
+        if f.tell() != size:
+            raise ValueError(f"{model_path} is truncated")
+    return metadata
+
+
+def parse_names(value: str) -> List[str]:
+    """
+    Parse an embedded class-name value into a list indexed by class id.
+    Accepts JSON or Python literals (ultralytics writes `{0: 'animal', 1: 'person'}`), as a list or
+    an id -> name mapping; ids missing from a mapping become `class_<id>`.
+    """
+    try:
+        parsed = json.loads(value)
+    except json.JSONDecodeError:
+        try:
+            parsed = ast.literal_eval(value)
+        except (ValueError, SyntaxError) as exc:
+            raise ValueError(f"Unrecognised class names value: {value[:80]!r}") from exc
+
+    if isinstance(parsed, dict):
+        by_id = {int(k): str(v) for k, v in parsed.items()}
+        return [by_id.get(i, f"class_{i}") for i in range(max(by_id) + 1)] if by_id else []
+    if isinstance(parsed, (list, tuple)):
+        return [str(v) for v in parsed]
+    raise ValueError(f"Class names must be a list or mapping, got {type(parsed).__name__}")
+
+
+def file_sha256(path: Path, cache_dir: Optional[Path] = None) -> str:
+    """SHA-256 of the file; remembered per (size, mtime) so unchanged models are hashed once."""
+    path = Path(path).resolve()
+    stat = path.stat()
+    stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+    cache = _load_cache(cache_dir)
+    entry = cache["files"].get(str(path))
+    if entry and entry["stamp"] == stamp:
+        return entry["sha256"]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+    with _cache_lock:
+        cache["files"][str(path)] = {"stamp": stamp, "sha256": sha256}
+    _save_cache(cache_dir, cache)
+    return sha256
+
+
+def model_labels(model_path: Path, cache_dir: Optional[Path] = None) -> Optional[List[str]]:
+    """Class names embedded in the model, or None; parsed results are cached by model hash."""
+    sha256 = file_sha256(model_path, cache_dir)
+    cache = _load_cache(cache_dir)
+    if sha256 in cache["labels"]:
+        return cache["labels"][sha256]
+
+    props = read_metadata(model_path)["metadata_props"]
+    labels = next((parse_names(props[key]) for key in LABEL_KEYS if props.get(key)), None)
+    with _cache_lock:
+        cache["labels"][sha256] = labels
+    _save_cache(cache_dir, cache)
+    return labels
+
+
+def load_labels(labels_path: Optional[Path] = None, model_path: Optional[Path] = None) -> Optional[List[str]]:
+    """Labels from a JSON file when given, otherwise from the model's metadata."""
+    if labels_path:
+        with open(labels_path, "r", encoding="utf-8") as f:
+            return parse_names(f.read())
+    if model_path:
+        return model_labels(Path(model_path))
+    return None
+
+
+def canonical_labels_json(labels: List[str]) -> str:
+    """The one labels format shared by edge and web: an indented JSON array indexed by class id."""
+    return json.dumps([str(label) for label in labels], indent=2)
+
+
+def labels_hash(labels: List[str]) -> str:
+    """Hash of the canonical label list, independent of how the source file was formatted."""
+    return hashlib.sha256(canonical_labels_json(labels).encode("utf-8")).hexdigest()
+
+
+def write_labels(labels: List[str], output_path: Path) -> Path:
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+        f.write(canonical_labels_json(labels))
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "camera-trap-models"
+
+
+def _store_field(metadata: Dict, field: int, payload: bytes) -> None:
+    if field == _OPSET_IMPORT:
+        entry = _parse_message(payload)
+        metadata["opset"][entry.get(1, b"").decode("utf-8") or "ai.onnx"] = entry.get(2, 0)
+    elif field == _METADATA_PROPS:
+        entry = _parse_message(payload)
+        metadata["metadata_props"][entry.get(1, b"").decode("utf-8")] = entry.get(2, b"").decode("utf-8")
+    else:
+        key = {
+            _PRODUCER_NAME: "producer_name",
+            _PRODUCER_VERSION: "producer_version",
+            _DOMAIN: "domain",
+            _DOC_STRING: "doc_string",
+        }[field]
+        metadata[key] = payload.decode("utf-8")
+
+
+def _parse_message(payload: bytes) -> Dict[int, object]:
+    """Decode a small flat message (OperatorSetIdProto, StringStringEntryProto) into {field: value}."""
+    fields: Dict[int, object] = {}
+    pos = 0
+    while pos < len(payload):
+        key, pos = _varint_at(payload, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == _VARINT:
+            fields[field], pos = _varint_at(payload, pos)
+        elif wire_type == _LEN:
+            length, pos = _varint_at(payload, pos)
+            fields[field] = payload[pos : pos + length]
+            pos += length
+        else:
+            pos += 8 if wire_type == _I64 else 4
+    return fields
+
+
+def _read_key(f: BinaryIO) -> Tuple[int, int]:
+    key = _read_varint(f)
+    return key >> 3, key & 7
+
+
+def _read_varint(f: BinaryIO) -> int:
+    value, shift = 0, 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise ValueError("Unexpected end of file inside a varint")
+        value |= (byte[0] & 0x7F) << shift
+        if not byte[0] & 0x80:
+            return value
+        shift += 7
+
+
+def _varint_at(data: bytes, pos: int) -> Tuple[int, int]:
+    value, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _cache_path(cache_dir: Optional[Path]) -> Path:
+    return Path(cache_dir or default_cache_dir()) / "model_metadata.json"
+
+
+def _load_cache(cache_dir: Optional[Path]) -> Dict:
+    path = _cache_path(cache_dir)
+    with _cache_lock:
+        cache = _memory_cache.get(str(path))
+        if cache is None:
+            cache = {"version": _CACHE_VERSION, "files": {}, "labels": {}}
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+                if stored.get("version") == _CACHE_VERSION:
+                    cache = stored
+            except (OSError, ValueError):
+                pass
+            _memory_cache[str(path)] = cache
+        return cache
+
+
+def _save_cache(cache_dir: Optional[Path], cache: Dict) -> None:
+    """Best effort: a read-only home directory only costs a re-hash next start."""
+    path = _cache_path(cache_dir)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with _cache_lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(cache, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Show ONNX model metadata and extract embedded labels")
+    parser.add_argument("model_path", type=Path, help="Path to the .onnx file")
+    parser.add_argument("--labels-out", type=Path, help="Write the embedded labels as canonical JSON")
+    parser.add_argument("--json", action="store_true", help="Print the metadata as JSON")
+    args = parser.parse_args()
+
+    metadata = read_metadata(args.model_path)
+    labels = model_labels(args.model_path)
+    if args.json:
+        print(json.dumps({**metadata, "sha256": file_sha256(args.model_path), "labels": labels}, indent=2))
+    else:
+        print(f"Producer: {metadata.get('producer_name', '?')} {metadata.get('producer_version', '')}".rstrip())
+        print(f"IR version: {metadata.get('ir_version')}  opsets: {metadata['opset']}")
+        for key, value in metadata["metadata_props"].items():
+            print(f"  {key}: {value if len(value) <= 120 else value[:117] + '...'}")
+        print(f"Labels: {len(labels)} ({', '.join(labels[:5])}{', ...' if len(labels) > 5 else ''})" if labels else "Labels: none embedded")
+
+    if args.labels_out:
+        if not labels:
+            raise SystemExit("No labels embedded in this model")
+        write_labels(labels, args.labels_out)
+        print(f"Wrote {args.labels_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 Helpers for consistently naming and storing capture artifacts.
 """
 
+import itertools
 from datetime import datetime
 from pathlib import Path
 from typing import Dict
@@ -17,14 +18,31 @@ def get_new_clip_paths(base_dir: Path, timestamp: datetime) -> Dict[str, Path]:
     """
     Generate file paths for the next clip artifacts using a UTC timestamp stem.
     Organizes captures by date to keep directories manageable.
+    The video file is created empty to claim the stem (atomically, so other processes writing to
+    the same directory see it); a clip whose stem is taken gets a `_1`, `_2`, ... suffix instead
+    of overwriting the existing clip.
     """
     date_dir = ensure_dir(base_dir / timestamp.strftime("%Y-%m-%d"))
-    stem = timestamp.strftime("%Y%m%d_%H%M%S")
-    video_path = date_dir / f"clip_{stem}.mp4"
-    metadata_path = date_dir / f"clip_{stem}.json"
+    base_stem = timestamp.strftime("%Y%m%d_%H%M%S")
+    for attempt in itertools.count():
+        stem = base_stem if attempt == 0 else f"{base_stem}_{attempt}"
+        video_path = date_dir / f"clip_{stem}.mp4"
+        metadata_path = date_dir / f"clip_{stem}.json"
+        # Retention may have deleted the video of an older clip but kept its JSON.
+        if metadata_path.exists():
+            continue
+        try:
+            video_path.touch(exist_ok=False)
+        except FileExistsError:
+            continue
+        break
     thumbnail_path = date_dir / f"clip_{stem}.jpg"
+    contact_sheet_path = date_dir / f"clip_{stem}_sheet.jpg"
+    timeline_path = date_dir / f"clip_{stem}.npz"
     return {
         "video_path": video_path,
         "metadata_path": metadata_path,
         "thumbnail_path": thumbnail_path,
+        "contact_sheet_path": contact_sheet_path,
+        "timeline_path": timeline_path,
     }
@@ -17,12 +17,20 @@ create table if not exists public.clips (
   frames_with_animals integer default 0, -- frames that had at least one detection
   thumbnail_url text, -- public URL in Supabase storage (small image only)
   local_video_path text, -- where the full mp4 lives on the edge device
+  classified_species text, -- top SpeciesNet label from the edge classifier (if enabled)
+  species_scores jsonb, -- SpeciesNet label -> best crop score
   created_at timestamptz not null default now()
 );
 
+-- Columns added after the first release; safe to re-run on existing projects.
+alter table public.clips add column if not exists classified_species text;
+alter table public.clips add column if not exists species_scores jsonb;
+
 -- Helpful indexes for filters and recent ordering.
 create index if not exists clips_primary_species_idx on public.clips (primary_species);
 create index if not exists clips_started_at_idx on public.clips (started_at desc);
+-- One row per clip file; the edge uploader upserts on it so retried batches never duplicate rows.
+create unique index if not exists clips_device_video_key on public.clips (device_id, local_video_path);
 
 -- Row Level Security: public read-only, inserts via service role (bypasses RLS).
 alter table public.clips enable row level security;
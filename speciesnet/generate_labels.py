@@ -1,13 +1,25 @@
-import json
-import os
+import argparse
+import sys
+from pathlib import Path
 
-def generate_labels_json():
-    # Path to the labels file (hardcoded from previous step for convenience)
-    labels_path = r"C:\Users\brian\.cache\kagglehub\models\google\speciesnet\keras\v4.0.0a\3\always_crop_99710272_22x8_v12_epoch_00148.labels.txt"
-    
-    if not os.path.exists(labels_path):
-        print(f"Labels file not found at {labels_path}")
-        return
+# Labels are written in the same canonical format the edge and web apps read.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "edge"))
+from utils.model_metadata import write_labels
+
+KAGGLE_MODEL_DIR = Path.home() / ".cache" / "kagglehub" / "models" / "google" / "speciesnet" / "keras"
+
+
+def find_labels_file():
+    """Newest SpeciesNet `.labels.txt` in the kagglehub download cache, if any."""
+    candidates = sorted(KAGGLE_MODEL_DIR.rglob("*.labels.txt"), key=lambda p: p.stat().st_mtime)
+    return candidates[-1] if candidates else None
+
+
+def generate_labels_json(labels_path, output_path):
+    if labels_path is None or not labels_path.exists():
+        print(f"Labels file not found at {labels_path or KAGGLE_MODEL_DIR}")
+        print("Run convert_speciesnet_keras.py first, or pass the .labels.txt path.")
+        return 1
 
     labels = []
     print(f"Reading labels from {labels_path}...")
@@ -18,13 +30,20 @@ def generate_labels_json():
                 # The last part is the common name
                 common_name = parts[-1]
                 labels.append(common_name)
-    
-    output_path = "speciesnet_labels.json"
+
     print(f"Writing {len(labels)} labels to {output_path}...")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(labels, f, indent=2)
-    
+    write_labels(labels, output_path)
+
     print("Success!")
+    return 0
+
 
 if __name__ == "__main__":
-    generate_labels_json()
+    parser = argparse.ArgumentParser(description="Convert SpeciesNet's .labels.txt into a labels JSON list.")
+    parser.add_argument("labels_txt", nargs="?", type=Path,
+                        help="SpeciesNet .labels.txt (default: newest one in the kagglehub cache)")
+    parser.add_argument("--output", "-o", type=Path, default=Path("speciesnet_labels.json"),
+                        help="Output JSON path")
+
+    args = parser.parse_args()
+    sys.exit(generate_labels_json(args.labels_txt or find_labels_file(), args.output))
@@ -0,0 +1,214 @@
+"""
+Package an ONNX model for fast loading: pin input shapes, run shape inference and ONNX Runtime's
+graph optimizations (constant folding, fusions) once offline, and save the result as `.onnx` or
+`.ort` with a manifest describing it. The optimized model is checked against the original on
+random inputs, and session-creation/first-inference times are reported before and after.
+
+Usage:
+    python optimize_model.py --model ../web/public/models/speciesnet_quant.onnx
+    python optimize_model.py --model ../web/public/models/MDV6-yolov10-c.onnx --kind detector \\
+        --labels ../web/public/models/labels_my-MDV6-yolov10-c-hybrid-7class.json --format ort
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnxruntime.tools.onnx_model_utils import fix_output_shapes
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "edge"))
+from utils.model_metadata import file_sha256, labels_hash, load_labels
+
+MODELS_DIR = Path(__file__).resolve().parent.parent / "web" / "public" / "models"
+DEFAULT_INPUT_SIZE = {"classifier": 480, "detector": 640}
+# NHWC for SpeciesNet, NCHW for YOLO exports: (batch, height, width) axes.
+SPATIAL_AXES = {"classifier": (0, 1, 2), "detector": (0, 2, 3)}
+# Offline level: "all" adds layout changes tuned to this machine's CPU, so it is opt-in.
+LEVELS = {
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def pin_input_shape(model, kind, batch, size):
+    """Replace symbolic batch/spatial dims of the first input; returns the resulting shape."""
+    batch_axis, height_axis, width_axis = SPATIAL_AXES[kind]
+    values = {height_axis: size, width_axis: size}
+    if batch:
+        values[batch_axis] = batch
+    dims = model.graph.input[0].type.tensor_type.shape.dim
+    for axis, dim in enumerate(dims):
+        if axis in values and not dim.HasField("dim_value"):
+            dim.Clear()
+            dim.dim_value = values[axis]
+    return [dim.dim_value if dim.HasField("dim_value") else dim.dim_param or None for dim in dims]
+
+
+def prepare(model_path, kind, batch, input_size):
+    """Load the model, pin its input shape and run ONNX shape inference; returns (model, input shape)."""
+    model = onnx.load(str(model_path))
+    dims = model.graph.input[0].type.tensor_type.shape.dim
+    height_axis = SPATIAL_AXES[kind][1]
+    size = dims[height_axis].dim_value or int(input_size or DEFAULT_INPUT_SIZE[kind])
+    shape = pin_input_shape(model, kind, batch, size)
+    model = onnx.shape_inference.infer_shapes(model)
+    try:
+        fix_output_shapes(model)
+    except Exception as e:
+        # Outputs with data-dependent sizes (e.g. after NMS) stay symbolic.
+        print(f"Output shapes left symbolic: {e}")
+    return model, shape
+
+
+def optimize(prepared_path, output_path, level, output_format):
+    """Let ONNX Runtime apply its graph optimizations once and serialize the result."""
+    options = ort.SessionOptions()
+    options.graph_optimization_level = LEVELS[level]
+    options.optimized_model_filepath = str(output_path)
+    if output_format == "ort":
+        options.add_session_config_entry("session.save_model_format", "ORT")
+    ort.InferenceSession(str(prepared_path), sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def random_inputs(session, count, seed, batch_fallback=1):
+    """Uniform [0, 1] tensors matching the first input (the models expect /255 pixels)."""
+    model_in = session.get_inputs()[0]
+    shape = [dim if isinstance(dim, int) else batch_fallback for dim in model_in.shape]
+    rng = np.random.default_rng(seed)
+    return model_in.name, [rng.random(shape, dtype=np.float32) for _ in range(count)]
+
+
+def check_equivalence(original_path, optimized_path, samples, rtol, atol, seed):
+    original = ort.InferenceSession(str(original_path), providers=["CPUExecutionProvider"])
+    optimized = ort.InferenceSession(str(optimized_path), providers=["CPUExecutionProvider"])
+    input_name, tensors = random_inputs(optimized, samples, seed)
+    max_abs = 0.0
+    equivalent = True
+    for tensor in tensors:
+        for expected, actual in zip(
+            original.run(None, {input_name: tensor}), optimized.run(None, {input_name: tensor})
+        ):
+            if expected.shape != actual.shape:
+                return {"equivalent": False, "reason": f"shape {expected.shape} != {actual.shape}"}
+            if expected.size:
+                max_abs = max(max_abs, float(np.max(np.abs(expected.astype(np.float64) - actual))))
+            equivalent = equivalent and np.allclose(expected, actual, rtol=rtol, atol=atol)
+    return {"equivalent": bool(equivalent), "samples": samples, "max_abs_diff": max_abs, "rtol": rtol, "atol": atol}
+
+
+def time_cold_start(model_path, level, repeats, seed):
+    """Median session-creation and first-inference times (ms) at the given optimization level."""
+    create_ms, first_ms = [], []
+    for _ in range(repeats):
+        options = ort.SessionOptions()
+        options.graph_optimization_level = level
+        started = time.perf_counter()
+        session = ort.InferenceSession(str(model_path), sess_options=options, providers=["CPUExecutionProvider"])
+        create_ms.append((time.perf_counter() - started) * 1000.0)
+        input_name, (tensor,) = random_inputs(session, 1, seed)
+        started = time.perf_counter()
+        session.run(None, {input_name: tensor})
+        first_ms.append((time.perf_counter() - started) * 1000.0)
+        del session
+    return {
+        "session_create_ms": round(statistics.median(create_ms), 1),
+        "first_inference_ms": round(statistics.median(first_ms), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-optimize an ONNX model and write a manifest")
+    parser.add_argument("--model", type=Path, default=MODELS_DIR / "speciesnet.onnx", help="Source ONNX model")
+    parser.add_argument("--output", type=Path, help="Artifact path (default: <model>_opt.onnx or .ort)")
+    parser.add_argument("--kind", choices=["classifier", "detector"], default="classifier",
+                        help="classifier: NHWC SpeciesNet input; detector: NCHW YOLO input")
+    parser.add_argument("--format", choices=["onnx", "ort"], default="onnx",
+                        help="onnx works everywhere; ort loads fastest with onnxruntime/onnxruntime-web")
+    parser.add_argument("--level", choices=list(LEVELS), default="extended",
+                        help="Offline optimization level ('all' is specific to this CPU type)")
+    parser.add_argument("--input-size", type=int, help="Spatial size to pin when the model's is dynamic")
+    parser.add_argument("--batch", type=int, default=1, help="Batch size to pin (0 keeps it dynamic)")
+    parser.add_argument("--labels", type=Path, help="Labels JSON to hash into the manifest")
+    parser.add_argument("--samples", type=int, default=5, help="Random inputs for the equivalence check")
+    parser.add_argument("--rtol", type=float, default=1e-3)
+    parser.add_argument("--atol", type=float, default=1e-4)
+    parser.add_argument("--repeats", type=int, default=3, help="Cold starts timed per model (median)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not args.model.exists():
+        raise SystemExit(f"Input model not found at {args.model}")
+    if args.labels is None and args.kind == "classifier" and (MODELS_DIR / "speciesnet_labels.json").exists():
+        args.labels = MODELS_DIR / "speciesnet_labels.json"
+    args.output = args.output or args.model.with_name(f"{args.model.stem}_opt.{args.format}")
+
+    print(f"Preparing {args.model} (pinning shapes, shape inference)")
+    model, input_shape = prepare(args.model, args.kind, args.batch, args.input_size)
+    prepared_path = args.output.with_name(f"{args.output.stem}.prepared.onnx")
+    onnx.save(model, str(prepared_path))
+    try:
+        print(f"Optimizing ({args.level}) -> {args.output}")
+        optimize(prepared_path, args.output, args.level, args.format)
+    finally:
+        os.remove(prepared_path)
+
+    equivalence = check_equivalence(args.model, args.output, args.samples, args.rtol, args.atol, args.seed)
+    print(f"Equivalence: {'OK' if equivalence['equivalent'] else 'MISMATCH'} "
+          f"(max abs diff {equivalence.get('max_abs_diff', float('nan')):.2e})")
+
+    # Before: what consumers do today. After: the artifact with and without re-running the optimizers.
+    timings = {
+        "original": time_cold_start(args.model, ort.GraphOptimizationLevel.ORT_ENABLE_ALL, args.repeats, args.seed),
+        "optimized": time_cold_start(args.output, ort.GraphOptimizationLevel.ORT_ENABLE_ALL, args.repeats, args.seed),
+        "optimized_no_reoptimize": time_cold_start(
+            args.output, ort.GraphOptimizationLevel.ORT_DISABLE_ALL, args.repeats, args.seed
+        ),
+    }
+    for name, timing in timings.items():
+        print(f"{name:>24}: create {timing['session_create_ms']:8.1f} ms, "
+              f"first inference {timing['first_inference_ms']:8.1f} ms")
+
+    labels = load_labels(args.labels, args.model)
+    labels_source = str(args.labels) if args.labels else "metadata"
+    input_name = model.graph.input[0].name
+    manifest = {
+        "artifact": args.output.name,
+        "format": args.format,
+        "sha256": file_sha256(args.output),
+        "size_bytes": os.path.getsize(args.output),
+        "source": {"path": str(args.model), "sha256": file_sha256(args.model)},
+        "kind": args.kind,
+        "input": {
+            "name": input_name,
+            "shape": input_shape,
+            "layout": "NHWC" if args.kind == "classifier" else "NCHW",
+            "size": input_shape[SPATIAL_AXES[args.kind][1]],
+            "scale": "1/255",
+        },
+        "outputs": [output.name for output in model.graph.output],
+        "opset": {opset.domain or "ai.onnx": opset.version for opset in model.opset_import},
+        "labels": {"source": labels_source, "count": len(labels), "sha256": labels_hash(labels)} if labels else None,
+        "optimization_level": args.level,
+        "onnxruntime": ort.__version__,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "equivalence": equivalence,
+        "cold_start": timings,
+    }
+    manifest_path = args.output.with_name(f"{args.output.name}.manifest.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Manifest saved to {manifest_path}")
+    return 0 if equivalence["equivalent"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,40 +1,306 @@
-import onnx
-from onnxruntime.quantization import quantize_dynamic, QuantType
+"""
+Quantize SpeciesNet (or a YOLO detector export) to INT8 with ONNX Runtime.
+
+Static mode inserts QuantizeLinear/DequantizeLinear pairs (QDQ) around every supported op,
+including convolutions, using activation ranges calibrated on a folder of sample images.
+Dynamic mode (the old behaviour) only quantizes weights of MatMul/Gemm-style ops.
+
+Usage:
+    python quantize_model.py --calibration-dir crops/ --report quant_report.json
+    python quantize_model.py --model ../web/public/models/MDV6-yolov10-c.onnx --kind detector \\
+        --calibration-dir frames/ --exclude-op-types Concat Split --no-per-channel
+"""
+
+import argparse
+import json
 import os
+import random
 import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
 
-def quantize_speciesnet():
-    input_model_path = r"web/public/models/speciesnet.onnx"
-    output_model_path = r"web/public/models/speciesnet_quant.onnx"
+MODELS_DIR = Path(__file__).resolve().parent.parent / "web" / "public" / "models"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+DEFAULT_INPUT_SIZE = {"classifier": 480, "detector": 640}
+# Same padding colour ultralytics uses for letterboxing.
+PAD_VALUE = 114
 
-    if not os.path.exists(input_model_path):
-        # Try looking in speciesnet folder if not in web/public/models
-        input_model_path = r"speciesnet/speciesnet.onnx"
-        if not os.path.exists(input_model_path):
-            print(f"Error: Input model not found at {input_model_path}")
-            return
 
-    print(f"Quantizing model: {input_model_path}")
-    print(f"Output path: {output_model_path}")
+def list_images(folder, limit=None, seed=0):
+    paths = sorted(p for p in Path(folder).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+    if limit and len(paths) > limit:
+        paths = sorted(random.Random(seed).sample(paths, limit))
+    return paths
+
+
+def model_input(model_path, kind, fallback_size=None):
+    """(input name, square input size) read from the model, with a fallback for dynamic axes."""
+    session = ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])
+    model_in = session.get_inputs()[0]
+    # SpeciesNet is NHWC [N, H, W, 3]; YOLO exports are NCHW [N, 3, H, W].
+    dim = model_in.shape[1] if kind == "classifier" else model_in.shape[2]
+    size = dim if isinstance(dim, int) else int(fallback_size or DEFAULT_INPUT_SIZE[kind])
+    return model_in.name, size
+
+
+def preprocess(image_path, kind, size):
+    """Image file -> batch-of-one float tensor laid out the way the app feeds the model."""
+    image = cv2.imread(str(image_path), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Could not read image {image_path}")
+    if kind == "classifier":
+        # Crops are stretched to the square input, as in the edge and web pipelines.
+        resized = cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA)
+        tensor = resized[:, :, ::-1].astype(np.float32) / 255.0
+    else:
+        height, width = image.shape[:2]
+        gain = min(size / height, size / width)
+        new_w, new_h = int(round(width * gain)), int(round(height * gain))
+        canvas = np.full((size, size, 3), PAD_VALUE, dtype=np.uint8)
+        top, left = (size - new_h) // 2, (size - new_w) // 2
+        canvas[top : top + new_h, left : left + new_w] = cv2.resize(image, (new_w, new_h))
+        tensor = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return np.ascontiguousarray(tensor[None])
+
+
+class ImageCalibrationReader(CalibrationDataReader):
+    """Feeds preprocessed sample images to the calibrator one at a time (bounded memory)."""
+
+    def __init__(self, image_paths, input_name, kind, size):
+        self.image_paths = list(image_paths)
+        self.input_name = input_name
+        self.kind = kind
+        self.size = size
+        self._iter = iter(self.image_paths)
+
+    def get_next(self):
+        for path in self._iter:
+            try:
+                return {self.input_name: preprocess(path, self.kind, self.size)}
+            except ValueError as e:
+                print(f"Skipping calibration image: {e}")
+        return None
+
+    def rewind(self):
+        self._iter = iter(self.image_paths)
+
+
+def nodes_of_types(model_path, op_types):
+    """Names of every node whose op type is in `op_types` (quantize_static only excludes by name)."""
+    if not op_types:
+        return []
+    graph = onnx.load(str(model_path), load_external_data=False).graph
+    return [node.name for node in graph.node if node.op_type in set(op_types) and node.name]
+
 
-    try:
-        # Quantize to UINT8 (standard for image models)
-        quantize_dynamic(
-            input_model_path,
-            output_model_path,
-            weight_type=QuantType.QUInt8
+def quantize(args, input_name, size):
+    source = Path(args.model)
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.mode == "static" and not args.skip_preprocess:
+            # Shape inference + graph cleanup first; gives the calibrator more ops to cover.
+            prepared = Path(tmp) / "prepared.onnx"
+            try:
+                quant_pre_process(str(source), str(prepared))
+                source = prepared
+            except Exception as e:
+                # Symbolic shape inference needs sympy and trips over some tf2onnx graphs.
+                print(f"Full pre-processing failed ({e}); retrying without symbolic shape inference")
+                try:
+                    quant_pre_process(str(source), str(prepared), skip_symbolic_shape=True)
+                    source = prepared
+                except Exception as e:
+                    print(f"Pre-processing failed ({e}); quantizing the original graph")
+
+        if args.mode == "dynamic":
+            quantize_dynamic(
+                str(source),
+                str(args.output),
+                weight_type=QuantType.QUInt8,
+                per_channel=args.per_channel,
+                nodes_to_exclude=args.exclude_nodes + nodes_of_types(source, args.exclude_op_types),
+            )
+            return
+
+        calibration = list_images(args.calibration_dir, args.num_calibration, args.seed)
+        if not calibration:
+            raise SystemExit(f"No calibration images found in {args.calibration_dir}")
+        print(f"Calibrating on {len(calibration)} image(s) with {args.calibration_method} ranges")
+        quantize_static(
+            str(source),
+            str(args.output),
+            ImageCalibrationReader(calibration, input_name, args.kind, size),
+            quant_format=QuantFormat.QDQ,
+            per_channel=args.per_channel,
+            reduce_range=args.reduce_range,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            nodes_to_exclude=args.exclude_nodes + nodes_of_types(source, args.exclude_op_types),
+            calibrate_method={
+                "minmax": CalibrationMethod.MinMax,
+                "entropy": CalibrationMethod.Entropy,
+                "percentile": CalibrationMethod.Percentile,
+            }[args.calibration_method],
         )
-        
-        original_size = os.path.getsize(input_model_path) / (1024 * 1024)
-        quantized_size = os.path.getsize(output_model_path) / (1024 * 1024)
-        
-        print(f"Quantization complete!")
-        print(f"Original size: {original_size:.2f} MB")
-        print(f"Quantized size: {quantized_size:.2f} MB")
-        print(f"Reduction: {(1 - quantized_size/original_size)*100:.1f}%")
-        
-    except Exception as e:
-        print(f"Error during quantization: {e}")
+
+
+def top_predictions(output, kind, k=5):
+    """Classifier: top-k class ids. Detector: class id of the single most confident candidate."""
+    output = np.asarray(output)[0]
+    if kind == "classifier":
+        return [int(i) for i in np.argsort(-output.reshape(-1))[:k]]
+    if output.ndim == 2 and output.shape[-1] == 6:
+        # YOLOv10 (NMS-free): [max_det, (x1, y1, x2, y2, score, class)].
+        best = int(np.argmax(output[:, 4]))
+        return [int(output[best, 5])], float(output[best, 4])
+    # YOLOv8: [4 + num_classes, anchors].
+    scores = output[4:]
+    cls, anchor = np.unravel_index(int(np.argmax(scores)), scores.shape)
+    return [int(cls)], float(scores[cls, anchor])
+
+
+def evaluate(fp32_path, int8_path, eval_images, input_name, kind, size, runs):
+    """Top-1 agreement of INT8 vs FP32 plus per-image latency and file size for both models."""
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    sessions = {
+        name: ort.InferenceSession(str(path), sess_options=options, providers=["CPUExecutionProvider"])
+        for name, path in (("fp32", fp32_path), ("int8", int8_path))
+    }
+    tensors = []
+    for path in eval_images:
+        try:
+            tensors.append(preprocess(path, kind, size))
+        except ValueError as e:
+            print(f"Skipping evaluation image: {e}")
+
+    report = {}
+    for name, session in sessions.items():
+        session.run(None, {input_name: tensors[0]})  # warm-up
+        latencies = []
+        for _ in range(runs):
+            for tensor in tensors:
+                started = time.perf_counter()
+                session.run(None, {input_name: tensor})
+                latencies.append((time.perf_counter() - started) * 1000.0)
+        path = fp32_path if name == "fp32" else int8_path
+        report[name] = {
+            "path": str(path),
+            "size_mb": round(os.path.getsize(path) / (1024 * 1024), 2),
+            "latency_ms": {
+                "mean": round(float(np.mean(latencies)), 2),
+                "p50": round(float(np.percentile(latencies, 50)), 2),
+                "p90": round(float(np.percentile(latencies, 90)), 2),
+            },
+        }
+
+    top1 = top5 = 0
+    score_drift = []
+    for tensor in tensors:
+        fp32 = top_predictions(sessions["fp32"].run(None, {input_name: tensor})[0], kind)
+        int8 = top_predictions(sessions["int8"].run(None, {input_name: tensor})[0], kind)
+        if kind == "classifier":
+            top1 += fp32[0] == int8[0]
+            top5 += fp32[0] in int8
+        else:
+            top1 += fp32[0] == int8[0]
+            score_drift.append(abs(fp32[1] - int8[1]))
+
+    count = max(1, len(tensors))
+    agreement = {"images": len(tensors), "top1": round(top1 / count, 4)}
+    if kind == "classifier":
+        agreement["fp32_top1_in_int8_top5"] = round(top5 / count, 4)
+    else:
+        agreement["mean_top_score_drift"] = round(float(np.mean(score_drift)), 4) if score_drift else 0.0
+    report["agreement"] = agreement
+    report["speedup"] = round(report["fp32"]["latency_ms"]["mean"] / max(report["int8"]["latency_ms"]["mean"], 1e-6), 2)
+    report["size_reduction"] = round(1 - report["int8"]["size_mb"] / max(report["fp32"]["size_mb"], 1e-6), 3)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize an ONNX model to INT8 and report accuracy/speed")
+    parser.add_argument("--model", type=Path, default=MODELS_DIR / "speciesnet.onnx", help="FP32 ONNX model")
+    parser.add_argument("--output", type=Path, help="Quantized model path (default: <model>_quant.onnx)")
+    parser.add_argument("--kind", choices=["classifier", "detector"], default="classifier",
+                        help="classifier: SpeciesNet NHWC crops; detector: YOLO NCHW letterboxed frames")
+    parser.add_argument("--mode", choices=["static", "dynamic"], default="static",
+                        help="static: calibrated QDQ (quantizes convolutions); dynamic: weights only")
+    parser.add_argument("--calibration-dir", type=Path, help="Folder of sample crops/frames (required for static)")
+    parser.add_argument("--num-calibration", type=int, default=200, help="Max calibration images (random sample)")
+    parser.add_argument("--calibration-method", choices=["minmax", "entropy", "percentile"], default="minmax")
+    parser.add_argument("--per-channel", action=argparse.BooleanOptionalAction, default=True,
+                        help="Per-channel weight scales (use --no-per-channel for per-tensor)")
+    parser.add_argument("--reduce-range", action="store_true", help="7-bit weights for CPUs without VNNI")
+    parser.add_argument("--exclude-op-types", nargs="+", default=[], help="Keep these op types in float")
+    parser.add_argument("--exclude-nodes", nargs="+", default=[], help="Keep these node names in float")
+    parser.add_argument("--skip-preprocess", action="store_true", help="Skip shape inference/graph cleanup")
+    parser.add_argument("--input-size", type=int, help="Input size for models with dynamic spatial axes")
+    parser.add_argument("--eval-dir", type=Path,
+                        help="Images for the report (default: calibration dir; use held-out images if you can)")
+    parser.add_argument("--num-eval", type=int, default=100, help="Max evaluation images")
+    parser.add_argument("--runs", type=int, default=3, help="Timing passes over the evaluation images")
+    parser.add_argument("--report", type=Path, help="Write the comparison report as JSON")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for image sampling")
+    args = parser.parse_args()
+
+    if not args.model.exists():
+        raise SystemExit(f"Input model not found at {args.model}")
+    if args.mode == "static" and not args.calibration_dir:
+        raise SystemExit("--calibration-dir is required for static quantization")
+    args.output = args.output or args.model.with_name(f"{args.model.stem}_quant.onnx")
+
+    input_name, size = model_input(args.model, args.kind, args.input_size)
+    print(f"Quantizing {args.kind} {args.model} ({args.mode}, "
+          f"{'per-channel' if args.per_channel else 'per-tensor'}, input {size}px)")
+    quantize(args, input_name, size)
+    print(f"Wrote {args.output}")
+
+    eval_dir = args.eval_dir or args.calibration_dir
+    eval_images = list_images(eval_dir, args.num_eval, args.seed + 1) if eval_dir else []
+    if not eval_images:
+        original_size = os.path.getsize(args.model) / (1024 * 1024)
+        quantized_size = os.path.getsize(args.output) / (1024 * 1024)
+        print(f"Size: {original_size:.2f} MB -> {quantized_size:.2f} MB (no evaluation images, skipping report)")
+        return
+
+    report = evaluate(args.model, args.output, eval_images, input_name, args.kind, size, args.runs)
+    report["settings"] = {
+        "kind": args.kind,
+        "mode": args.mode,
+        "per_channel": args.per_channel,
+        "reduce_range": args.reduce_range,
+        "calibration_method": args.calibration_method if args.mode == "static" else None,
+        "exclude_op_types": args.exclude_op_types,
+        "exclude_nodes": args.exclude_nodes,
+        "input_size": size,
+    }
+
+    agreement = report["agreement"]
+    print(f"Size:      {report['fp32']['size_mb']:.2f} MB -> {report['int8']['size_mb']:.2f} MB "
+          f"({report['size_reduction'] * 100:.1f}% smaller)")
+    print(f"Latency:   {report['fp32']['latency_ms']['mean']:.2f} ms -> {report['int8']['latency_ms']['mean']:.2f} ms "
+          f"({report['speedup']:.2f}x)")
+    print(f"Top-1 agreement with FP32: {agreement['top1'] * 100:.1f}% over {agreement['images']} image(s)")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.report}")
+
 
 if __name__ == "__main__":
-    quantize_speciesnet()
+    sys.exit(main())
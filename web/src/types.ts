@@ -10,6 +10,8 @@ export type Clip = {
   frames_with_animals?: number | null;
   thumbnail_url?: string | null;
   local_video_path?: string | null;
+  classified_species?: string | null;
+  species_scores?: Record<string, number> | null;
   created_at?: string;
 };
 